@@ -0,0 +1,138 @@
+import time
+import logging
+import threading
+from collections import deque
+
+# Logging settings
+logger = logging.getLogger("adaptive_limit")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Limiter settings
+WINDOW = 20                 # samples kept for the latency percentiles and failure rate
+MIN_SAMPLES = 5             # no decision before this many samples in the window
+ADJUST_EVERY = 5            # re-evaluate the limit after this many new samples
+MAX_FAILURE_RATE = 0.2      # back off above this share of failed scrapes
+LATENCY_TOLERANCE = 2.0     # back off when p95 exceeds this multiple of the baseline p95
+BACKOFF = 0.7               # multiplicative decrease
+BASELINE_ALPHA = 0.05       # how fast the baseline p95 follows the measured p95
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for one store.
+
+    Every scrape reports its latency and whether it failed. After each batch
+    of ADJUST_EVERY samples the limit is cut by BACKOFF when the failure rate
+    is too high or p95 drifts far above its own baseline (the store is
+    throttling or overloaded; comparing p95 with p50 would back off on any
+    store whose latency is merely spread out); otherwise it grows by one, but
+    only if the current limit was actually reached, so an idle store does not
+    climb to the ceiling for nothing. `on_raise` is called after the limit
+    grows, so a scheduler can start queued jobs right away.
+    """
+
+    def __init__(self, name: str, initial: int = 3, floor: int = 1, ceiling: int = 8,
+                 window: int = WINDOW, max_failure_rate: float = MAX_FAILURE_RATE,
+                 latency_tolerance: float = LATENCY_TOLERANCE, backoff: float = BACKOFF):
+        self.name = name
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = max(floor, min(ceiling, initial))
+        self.max_failure_rate = max_failure_rate
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.samples: deque = deque(maxlen=window)
+        self.baseline = None      # p95 when the store is healthy
+        self.on_raise = None
+        self.inflight = 0
+        self._saturated = False
+        self._since_adjust = 0
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+
+    def acquire(self):
+        """Mark a scrape as started; returns its start time for release()."""
+        with self._lock:
+            self.inflight += 1
+            if self.inflight >= self.limit:
+                self._saturated = True
+        return time.monotonic()
+
+    def release(self, started: float, ok: bool = True):
+        with self._lock:
+            self.inflight -= 1
+        self.record(time.monotonic() - started, ok)
+
+    def record(self, latency: float, ok: bool = True):
+        with self._lock:
+            self.samples.append((latency, ok))
+            self._since_adjust += 1
+            old = self.limit
+            if len(self.samples) >= MIN_SAMPLES and self._since_adjust >= ADJUST_EVERY:
+                self._adjust()
+            raised = self.limit > old
+        if raised and self.on_raise is not None:
+            self.on_raise()
+
+    def _adjust(self):
+        latencies = [latency for latency, _ in self.samples]
+        failures = sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+        p50 = percentile(latencies, 0.5)
+        p95 = percentile(latencies, 0.95)
+        slow = self.baseline is not None and p95 > self.baseline * self.latency_tolerance
+        if self.baseline is None:
+            self.baseline = p95
+        else:
+            # a slow EWMA, so neither one lucky window nor one bad one resets it
+            self.baseline += BASELINE_ALPHA * (p95 - self.baseline)
+
+        old = self.limit
+        if failures > self.max_failure_rate or slow:
+            self.limit = max(self.floor, int(self.limit * self.backoff))
+        elif self._saturated:
+            self.limit = min(self.ceiling, self.limit + 1)
+
+        if self.limit < old:
+            self.decreases += 1
+            logger.warning(f"⚠️ [{self.name}] limit {old} → {self.limit} "
+                           f"(p50 {p50:.2f}s, p95 {p95:.2f}s, failures {failures:.0%})")
+        elif self.limit > old:
+            self.increases += 1
+            logger.info(f"🚀 [{self.name}] limit {old} → {self.limit} (p95 {p95:.2f}s)")
+        self._saturated = self.inflight >= self.limit
+        self._since_adjust = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = [latency for latency, _ in self.samples]
+            failures = sum(1 for _, ok in self.samples if not ok)
+            return {
+                "limit": self.limit,
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+                "inflight": self.inflight,
+                "p50": round(percentile(latencies, 0.5), 3),
+                "p95": round(percentile(latencies, 0.95), 3),
+                "failure_rate": round(failures / len(self.samples), 3) if self.samples else 0.0,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
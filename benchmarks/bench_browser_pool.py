@@ -0,0 +1,83 @@
+"""
+Cold Chromium launch vs. pooled contexts.
+
+Usage:
+    python benchmarks/bench_browser_pool.py --iterations 10 --url about:blank
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.sync_api import sync_playwright
+from browser_pool import BrowserPool
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+def bench_cold(url, iterations):
+    """What every scraper used to do: new driver + new browser per fetch."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            page = browser.new_page()
+            page.goto(url)
+            page.content()
+            browser.close()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_pooled(url, iterations, size):
+    """Warm browsers, a fresh isolated context per fetch."""
+    pool = BrowserPool(size=size)
+    with pool.page() as page:  # warm-up, not measured
+        page.goto(url)
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        with pool.page() as page:
+            page.goto(url)
+            page.content()
+        samples.append(time.perf_counter() - started)
+    pool.close()
+    return samples, pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--url", default="about:blank")
+    parser.add_argument("--pool-size", type=int, default=1)
+    args = parser.parse_args()
+
+    cold = bench_cold(args.url, args.iterations)
+    pooled, stats = bench_pooled(args.url, args.iterations, args.pool_size)
+
+    report = {
+        "url": args.url,
+        "cold_launch": summarize(cold),
+        "pooled_context": summarize(pooled),
+        "pool_stats": stats,
+    }
+    report["speedup"] = round(report["cold_launch"]["mean_ms"] / max(report["pooled_context"]["mean_ms"], 0.1), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
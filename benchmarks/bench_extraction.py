@@ -0,0 +1,118 @@
+"""
+Parse time and peak memory of the HTML extractors on the saved fixture pages,
+next to the cost of just building a BeautifulSoup tree for the same page
+(what every extractor used to do before any selector ran).
+
+Each case runs in its own process so peak RSS is not polluted by earlier
+cases; tracemalloc only sees Python objects, RSS also covers libxml2.
+
+Usage:
+    python benchmarks/bench_extraction.py --iterations 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import tracemalloc
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+# case name -> (fixture, extractor)
+CASES = {
+    "digikala_search": ("digikala_search.html", "digikala"),
+    "ebay_srp": ("ebay_srp.html", "ebay_srp"),
+    "ebay_item": ("ebay_item.html", "ebay_item"),
+    "ebay_item_nojsonld": ("ebay_item_nojsonld.html", "ebay_item"),
+    "generic_product_jsonld": ("generic_product_jsonld.html", "web_mimic"),
+    "generic_product_microdata": ("generic_product_microdata.html", "web_mimic"),
+}
+
+
+def load_extractor(name):
+    if name == "bs4_tree":
+        from bs4 import BeautifulSoup
+        return lambda html: BeautifulSoup(html, "lxml")
+    if name == "digikala":
+        import digikala_optimized
+        return lambda html: digikala_optimized.parse_search_results(html, "https://www.digikala.com/search/", 10)
+    if name == "ebay_srp":
+        import ebay_optimized
+        return lambda html: ebay_optimized.parse_srp_cards(html, "https://www.ebay.com/sch/i.html", 10)
+    if name == "ebay_item":
+        import ebay_optimized
+        return ebay_optimized.extract_product_from_html
+    if name == "web_mimic":
+        import web_mimic_optimized
+        return web_mimic_optimized.extract_product_from_html
+    raise ValueError(name)
+
+
+def run_case(fixture, extractor, iterations, out):
+    import logging
+    logging.disable(logging.CRITICAL)
+    with open(os.path.join(FIXTURES, fixture), encoding="utf-8") as f:
+        html = f.read()
+    fn = load_extractor(extractor)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    fn(html)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(html)
+        samples.append(time.perf_counter() - started)
+
+    ordered = sorted(samples)
+    out.put({
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "python_peak_kb": round(py_peak / 1024),
+        "rss_growth_kb": rss_after - rss_before,
+    })
+
+
+def measure(fixture, extractor, iterations):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=run_case, args=(fixture, extractor, iterations, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--case", choices=sorted(CASES), action="append", help="limit to some cases")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.case or CASES:
+        fixture, extractor = CASES[name]
+        size_kb = round(os.path.getsize(os.path.join(FIXTURES, fixture)) / 1024)
+        baseline = measure(fixture, "bs4_tree", args.iterations)
+        current = measure(fixture, extractor, args.iterations)
+        report[name] = {
+            "fixture_kb": size_kb,
+            "bs4_tree_only": baseline,
+            "extractor": current,
+            "speedup_vs_tree": round(baseline["mean_ms"] / max(current["mean_ms"], 0.01), 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
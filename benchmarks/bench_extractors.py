@@ -0,0 +1,211 @@
+"""
+Offline benchmark and correctness check for every extractor.
+
+Runs each extractor on the saved pages in benchmarks/fixtures (and the
+price strings in fixtures/prices.json), checks the output against
+fixtures/expected.json, and reports throughput, latency percentiles and
+allocations. No network is needed.
+
+Usage:
+    python benchmarks/bench_extractors.py --iterations 50 --output run.json
+    python benchmarks/bench_extractors.py --baseline run.json      # compare with an earlier run
+    python benchmarks/bench_extractors.py --strict                 # exit 1 on any mismatch
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tracemalloc
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+logging.disable(logging.CRITICAL)
+
+import digikala_optimized
+import ebay_optimized
+import web_mimic_optimized
+import extraction_profiles
+import price_normalize
+
+DIGIKALA_SEARCH_URL = "https://www.digikala.com/search/"
+EBAY_SEARCH_URL = "https://www.ebay.com/sch/i.html"
+PROFILED_URL = "https://shop1.example.ir/product/1001"
+
+# learned profiles stay in memory; the benchmark must not leave a database behind
+web_mimic_optimized.EXTRACTION_PROFILES = extraction_profiles.ProfileRegistry(path=None)
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def profiled(extract, html, url):
+    """`extract` on a repeat visit: the domain's profile is learned and confirmed first."""
+    for _ in range(extraction_profiles.CONFIRM_AFTER):
+        extract(html, url)
+    return lambda page: extract(page, url)
+
+
+def page_cases():
+    """(case name, callable, input)"""
+    api = json.loads(fixture("digikala_api.json"))
+    microdata = fixture("generic_product_microdata.html")
+    return [
+        ("digikala.parse_search_results",
+         lambda html: digikala_optimized.parse_search_results(html, DIGIKALA_SEARCH_URL, 10), fixture("digikala_search.html")),
+        ("digikala.parse_api_products", lambda data: digikala_optimized.parse_api_products(data, 10), api),
+        ("ebay.parse_srp_cards", lambda html: ebay_optimized.parse_srp_cards(html, EBAY_SEARCH_URL, 10), fixture("ebay_srp.html")),
+        ("ebay.extract_product_links",
+         lambda html: ebay_optimized.extract_product_links(html, EBAY_SEARCH_URL, 10), fixture("ebay_srp.html")),
+        ("ebay.extract_product_from_html[ebay_item]", ebay_optimized.extract_product_from_html, fixture("ebay_item.html")),
+        ("ebay.extract_product_from_html[ebay_item_nojsonld]",
+         ebay_optimized.extract_product_from_html, fixture("ebay_item_nojsonld.html")),
+        ("web_mimic.extract_product_from_html[generic_product_jsonld]",
+         web_mimic_optimized.extract_product_from_html, fixture("generic_product_jsonld.html")),
+        ("web_mimic.extract_product_from_html[generic_product_microdata]",
+         web_mimic_optimized.extract_product_from_html, microdata),
+        ("web_mimic.extract_product_from_html[generic_product_microdata,profiled]",
+         profiled(web_mimic_optimized.extract_product_from_html, microdata, PROFILED_URL), microdata),
+        ("web_mimic.parse_duckduckgo_results",
+         lambda html: web_mimic_optimized.parse_duckduckgo_results(html, 10), fixture("duckduckgo_results.html")),
+    ]
+
+
+def normalized(text):
+    """price_normalize.parse_price as [amount, currency, upper]."""
+    price = price_normalize.parse_price(text)
+    return [price.amount, price.currency, price.upper] if price else None
+
+
+PRICE_PARSERS = {
+    "digikala": digikala_optimized.extract_price_from_text,
+    "ebay": ebay_optimized.extract_price_from_text,
+    "web_mimic": web_mimic_optimized.extract_price_from_text,
+    "price_normalize": normalized,
+}
+
+
+def jsonable(value):
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def time_calls(fn, arg, iterations):
+    fn(arg)  # warm-up (compiled selectors, imports)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    fn(arg)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "iterations": iterations,
+        "ops_per_s": round(iterations / total, 1) if total else None,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "alloc_peak_kb": round((peak - before) / 1024, 1),
+        "alloc_retained_kb": round((after - before) / 1024, 1),
+    }
+
+
+def run(iterations):
+    expected = json.loads(fixture("expected.json"))
+    report = {"commit": git_commit(), "extractors": {}, "prices": {}}
+
+    for name, fn, arg in page_cases():
+        entry = time_calls(fn, arg, iterations)
+        got = jsonable(fn(arg))
+        entry["correct"] = got == expected.get(name)
+        if not entry["correct"]:
+            entry["got"] = got
+            entry["expected"] = expected.get(name)
+        report["extractors"][name] = entry
+
+    corpus = json.loads(fixture("prices.json"))
+    for variant, parser in PRICE_PARSERS.items():
+        texts = [text for text, _ in corpus[variant]]
+        entry = time_calls(lambda batch: [parser(t) for t in batch], texts, iterations)
+        entry["strings"] = len(texts)
+        mismatches = [
+            {"text": text, "expected": want, "got": parser(text)}
+            for text, want in corpus[variant]
+            if parser(text) != want
+        ]
+        entry["correct"] = not mismatches
+        if mismatches:
+            entry["mismatches"] = mismatches
+        report["prices"][variant] = entry
+
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(report, baseline):
+    """p50 ratio (current / baseline) per case; below 1.0 is faster."""
+    out = {}
+    for section in ("extractors", "prices"):
+        for name, entry in report[section].items():
+            old = baseline.get(section, {}).get(name)
+            if old and old.get("p50_ms"):
+                out[f"{section}:{name}"] = {
+                    "p50_ratio": round(entry["p50_ms"] / old["p50_ms"], 2),
+                    "correct": entry["correct"],
+                    "was_correct": old.get("correct"),
+                }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 if any extraction is wrong")
+    args = parser.parse_args()
+
+    report = run(args.iterations)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    wrong = [n for s in ("extractors", "prices") for n, e in report[s].items() if not e["correct"]]
+    if wrong:
+        print(f"incorrect: {', '.join(wrong)}", file=sys.stderr)
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
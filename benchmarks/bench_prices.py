@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of price_normalize on large batches of price strings.
+
+The strings are the correctness corpus (fixtures/prices.json) repeated up to
+--size, split into an ASCII-only set ("$1,249.00", "4590000"), a set with
+Persian / Arabic digits, and the mix of both. Each set is parsed string by
+string with parse_price() and in one call with parse_prices(); both must
+give the same results. Reported: nanoseconds per string and the speedup of
+the batch call.
+
+Usage:
+    python benchmarks/bench_prices.py --size 20000 --repeat 5
+    python benchmarks/bench_prices.py --output prices.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+from price_normalize import parse_price, parse_prices
+
+
+def corpus_texts():
+    with open(os.path.join(FIXTURES, "prices.json"), encoding="utf-8") as f:
+        corpus = json.load(f)
+    return [text for cases in corpus.values() for text, _ in cases if text]
+
+
+def batch_of(texts, size):
+    return [texts[i % len(texts)] for i in range(size)] if texts else []
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(texts, repeat):
+    one_by_one = best_of(lambda: [parse_price(t) for t in texts], repeat)
+    batched = best_of(lambda: parse_prices(texts), repeat)
+    return {
+        "strings": len(texts),
+        "per_call_ns": round(one_by_one / len(texts) * 1e9),
+        "batch_ns": round(batched / len(texts) * 1e9),
+        "batch_speedup": round(one_by_one / batched, 2) if batched else None,
+        "same_results": parse_prices(texts) == [parse_price(t) for t in texts],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000, help="strings per set")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    texts = corpus_texts()
+    sets = {
+        "ascii": batch_of([t for t in texts if t.isascii()], args.size),
+        "non_ascii": batch_of([t for t in texts if not t.isascii()], args.size),
+        "mixed": batch_of(texts, args.size),
+    }
+    report = {name: measure(batch, args.repeat) for name, batch in sets.items() if batch}
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    if not all(entry["same_results"] for entry in report.values()):
+        print("parse_prices() and parse_price() disagree", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+End-to-end load test of the bot pipeline against the local mock store.
+
+Simulated users talk to bot.handle_message through fake Telegram updates
+(no network, no token): each one picks a store, sends a query, waits for
+the final result message and starts over. Everything after the handler is
+real: anti-spam, scheduler, adaptive limits, caches, scrapers, parsing and
+the streamed reply.
+
+Reported per run: completed searches/sec, end-to-end latency and queue wait
+(time until the "Searching ..." message appears) with p50/p95/p99, plus the
+bot's own per-stage histograms (see metrics.py).
+
+Usage:
+    python benchmarks/load_bot.py --store digikala --users 20 --duration 30
+    python benchmarks/load_bot.py --latency-ms 400 --error-rate 0.1 --output run.json
+    python benchmarks/load_bot.py --mock-url http://127.0.0.1:8765   # use an already running mock_store.py
+
+eBay, Global and compare searches load pages through Playwright, so they
+need Chromium installed; Digikala's API backend runs on plain HTTP.
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import logging
+import argparse
+import itertools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from mock_store import MockStore, MockConfig, scraper_env
+
+STORE_BUTTONS = {
+    "digikala": "🔎 Digikala",
+    "ebay": "🔎 eBay",
+    "compare": "⚖️ Compare everywhere",
+    "global": "🔎 Global (link + name)",
+}
+WORDS = ("lamp", "headphone", "laptop", "mouse", "keyboard", "camera", "watch", "speaker")
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))] if ordered else None
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+class FakeChat:
+    """What one simulated user has seen since their last query."""
+
+    def __init__(self):
+        self.started = None       # "⏳ Searching ..." sent: the job left the queue
+        self.finished = None
+        self.outcome = None
+        self.done = asyncio.Event()
+
+    def reset(self):
+        self.started = self.finished = self.outcome = None
+        self.done.clear()
+
+    def saw(self, text: str):
+        now = time.monotonic()
+        if text.startswith("⏳ Searching") and self.started is None:
+            self.started = now
+        elif "⏱️ Search time" in text:
+            self.finish(now, "error" if 'href="#"' in text or "No results found" in text else "ok")
+        elif text.startswith(("⌛", "⚠️ You currently", "🚫", "⚠️ Please do not spam")):
+            self.finish(now, "rejected")
+
+    def finish(self, now, outcome):
+        if self.finished is None:
+            self.finished, self.outcome = now, outcome
+            self.done.set()
+
+
+class FakeBot:
+    """Stands in for telegram.Bot; records what each chat would have received."""
+
+    def __init__(self, chats):
+        self.chats = chats
+        self.ids = itertools.count(1)
+        self.sent = 0
+        self.edits = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        self.chats[chat_id].saw(text)
+        return types.SimpleNamespace(message_id=next(self.ids), chat_id=chat_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edits += 1
+        self.chats[chat_id].saw(text)
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, text):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    async def reply_text(self, text, **kwargs):
+        self.bot.chats[self.chat_id].saw(text)
+
+
+def fake_update(bot, chat_id, text):
+    return types.SimpleNamespace(message=FakeMessage(bot, chat_id, text), effective_user=None)
+
+
+async def user_loop(bot_module, context, chat_id, store, stop_at, args, results):
+    chat = context.bot.chats[chat_id]
+    for n in itertools.count():
+        if time.monotonic() >= stop_at:
+            return
+        query = f"{WORDS[(chat_id + n) % len(WORDS)]} {chat_id}-{n}"
+        if args.repeat and n % args.repeat == 0:
+            query = WORDS[n % len(WORDS)]  # shared query: exercises the cache and the in-flight merge
+
+        await bot_module.handle_message(fake_update(context.bot, chat_id, STORE_BUTTONS[store]), context)
+        if store == "global":
+            await bot_module.handle_message(fake_update(context.bot, chat_id, args.global_link), context)
+
+        chat.reset()
+        submitted = time.monotonic()
+        await bot_module.handle_message(fake_update(context.bot, chat_id, query), context)
+        try:
+            await asyncio.wait_for(chat.done.wait(), timeout=args.search_timeout)
+        except asyncio.TimeoutError:
+            chat.finish(time.monotonic(), "timeout")
+
+        results.append({
+            "outcome": chat.outcome,
+            "latency": chat.finished - submitted,
+            "queue_wait": chat.started - submitted if chat.started is not None else None,
+            "completed_at": chat.finished,
+        })
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000)
+
+
+async def run(args):
+    import bot as bot_module
+    import metrics
+
+    # every simulated user types far faster than a person; keep the anti-spam guard out of the way
+    bot_module.MAX_MESSAGES = 10 ** 9
+    if not args.pacing:
+        for module in (bot_module.digikala, bot_module.ebay, bot_module.web_global):
+            for name in ("RATE_LIMIT", "API_RATE_LIMIT", "DISCOVERY_RATE_LIMIT"):
+                if module is not None and hasattr(module, name):
+                    getattr(module, name).enabled = False
+
+    chats = {chat_id: FakeChat() for chat_id in range(1, args.users + 1)}
+    context = types.SimpleNamespace(bot=FakeBot(chats))
+    stores = args.store.split(",")
+    results: list = []
+
+    started = time.monotonic()
+    stop_at = started + args.duration
+    await asyncio.gather(*(
+        user_loop(bot_module, context, chat_id, stores[chat_id % len(stores)], stop_at, args, results)
+        for chat_id in chats
+    ))
+    elapsed = time.monotonic() - started
+
+    ok = [r for r in results if r["outcome"] == "ok"]
+    outcomes: dict = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    return {
+        "stores": stores,
+        "users": args.users,
+        "duration_s": round(elapsed, 1),
+        "searches": len(results),
+        "outcomes": outcomes,
+        "searches_per_s": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency": summary([r["latency"] for r in ok]),
+        "queue_wait": summary([r["queue_wait"] for r in results if r["queue_wait"] is not None]),
+        "telegram": {"sent": context.bot.sent, "edits": context.bot.edits},
+        "scheduler": bot_module.scheduler.stats(),
+        "limits": {name: limit.stats() for name, limit in bot_module.store_limits.items()},
+        "stages": metrics.STAGE_SECONDS.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="digikala", help="store or comma-separated stores: digikala,ebay,global,compare")
+    parser.add_argument("--users", type=int, default=10, help="simulated users searching at the same time")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to keep starting new searches")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between one user's searches")
+    parser.add_argument("--repeat", type=int, default=0, help="every Nth query is a shared one (0 = all unique)")
+    parser.add_argument("--search-timeout", type=float, default=120)
+    parser.add_argument("--global-link", default="https://shop0.example.ir/", help="site sent in Global mode")
+    parser.add_argument("--pacing", action="store_true", help="keep the scrapers' anti-bot rate limits on")
+    parser.add_argument("--mock-url", help="use a running mock_store.py instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=int)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot and scraper logs")
+    args = parser.parse_args()
+
+    mock = None
+    if args.mock_url:
+        base_url = args.mock_url.rstrip("/")
+    else:
+        mock = MockStore(config=MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.page_kb)).start()
+        base_url = mock.base_url
+    os.environ.update(scraper_env(base_url))  # read by the scrapers at import time
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+
+    try:
+        report = asyncio.run(run(args))
+        report["mock_url"] = base_url
+        if mock is not None:
+            report["mock_requests"] = dict(mock.counters)
+    finally:
+        if mock is not None:
+            mock.close()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
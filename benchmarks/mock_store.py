@@ -0,0 +1,207 @@
+"""
+Local stand-in for every site the scrapers talk to, for end-to-end load tests
+without touching the real stores.
+
+One server answers all of them, built from the saved pages in
+benchmarks/fixtures:
+
+    /search/?q=...        Digikala search page
+    /v1/search/?q=...     Digikala search API (JSON)
+    /sch/i.html?_nkw=...  eBay search results
+    /itm/<id>             eBay item page
+    /html/                DuckDuckGo HTML results (GET or POST)
+    /shop<n>/product/...  product pages the DuckDuckGo results point to
+    /__stats              request counters of this server (JSON)
+
+Absolute links inside the pages are rewritten to the server itself, so every
+follow-up request stays local. Latency, error rate and page size are
+configurable to model slow or flaky stores.
+
+Point the scrapers at it through the environment (see `scraper_env`):
+
+    python benchmarks/mock_store.py --port 8765 --latency-ms 300 --error-rate 0.05
+    DIGIKALA_BASE_URL=http://127.0.0.1:8765 DIGIKALA_API_URL=http://127.0.0.1:8765 \\
+    EBAY_BASE_URL=http://127.0.0.1:8765 DUCKDUCKGO_URL=http://127.0.0.1:8765/html/ python bot.py
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+# route prefix -> (fixture, content type)
+PAGES = {
+    "/search/": ("digikala_search.html", "text/html; charset=utf-8"),
+    "/v1/search/": ("digikala_api.json", "application/json"),
+    "/sch/i.html": ("ebay_srp.html", "text/html; charset=utf-8"),
+    "/itm/": ("ebay_item.html", "text/html; charset=utf-8"),
+    "/html/": ("duckduckgo_results.html", "text/html; charset=utf-8"),
+}
+PRODUCT_PAGES = ("generic_product_jsonld.html", "generic_product_microdata.html")
+
+_shop_re = re.compile(r"https://shop(\d+)\.example\.ir/")
+
+
+class MockConfig:
+    """Behaviour of the server; fields can be changed while it runs."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 page_kb: int | None = None, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.page_kb = page_kb            # None serves the fixtures at their own size
+        self.random = random.Random(seed)
+
+
+class MockStore:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: MockConfig | None = None):
+        self.config = config or MockConfig()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self.counters: dict = {}
+        self._lock = threading.Lock()
+        self._pages = {prefix: self._load(name) for prefix, (name, _) in PAGES.items()}
+        self._products = [self._load(name) for name in PRODUCT_PAGES]
+        self._thread = None
+
+    def _load(self, name: str) -> str:
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            body = f.read()
+        body = body.replace("https://www.ebay.com/", f"{self.base_url}/")
+        return _shop_re.sub(lambda m: f"{self.base_url}/shop{m.group(1)}/", body)
+
+    def _sized(self, body: str, content_type: str) -> bytes:
+        """Body padded or cut to `page_kb` (HTML only; JSON is served as is)."""
+        data = body.encode("utf-8")
+        size = self.config.page_kb
+        if size is None or not content_type.startswith("text/html"):
+            return data
+        target = size * 1024
+        if len(data) > target:
+            # keep the head and close the document; the result cards come first in every fixture
+            return data[:target].decode("utf-8", "ignore").encode("utf-8") + b"</body></html>"
+        filler = b"<div class=\"filler\">" + b"x" * 1000 + b"</div>\n"
+        return data + filler * ((target - len(data)) // len(filler))
+
+    def count(self, key: str):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def route(self, path: str):
+        """(body, content type) for a path, or None for 404."""
+        if path.startswith("/shop") and "/product/" in path:
+            # the same product always gets the same template
+            return self._products[sum(map(ord, path)) % len(self._products)], "text/html; charset=utf-8"
+        for prefix, (_, content_type) in PAGES.items():
+            if path.startswith(prefix):
+                return self._pages[prefix], content_type
+        return None
+
+    def _handler_class(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True   # headers and body go out in separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                self.respond()
+
+            def respond(self):
+                path = urlparse(self.path).path
+                if path == "/__stats":
+                    with store._lock:
+                        self.send(200, json.dumps(store.counters).encode(), "application/json")
+                    return
+
+                config = store.config
+                delay = config.latency_ms + config.random.uniform(0, config.jitter_ms)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                found = store.route(path)
+                if found is None:
+                    store.count("404")
+                    self.send(404, b"not found", "text/plain")
+                    return
+                if config.random.random() < config.error_rate:
+                    store.count("503")
+                    self.send(503, b"service unavailable", "text/plain")
+                    return
+
+                body, content_type = found
+                store.count(path.split("/")[1] or "/")
+                self.send(200, store._sized(body, content_type), content_type)
+
+            def send(self, status: int, data: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self) -> "MockStore":
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-store", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def scraper_env(base_url: str) -> dict:
+    """Environment variables that point every scraper at `base_url`."""
+    return {
+        "DIGIKALA_BASE_URL": base_url,
+        "DIGIKALA_API_URL": base_url,
+        "EBAY_BASE_URL": base_url,
+        "DUCKDUCKGO_URL": f"{base_url}/html/",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="fixed delay before every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra random delay, 0..jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--page-kb", type=int, help="pad or cut HTML pages to this size")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.page_kb, args.seed)
+    store = MockStore(args.host, args.port, config)
+    print(f"mock store on {store.base_url}")
+    for key, value in scraper_env(store.base_url).items():
+        print(f"  {key}={value}")
+    try:
+        store.server.serve_forever()
+    except KeyboardInterrupt:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,18 @@ import asyncio
 import logging
 import time
 from typing import Any, Dict, List, Optional
-from collections import deque
 
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
 import importlib
 
+from search_cache import SearchCache
+from scheduler import FairScheduler, current_job
+from adaptive_limit import AdaptiveLimit
+from worker_pool import WorkerPool
+from compare import COMPARE_DEADLINE, compare_search, format_timings
+import metrics
+
 #setting log
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -23,6 +29,11 @@ MAX_MESSAGES = 7
 INTERVAL_SECONDS = 3
 BLOCK_DURATION = 30
 
+# Metrics: Prometheus text on http://127.0.0.1:<METRICS_PORT>/metrics (None = off),
+# and optionally a per-stage breakdown of every search in the log
+METRICS_PORT = None
+TRACE_SEARCHES = False
+
 #safe import madule
 def safe_import(module_name: str):
     try:
@@ -35,69 +46,25 @@ digikala = safe_import("digikala_optimized")
 ebay = safe_import("ebay_optimized")
 web_global = safe_import("web_mimic_optimized")
 
-# Task Queue Management
-class ManagerQueue:
-    def __init__(self, name: str, max_concurrency: int = 3):
-        self.name = name
-        self.max_concurrency = max_concurrency
-        self.current_running = 0
-        self.lock = asyncio.Lock()
-        self.queue = asyncio.Queue()
-
-    async def submit(self, job: Dict[str, Any]) -> Dict[str, Any]:
-        async with self.lock:
-            if self.current_running < self.max_concurrency:
-                self.current_running += 1
-                asyncio.create_task(self._run_job(job))
-                return {"status": "running", "position": 0}
-            else:
-                await self.queue.put(job)
-                pos = self.queue.qsize()
-                return {"status": "queued", "position": pos}
-
-    async def _run_job(self, job: Dict[str, Any]):
-        try:
-            handler = job.get("handler_coroutine")
-            if asyncio.iscoroutinefunction(handler):
-                await handler()
-            else:
-                await asyncio.to_thread(handler)
-        except Exception as e:
-            logger.exception(f"❌Job Execution Error{self.name}: {e}")
-        finally:
-            async with self.lock:
-                self.current_running = max(0, self.current_running - 1)
-                if not self.queue.empty():
-                    next_job = await self.queue.get()
-                    self.current_running += 1
-                    asyncio.create_task(self._run_job(next_job))
-
-    async def cancel(self, chat_id: int) -> bool:
-        removed = False
-        try:
-            q_deque: deque = self.queue._queue  # type: ignore[attr-defined]
-            new_deque = deque([job for job in q_deque if job.get("chat_id") != chat_id])
-            if len(new_deque) != len(q_deque):
-                removed = True
-            self.queue._queue = new_deque  # type: ignore[attr-defined]
-        except Exception as e:
-            logger.warning(f"⚠️Error Canceling{self.name}: {e}")
-        return removed
-
-    def is_user_queued(self, chat_id: int) -> bool:
-        try:
-            q_deque: deque = self.queue._queue  # type: ignore[attr-defined]
-            return any(job.get("chat_id") == chat_id for job in q_deque)
-        except Exception:
-            return False
-
-
 #Task Queue & status
-managers = {
-    "digikala": ManagerQueue("digikala", max_concurrency=3),
-    "ebay": ManagerQueue("ebay", max_concurrency=3),
-    "global": ManagerQueue("global", max_concurrency=3),
+# One fair scheduler for all stores: users share each store's slots fairly,
+# stores share the global budget, and stale queued jobs are dropped.
+# Each store's concurrency follows its live latency and failure rate (AIMD).
+store_limits = {
+    "digikala": AdaptiveLimit("digikala", initial=3, floor=1, ceiling=5),
+    "ebay": AdaptiveLimit("ebay", initial=3, floor=1, ceiling=8),
+    "global": AdaptiveLimit("global", initial=3, floor=1, ceiling=6),
 }
+scheduler = FairScheduler({**store_limits, "compare": 2})
+for limit in store_limits.values():
+    limit.on_raise = scheduler.wake   # released on the event loop (call_scraper / iter_scraper)
+
+# Worker mode: run the scrapers in separate processes (see worker_pool.py)
+WORKER_MODE = False
+worker_pool = WorkerPool() if WORKER_MODE else None
+if worker_pool is not None:
+    # only store jobs run scrapers; a compare job just waits for its store jobs
+    scheduler.add_gate(worker_pool.reserve, worker_pool.release, stores=store_limits)
 
 user_state: Dict[int, Dict[str, Any]] = {}
 user_running: Dict[int, bool] = {}
@@ -113,6 +80,7 @@ def main_keyboard():
         [KeyboardButton("🔎 Digikala")],
         [KeyboardButton("🔎 eBay")],
         [KeyboardButton("🔎 Global (link + name)")],
+        [KeyboardButton("⚖️ Compare everywhere")],
         [KeyboardButton("❌ Cancel Operation")],
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -131,35 +99,174 @@ def format_results_html(results: List[Dict[str, Any]]) -> str:
         elif isinstance(price, str) and price.replace(",", "").isdigit():
             price = f"{price} تومان"
         title_esc = title.replace("<", "&lt;").replace(">", "&gt;")
-        lines.append(f"{i}. <a href=\"{url}\">{title_esc}</a>\n💰 قیمت: {price}")
+        if r.get("store"):
+            title_esc = f"[{r['store']}] {title_esc}"
+        line = f"{i}. <a href=\"{url}\">{title_esc}</a>\n💰 قیمت: {price}"
+        if r.get("converted"):
+            line += f" ({r['converted']})"
+        extras = [x.replace("<", "&lt;").replace(">", "&gt;") for x in (r.get("condition"), r.get("shipping")) if x]
+        if extras:
+            line += "\n📦 " + " | ".join(extras)
+        lines.append(line)
     return "\n\n".join(lines)
 
+def scraper_target(scraper_key: str, query: str, link: Optional[str] = None):
+    """Module, search function names and positional args for a store."""
+    if scraper_key == "digikala":
+        return digikala, ("search",), (query,)
+    elif scraper_key == "ebay":
+        return ebay, ("search",), (query,)
+    elif scraper_key == "global":
+        return web_global, ("search_with_link", "search"), (link, query)
+    raise RuntimeError("key scraper is invalid.")
+
+def is_failed_result(results) -> bool:
+    """
+    True when a scraper reported an error result (tagged "error"). Other
+    url "#" replies, such as rejected input, are answers, not store failures,
+    and must not shrink the store's adaptive limit.
+    """
+    return any(isinstance(r, dict) and r.get("error") for r in results or [])
+
 #run safe scraper
 async def call_scraper(scraper_key: str, *, query: str, link: Optional[str] = None, max_results: int = 5):
-    loop = asyncio.get_event_loop()
     try:
-        if scraper_key == "digikala":
-            func = getattr(digikala, "search", None)
-            args = (query,)
-        elif scraper_key == "ebay":
-            func = getattr(ebay, "search", None)
-            args = (query,)
-        elif scraper_key == "global":
-            func = getattr(web_global, "search_with_link", None) or getattr(web_global, "search", None)
-            args = (link, query)
+        module, names, args = scraper_target(scraper_key, query, link)
+
+        if worker_pool is not None:
+            run = lambda: worker_pool.run(scraper_key, query=query, link=link, max_results=max_results)
         else:
-            raise RuntimeError("key scraper is invalid.")
+            # Prefer the native asyncio version (`<name>_async`) so no thread is held per search
+            func = None
+            for name in names:
+                func = getattr(module, f"{name}_async", None) or getattr(module, name, None)
+                if func:
+                    break
+
+            if not func:
+                raise RuntimeError(f"Search function not found in the module.{scraper_key}")
+
+            if asyncio.iscoroutinefunction(func):
+                run = lambda: func(*args, max_results=max_results)
+            else:
+                run = lambda: asyncio.to_thread(func, *args, max_results=max_results)  # carries the metrics context
 
-        if not func:
-            raise RuntimeError(f"Search function not found in the module.{scraper_key}")
+        limiter = store_limits[scraper_key]
+        started = limiter.acquire()
+        ok = False
+        try:
+            with metrics.bind(store=scraper_key):
+                results = await run()
+            ok = not is_failed_result(results)
+            return results
+        finally:
+            limiter.release(started, ok)
+    except Exception as e:
+        logger.error(f"❌ Error executing {scraper_key}: {e}")
+        return [{"title": "search error", "url": "#", "price": str(e), "error": True}]
 
-        if asyncio.iscoroutinefunction(func):
-            return await func(*args, max_results=max_results)
-        else:
-            return await loop.run_in_executor(None, lambda: func(*args, max_results=max_results))
+
+# Result cache in front of the scrapers (in-process LRU + optional SQLite tier)
+BACKGROUND_CHAT_ID = 0   # scheduler "user" that owns cache refreshes, so they get one fair share
+
+def run_in_background(store: str, job, on_expired):
+    """Stale-while-revalidate refreshes wait for the store's slots and limits like any search."""
+    scheduler.submit(store, BACKGROUND_CHAT_ID, job, on_expired=on_expired)
+
+search_cache = SearchCache(background=run_in_background)
+
+async def cached_call_scraper(scraper_key: str, *, query: str, link: Optional[str] = None, max_results: int = 5):
+    return await search_cache.get_or_fetch(
+        scraper_key, query, max_results,
+        lambda: call_scraper(scraper_key, query=query, link=link, max_results=max_results),
+        scope=link,
+    )
+
+async def queued_call_scraper(scraper_key: str, chat_id: int, *, query: str, max_results: int = 5,
+                              deadline: Optional[float] = None, jobs: Optional[set] = None):
+    """
+    call_scraper run as a job in the store's own lane, so a search started on
+    behalf of another one (a comparison) waits for that store's slots and
+    limits like any direct search. A job still queued when the caller gives
+    up is cancelled; a job cancelled by its owner (/cancel) returns an error
+    result right away. The job id sits in `jobs` while it exists, so its
+    owner can be changed. Code that already runs as a job of this store (a
+    cache refresh) scrapes directly instead of waiting for a second slot.
+    """
+    running = current_job()
+    if running is not None and running.store == scraper_key:
+        return await call_scraper(scraper_key, query=query, max_results=max_results)
+
+    done = asyncio.get_running_loop().create_future()
+
+    async def job():
+        results = await call_scraper(scraper_key, query=query, max_results=max_results)
+        if not done.done():
+            done.set_result(results)
+
+    def give_up(reason):
+        if not done.done():
+            done.set_result([{"title": "search error", "url": "#", "price": reason, "error": True}])
+
+    job_id = scheduler.submit(scraper_key, chat_id, job, deadline=deadline,
+                              on_expired=lambda: give_up("queue deadline passed"),
+                              on_cancel=lambda: give_up("search cancelled"))["job_id"]
+    if jobs is not None:
+        jobs.add(job_id)
+    try:
+        return await done
+    except asyncio.CancelledError:
+        scheduler.cancel_job(job_id)   # no-op once the job has started
+        raise
+    finally:
+        if jobs is not None:
+            jobs.discard(job_id)
+
+async def iter_scraper(scraper_key: str, *, query: str, link: Optional[str] = None, max_results: int = 5):
+    """
+    Yield (rank, result) as the scraper parses products. Scrapers without an
+    `iter_search_async` (and worker mode) yield everything at once from call_scraper.
+    """
+    try:
+        module, _, args = scraper_target(scraper_key, query, link)
+    except RuntimeError:
+        module, args = None, ()
+    stream = getattr(module, "iter_search_async", None) if worker_pool is None else None
+    if stream is None:
+        for rank, result in enumerate(await call_scraper(scraper_key, query=query, link=link, max_results=max_results)):
+            yield rank, result
+        return
+
+    limiter = store_limits[scraper_key]
+    started = limiter.acquire()
+    ok = False
+    yielded = failed = False
+    try:
+        async for rank, result in stream(*args, max_results=max_results):
+            yielded = True
+            failed = failed or is_failed_result([result])   # a scraper's own error result
+            yield rank, result
+        ok = not failed
     except Exception as e:
         logger.error(f"❌ Error executing {scraper_key}: {e}")
-        return [{"title": "search error", "url": "#", "price": str(e)}]
+        if not yielded:
+            yield 0, {"title": "search error", "url": "#", "price": str(e), "error": True}
+    finally:
+        limiter.release(started, ok)
+
+async def cached_stream_scraper(scraper_key: str, *, query: str, link: Optional[str] = None,
+                                max_results: int = 5, on_partial=None):
+    """Like cached_call_scraper, but `on_partial(results)` sees the rank-ordered results found so far."""
+    async def fetch():
+        ranked = []
+        async for rank, result in iter_scraper(scraper_key, query=query, link=link, max_results=max_results):
+            ranked.append((rank, result))
+            ranked.sort(key=lambda item: item[0])
+            if on_partial is not None:
+                on_partial([r for _, r in ranked])
+        return [r for _, r in ranked]
+
+    return await search_cache.get_or_fetch(scraper_key, query, max_results, fetch, scope=link)
 
 
 # Basic commands
@@ -190,22 +297,18 @@ async def shop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "🏪 Searchable Stores:\n"
         "1️⃣ Digikala\n"
         "2️⃣ eBay\n"
-        "3️⃣ Global (link + name)\n\n"
+        "3️⃣ Global (link + name)\n"
+        "⚖️ Compare everywhere (all stores at once)\n\n"
         "Please choose one of the options 👇"
     )
     await update.message.reply_text(text, reply_markup=main_keyboard())
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.message.chat_id
-    removed_any = False
+    removed_any = detach_from_searches(chat_id)
 
-    for name, mgr in managers.items():
-        try:
-            removed = await mgr.cancel(chat_id)
-            if removed:
-                removed_any = True
-        except Exception as e:
-            logger.warning(f"⚠️ Error in cancel from manager {name}: {e}")
+    if scheduler.cancel_user(chat_id):
+        removed_any = True
 
     if user_running.get(chat_id):
         user_running.pop(chat_id, None)
@@ -220,6 +323,183 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("ℹ️ No active operations found.", reply_markup=start_keyboard())
 
 
+# Identical searches in flight: key -> {"subscribers": [chat_id, ...], "job_id": scheduler job id,
+#                                      "sub_jobs": ids of a comparison's queued store jobs}
+# Later requests for the same store + normalized query attach as subscribers
+# instead of taking another queue slot.
+inflight_searches: Dict[str, Dict[str, Any]] = {}
+
+async def safe_send(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, **kwargs):
+    try:
+        with metrics.timed("telegram_send"):
+            return await context.bot.send_message(chat_id, text, **kwargs)
+    except Exception as e:
+        metrics.TELEGRAM_ERRORS.inc(kind="send")
+        logger.warning(f"⚠️ Could not send message to {chat_id}: {e}")
+        return None
+
+EDIT_INTERVAL = 1.5   # minimum seconds between edits of a streamed message (Telegram edit limits)
+
+class StreamingReply:
+    """
+    One "Searching ..." message per subscriber, edited in place as results
+    arrive. Updates inside EDIT_INTERVAL are coalesced into a single edit.
+    """
+
+    def __init__(self, context: ContextTypes.DEFAULT_TYPE, label: str, subscribers: List[int]):
+        self.context = context
+        self.label = label
+        self.subscribers = subscribers
+        self.messages: Dict[int, int] = {}
+        self.pending: Optional[List[Dict[str, Any]]] = None
+        self.last_edit = 0.0
+        self.flush_task: Optional[asyncio.Task] = None
+        self.done = False
+
+    async def open(self):
+        for sub in list(self.subscribers):
+            try:
+                await self.context.bot.send_chat_action(sub, "typing")
+            except Exception:
+                pass
+            msg = await safe_send(self.context, sub, f"⏳ Searching on {self.label} ...")
+            if msg is not None:
+                self.messages[sub] = msg.message_id
+
+    def update(self, results: List[Dict[str, Any]]):
+        if self.done:
+            return
+        self.pending = results
+        if self.flush_task is None:
+            delay = max(0.0, self.last_edit + EDIT_INTERVAL - time.monotonic())
+            self.flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        # flush_task stays set until the edit is done, so finish() can cancel and await it
+        # and a late partial edit never lands on top of the final text
+        await asyncio.sleep(delay)
+        if not self.done and self.pending is not None:
+            results, self.pending = self.pending, None
+            await self._edit(format_results_html(results) + f"\n\n⏳ Searching on {self.label} ... ({len(results)} found so far)")
+        self.flush_task = None
+        if not self.done and self.pending is not None:
+            self.flush_task = asyncio.create_task(self._flush_later(EDIT_INTERVAL))
+
+    async def finish(self, text: str):
+        self.done = True
+        task, self.flush_task = self.flush_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self._edit(text, send_missing=True)
+
+    async def _edit(self, text: str, send_missing: bool = False):
+        self.last_edit = time.monotonic()
+        for sub in list(self.subscribers):
+            message_id = self.messages.get(sub)
+            if message_id is not None:
+                try:
+                    with metrics.timed("telegram_send"):
+                        await self.context.bot.edit_message_text(text, chat_id=sub, message_id=message_id, parse_mode='HTML')
+                    continue
+                except Exception as e:
+                    if "not modified" in str(e).lower():
+                        continue
+                    metrics.TELEGRAM_ERRORS.inc(kind="edit")
+                    logger.warning(f"⚠️ Could not edit message for {sub}: {e}")
+            if send_missing:
+                await safe_send(self.context, sub, text, parse_mode='HTML')
+
+async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE, store: str, label: str,
+                       query: str, link: Optional[str] = None) -> None:
+    chat_id = update.message.chat_id
+    if user_running.get(chat_id):
+        await update.message.reply_text("⚠️ You currently have an active search. Please wait or press ❌ to cancel the operation.")
+        return
+
+    user_running[chat_id] = True
+    key = search_cache.make_key(store, query, 5, scope=link)
+
+    flight = inflight_searches.get(key)
+    if flight is not None:
+        flight["subscribers"].append(chat_id)
+        await update.message.reply_text(f"✅ The same search is already in progress on {label}, you will receive its results.")
+        return
+
+    flight = {"subscribers": [chat_id], "sub_jobs": set()}
+    inflight_searches[key] = flight
+
+    async def handler():
+        start_time = time.time()
+        reply = StreamingReply(context, label, flight["subscribers"])
+        status = "error"
+        with metrics.trace() as spans:
+            try:
+                await reply.open()
+                if store == "compare":
+                    # each store's search queues in that store's lane; only cache misses wait
+                    async def fetch_store(s, q):
+                        owner = flight["subscribers"][0] if flight["subscribers"] else chat_id
+                        return await search_cache.get_or_fetch(s, q, 5, lambda: queued_call_scraper(
+                            s, owner, query=q, deadline=COMPARE_DEADLINE, jobs=flight["sub_jobs"]))
+
+                    outcome = await compare_search(query, fetch_store, on_partial=reply.update)
+                    status = "ok" if outcome["results"] else "empty"
+                    msg = format_results_html(outcome["results"][:10]) + "\n\n🏪 " + format_timings(outcome)
+                else:
+                    results = await cached_stream_scraper(store, query=query, link=link, on_partial=reply.update)
+                    status = "failed" if is_failed_result(results) else ("ok" if results else "empty")
+                    msg = format_results_html(results)
+                duration = round(time.time() - start_time, 2)
+                await reply.finish(msg + f"\n\n⏱️ Search time: {duration} seconds")
+            finally:
+                reply.done = True
+                if inflight_searches.get(key) is flight:
+                    inflight_searches.pop(key, None)
+                for sub in flight["subscribers"]:
+                    user_running.pop(sub, None)
+                    user_state.pop(sub, None)
+                metrics.observe("search", time.time() - start_time)
+                metrics.SEARCHES.inc(store=store, status=status)
+                if TRACE_SEARCHES:
+                    job = scheduler.jobs.get(flight.get("job_id"))
+                    queued = job.started_at - job.enqueued_at if job is not None and job.started_at else 0.0
+                    logger.info(f"🧭 '{query}' on {label}: queued {queued:.2f}s, {metrics.stage_totals(spans)}\n"
+                                f"{metrics.format_trace(spans)}")
+
+    async def on_expired():
+        if inflight_searches.get(key) is flight:
+            inflight_searches.pop(key, None)
+        for sub in flight["subscribers"]:
+            user_running.pop(sub, None)
+            user_state.pop(sub, None)
+            await safe_send(context, sub, f"⌛ The queue for {label} was too long and your search was dropped. Please try again.")
+
+    submit_res = scheduler.submit(store, chat_id, handler, on_expired=on_expired)
+    flight["job_id"] = submit_res["job_id"]
+    await update.message.reply_text(
+        "✅ Search has started." if submit_res["status"] == "running"
+        else f"⚙️ You are in the queue for {label} (position {submit_res['position']}, about {submit_res['eta']} seconds)."
+    )
+
+def detach_from_searches(chat_id: int) -> bool:
+    """Remove a user from every search they subscribed to; the search keeps running for the others."""
+    detached = False
+    for key, flight in list(inflight_searches.items()):
+        if chat_id not in flight["subscribers"]:
+            continue
+        flight["subscribers"].remove(chat_id)
+        detached = True
+        if flight["subscribers"]:
+            # hand the search's queued jobs over to the next subscriber, so /cancel does not drop them
+            for job_id in (flight.get("job_id"), *flight["sub_jobs"]):
+                job = scheduler.jobs.get(job_id)
+                if job is not None and job.chat_id == chat_id:
+                    scheduler.reassign(job.id, flight["subscribers"][0])
+        else:
+            inflight_searches.pop(key, None)
+    return detached
+
 # مدیریت پیام‌ها
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.message.text:
@@ -260,6 +540,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         user_state[chat_id] = {"mode": "ebay"}
         await update.message.reply_text("🌍 Please send the product name to search on eBay:")
         return
+    if text == "⚖️ Compare everywhere":
+        user_state[chat_id] = {"mode": "compare"}
+        await update.message.reply_text("⚖️ Please send the product name to compare prices on all stores:")
+        return
     if text == "🔎 Global (link + name)":
         user_state[chat_id] = {"mode": "global_link"}
         await update.message.reply_text("⚠️ In Global mode, errors may occur 🌐\n\n🔗 Please send the website link:")
@@ -273,55 +557,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     # Digikala
     if mode == "digikala":
-        if user_running.get(chat_id):
-            await update.message.reply_text("⚠️ You currently have an active search. Please wait or press ❌ to cancel the operation.")
-            return
-
-        async def handler():
-            start_time = time.time()
-            try:
-                await context.bot.send_chat_action(chat_id, "typing")
-                await context.bot.send_message(chat_id, "⏳ Searching on Digikala ...")
-                results = await call_scraper("digikala", query=text)
-                duration = round(time.time() - start_time, 2)
-                msg = format_results_html(results)
-                await context.bot.send_message(chat_id, msg + f"\n\n⏱️ Search time: {duration} seconds", parse_mode='HTML')
-            finally:
-                user_running.pop(chat_id, None)
-                user_state.pop(chat_id, None)
-
-        user_running[chat_id] = True
-        submit_res = await managers["digikala"].submit({"chat_id": chat_id, "handler_coroutine": handler})
-        await update.message.reply_text(
-            "✅ Search has started." if submit_res["status"] == "running"
-            else f"⚙️ You are in the queue for Digikala (position {submit_res['position']})."
-        )
+        await start_search(update, context, "digikala", "Digikala", text)
 
     # eBay
     elif mode == "ebay":
-        if user_running.get(chat_id):
-            await update.message.reply_text("⚠️ You currently have an active search. Please wait or press ❌ to cancel the operation.")
-            return
-
-        async def handler():
-            start_time = time.time()
-            try:
-                await context.bot.send_chat_action(chat_id, "typing")
-                await context.bot.send_message(chat_id, "⏳ Searching on eBay ...")
-                results = await call_scraper("ebay", query=text)
-                duration = round(time.time() - start_time, 2)
-                msg = format_results_html(results)
-                await context.bot.send_message(chat_id, msg + f"\n\n⏱️ Search time: {duration} seconds", parse_mode='HTML')
-            finally:
-                user_running.pop(chat_id, None)
-                user_state.pop(chat_id, None)
+        await start_search(update, context, "ebay", "eBay", text)
 
-        user_running[chat_id] = True
-        submit_res = await managers["ebay"].submit({"chat_id": chat_id, "handler_coroutine": handler})
-        await update.message.reply_text(
-            "✅ Search has started." if submit_res["status"] == "running"
-            else f"⚙️ You are in the queue for eBay (position {submit_res['position']})."
-        )
+    # All stores at once
+    elif mode == "compare":
+        await start_search(update, context, "compare", "all stores", text)
 
     # Global
     elif mode == "global_link":
@@ -331,34 +575,24 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     elif mode == "global_name":
-        if user_running.get(chat_id):
-            await update.message.reply_text("⚠️ You currently have an active search. Please wait or press ❌ to cancel the operation.")
-            return
-
         link = user_state[chat_id].get("link")
+        await start_search(update, context, "global", "Global", text, link=link)
+
+async def start_workers(app: Application) -> None:
+    await asyncio.to_thread(worker_pool.start)
+    worker_pool.bind(asyncio.get_running_loop(), scheduler.wake)
+
+async def stop_workers(app: Application) -> None:
+    worker_pool.close()
 
-        async def handler():
-            start_time = time.time()
-            try:
-                await context.bot.send_chat_action(chat_id, "typing")
-                await context.bot.send_message(chat_id, "⏳ Searching on Global ...")
-                results = await call_scraper("global", query=text, link=link)
-                duration = round(time.time() - start_time, 2)
-                msg = format_results_html(results)
-                await context.bot.send_message(chat_id, msg + f"\n\n⏱️ Search time: {duration} seconds", parse_mode='HTML')
-            finally:
-                user_running.pop(chat_id, None)
-                user_state.pop(chat_id, None)
-
-        user_running[chat_id] = True
-        submit_res = await managers["global"].submit({"chat_id": chat_id, "handler_coroutine": handler})
-        await update.message.reply_text(
-            "✅ Search has started." if submit_res["status"] == "running"
-            else f"⚙️ You are in the queue for Global (position {submit_res['position']})."
-        )
 def main():
     logger.info("🚀 Starting Telegram Scraper Bot ...")
-    app = Application.builder().token(API_TOKEN).build()
+    builder = Application.builder().token(API_TOKEN)
+    if worker_pool is not None:
+        builder = builder.post_init(start_workers).post_shutdown(stop_workers)
+    app = builder.build()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help))
@@ -0,0 +1,423 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from page_profiles import log_context_stats
+import metrics
+
+# Logging settings
+logger = logging.getLogger("browser_pool")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+# Pool settings
+POOL_SIZE = 2                  # warm browsers kept per worker thread
+MAX_BROWSERS = 6               # sync browsers across all threads of the process
+SLOT_TIMEOUT = 60              # seconds a thread without a browser waits for a free slot
+MAX_PAGES_PER_BROWSER = 50     # recycle a browser after this many pages
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/122.0 Safari/537.36"
+)
+
+
+class _PooledBrowser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.launch_seconds = 0.0
+        self.pages_served = 0
+        self.in_use = 0
+
+    def is_alive(self) -> bool:
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class _ThreadState:
+    """The driver and browsers owned by one thread."""
+
+    def __init__(self, playwright):
+        self.thread = threading.current_thread()
+        self.playwright = playwright
+        self.browsers: list[_PooledBrowser] = []
+        self.cursor = 0
+
+
+class BrowserPool:
+    """
+    Keeps warm Chromium instances and hands out an isolated context per job.
+
+    Sync Playwright objects belong to the thread that created them, so every
+    worker thread gets its own driver and up to `size` browsers. The bot's
+    executor threads are reused, which keeps those browsers warm between
+    searches. All threads together stay under `max_browsers`: a thread that
+    already has a browser shares it instead of launching more, one without
+    any waits for a slot. Every thread's driver is registered here, and the
+    driver of a thread that has exited is stopped (its browsers exit with it).
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_pages: int = MAX_PAGES_PER_BROWSER,
+                 headless: bool = True, launch_args: list | None = None, max_browsers: int = MAX_BROWSERS):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.max_browsers = max(1, max_browsers)
+        self.headless = headless
+        self.launch_args = launch_args or []
+        self._local = threading.local()
+        self._states: dict[int, _ThreadState] = {}
+        self._slots = threading.Condition()     # guards _states and _browsers
+        self._browsers = 0                      # launched and not yet retired, all threads
+        self._stats_lock = threading.Lock()
+        self._stats = {"launches": 0, "recycles": 0, "crashes": 0, "pages": 0, "orphans_stopped": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _state(self) -> _ThreadState:
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = _ThreadState(sync_playwright().start())
+            with self._slots:
+                self._states[threading.get_ident()] = state
+        return state
+
+    def _take_slot(self, wait: bool) -> bool:
+        """Count one more browser against max_browsers; False (or an error after waiting) when full."""
+        give_up = time.monotonic() + SLOT_TIMEOUT
+        with self._slots:
+            while True:
+                self._reap_orphans()
+                if self._browsers < self.max_browsers:
+                    self._browsers += 1
+                    return True
+                remaining = give_up - time.monotonic()
+                if not wait:
+                    return False
+                if remaining <= 0:
+                    raise RuntimeError(f"no browser slot free after {SLOT_TIMEOUT}s ({self.max_browsers} in use)")
+                self._slots.wait(min(remaining, 1.0))
+
+    def _free_slots(self, n: int = 1):
+        with self._slots:
+            self._browsers = max(0, self._browsers - n)
+            self._slots.notify_all()
+
+    def _reap_orphans(self):
+        """Stop the drivers of threads that exited while owning browsers; called with _slots held."""
+        for ident, state in list(self._states.items()):
+            if state.thread.is_alive():
+                continue
+            del self._states[ident]
+            self._browsers = max(0, self._browsers - len(state.browsers))
+            self._slots.notify_all()
+            # their Playwright objects cannot be used from this thread, so end the driver
+            # process itself; Chromium exits when its pipe to the driver closes
+            transport = getattr(getattr(getattr(state.playwright, "_impl_obj", None), "_connection", None), "_transport", None)
+            process = getattr(transport, "_proc", None)
+            if process is not None:
+                try:
+                    os.kill(process.pid, signal.SIGKILL)
+                except (OSError, AttributeError):
+                    pass
+            self._count("orphans_stopped")
+            logger.info(f"🧹 Stopped the browsers of exited thread {state.thread.name} ({len(state.browsers)} browser(s))")
+
+    def _launch(self, state) -> _PooledBrowser:
+        started = time.perf_counter()
+        try:
+            browser = state.playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+        except Exception:
+            self._free_slots()
+            raise
+        self._count("launches")
+        pooled = _PooledBrowser(browser)
+        pooled.launch_seconds = time.perf_counter() - started
+        metrics.observe("browser_launch", pooled.launch_seconds)
+        logger.info(f"🚀 Browser launched in {pooled.launch_seconds:.2f}s "
+                    f"(thread {threading.current_thread().name})")
+        return pooled
+
+    def _retire(self, state, pooled: _PooledBrowser, reason: str):
+        if pooled in state.browsers:
+            state.browsers.remove(pooled)
+            self._free_slots()
+        self._count("recycles")
+        logger.info(f"♻️ Recycling browser ({reason}, {pooled.pages_served} pages served)")
+        try:
+            pooled.browser.close()
+        except Exception:
+            pass
+
+    def _acquire(self) -> tuple:
+        """(browser, seconds spent launching it in this call)"""
+        state = self._state()
+
+        for pooled in list(state.browsers):
+            if not pooled.is_alive():
+                self._count("crashes")
+                self._retire(state, pooled, "disconnected")
+            elif pooled.pages_served >= self.max_pages and pooled.in_use == 0:
+                self._retire(state, pooled, "page limit")
+
+        launched = 0.0
+        if len(state.browsers) < self.size and self._take_slot(wait=not state.browsers):
+            pooled = self._launch(state)
+            launched = pooled.launch_seconds
+            state.browsers.append(pooled)
+        else:
+            state.cursor = (state.cursor + 1) % len(state.browsers)
+            rotated = state.browsers[state.cursor:] + state.browsers[:state.cursor]
+            fresh = [b for b in rotated if b.pages_served < self.max_pages] or rotated
+            pooled = min(fresh, key=lambda b: b.in_use)
+
+        pooled.in_use += 1
+        pooled.pages_served += 1
+        self._count("pages")
+        return pooled, launched
+
+    def _release(self, pooled: _PooledBrowser, failed: bool):
+        pooled.in_use = max(0, pooled.in_use - 1)
+        state = self._state()
+        if failed and not pooled.is_alive():
+            self._count("crashes")
+            self._retire(state, pooled, "crashed")
+        elif pooled.pages_served >= self.max_pages and pooled.in_use == 0:
+            self._retire(state, pooled, "page limit")
+
+    @contextmanager
+    def context(self, profile=None, **context_kwargs):
+        """
+        Yield a fresh BrowserContext on a warm browser; it is closed on exit.
+        `profile` is a page_profiles.PageProfile whose request rules apply to it.
+        """
+        context_kwargs.setdefault("user_agent", DEFAULT_USER_AGENT)
+        requested = time.perf_counter()
+        pooled, launched = self._acquire()
+        failed = False
+        context = None
+        route_stats = None
+        try:
+            context = pooled.browser.new_context(**context_kwargs)
+            if profile is not None:
+                route_stats = profile.attach(context)
+            metrics.observe("browser_wait", time.perf_counter() - requested - launched)
+            yield context
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if context is not None:
+                try:
+                    context.close()
+                except Exception:
+                    failed = True
+            if route_stats is not None:
+                log_context_stats(profile, route_stats)
+            self._release(pooled, failed)
+
+    @contextmanager
+    def page(self, profile=None, **context_kwargs):
+        """Yield a page inside its own isolated context."""
+        with self.context(profile=profile, **context_kwargs) as context:
+            yield context.new_page()
+
+    def close(self):
+        """Close the browsers and driver owned by the calling thread."""
+        state = getattr(self._local, "state", None)
+        if state is None:
+            return
+        self._local.state = None
+        with self._slots:
+            self._states.pop(threading.get_ident(), None)
+        for pooled in list(state.browsers):
+            try:
+                pooled.browser.close()
+            except Exception:
+                pass
+        self._free_slots(len(state.browsers))
+        state.browsers = []
+        try:
+            state.playwright.stop()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        with self._slots:
+            self._reap_orphans()
+            threads, browsers = len(self._states), self._browsers
+        with self._stats_lock:
+            return {**self._stats, "threads": threads, "browsers": browsers}
+
+
+_pool: BrowserPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    """Return the process-wide browser pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+class AsyncBrowserPool:
+    """
+    Async twin of BrowserPool for `playwright.async_api`.
+
+    All coroutines on the event loop share the same `size` warm browsers, so
+    hundreds of searches can be in flight without a thread each.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_pages: int = MAX_PAGES_PER_BROWSER,
+                 headless: bool = True, launch_args: list | None = None):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.headless = headless
+        self.launch_args = launch_args or []
+        self._playwright = None
+        self._browsers: list[_PooledBrowser] = []
+        self._cursor = 0
+        self._lock = asyncio.Lock()
+        self._stats = {"launches": 0, "recycles": 0, "crashes": 0, "pages": 0}
+
+    async def _launch(self) -> _PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        started = time.perf_counter()
+        browser = await self._playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+        self._stats["launches"] += 1
+        pooled = _PooledBrowser(browser)
+        pooled.launch_seconds = time.perf_counter() - started
+        metrics.observe("browser_launch", pooled.launch_seconds)
+        logger.info(f"🚀 Async browser launched in {pooled.launch_seconds:.2f}s")
+        return pooled
+
+    async def _retire(self, pooled: _PooledBrowser, reason: str):
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        self._stats["recycles"] += 1
+        logger.info(f"♻️ Recycling async browser ({reason}, {pooled.pages_served} pages served)")
+        try:
+            await pooled.browser.close()
+        except Exception:
+            pass
+
+    async def _acquire(self) -> tuple:
+        async with self._lock:
+            for pooled in list(self._browsers):
+                if not pooled.is_alive():
+                    self._stats["crashes"] += 1
+                    await self._retire(pooled, "disconnected")
+                elif pooled.pages_served >= self.max_pages and pooled.in_use == 0:
+                    await self._retire(pooled, "page limit")
+
+            launched = 0.0
+            if len(self._browsers) < self.size:
+                pooled = await self._launch()
+                launched = pooled.launch_seconds
+                self._browsers.append(pooled)
+            else:
+                self._cursor = (self._cursor + 1) % len(self._browsers)
+                rotated = self._browsers[self._cursor:] + self._browsers[:self._cursor]
+                fresh = [b for b in rotated if b.pages_served < self.max_pages] or rotated
+                pooled = min(fresh, key=lambda b: b.in_use)
+
+            pooled.in_use += 1
+            pooled.pages_served += 1
+            self._stats["pages"] += 1
+            return pooled, launched
+
+    async def _release(self, pooled: _PooledBrowser, failed: bool):
+        async with self._lock:
+            pooled.in_use = max(0, pooled.in_use - 1)
+            if failed and not pooled.is_alive():
+                self._stats["crashes"] += 1
+                await self._retire(pooled, "crashed")
+            elif pooled.pages_served >= self.max_pages and pooled.in_use == 0:
+                await self._retire(pooled, "page limit")
+
+    @asynccontextmanager
+    async def context(self, profile=None, **context_kwargs):
+        """
+        Yield a fresh BrowserContext on a warm browser; it is closed on exit.
+        `profile` is a page_profiles.PageProfile whose request rules apply to it.
+        """
+        context_kwargs.setdefault("user_agent", DEFAULT_USER_AGENT)
+        requested = time.perf_counter()
+        pooled, launched = await self._acquire()
+        failed = False
+        context = None
+        route_stats = None
+        try:
+            context = await pooled.browser.new_context(**context_kwargs)
+            if profile is not None:
+                route_stats = await profile.attach_async(context)
+            metrics.observe("browser_wait", time.perf_counter() - requested - launched)
+            yield context
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    failed = True
+            if route_stats is not None:
+                log_context_stats(profile, route_stats)
+            await self._release(pooled, failed)
+
+    @asynccontextmanager
+    async def page(self, profile=None, **context_kwargs):
+        """Yield a page inside its own isolated context."""
+        async with self.context(profile=profile, **context_kwargs) as context:
+            yield await context.new_page()
+
+    async def close(self):
+        async with self._lock:
+            for pooled in list(self._browsers):
+                try:
+                    await pooled.browser.close()
+                except Exception:
+                    pass
+            self._browsers = []
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+_async_pool: AsyncBrowserPool | None = None
+
+
+def get_async_pool() -> AsyncBrowserPool:
+    """Return the process-wide async browser pool (bound to the running event loop)."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncBrowserPool()
+    return _async_pool
@@ -0,0 +1,134 @@
+import time
+import asyncio
+import logging
+
+from price_normalize import parse_price
+
+# Logging settings
+logger = logging.getLogger("compare")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Compare settings
+COMPARE_STORES = ("digikala", "ebay", "global")
+STORE_LABELS = {"digikala": "Digikala", "ebay": "eBay", "global": "Global"}
+COMPARE_DEADLINE = 25         # seconds for the whole comparison; slower stores are left out
+USD_TOMAN_RATE = 60_000       # Toman per US dollar used to rank dollar prices; keep it current
+
+
+def price_in_toman(result: dict) -> int | None:
+    """Comparable Toman price of one scraper result, or None when it has no usable price."""
+    if not isinstance(result, dict) or result.get("url") == "#":
+        return None
+    if isinstance(result.get("price_toman"), (int, float)):
+        return int(result["price_toman"])
+    if isinstance(result.get("price_dollar"), (int, float)):
+        return round(result["price_dollar"] * USD_TOMAN_RATE)
+
+    price = result.get("price")
+    if isinstance(price, (int, float)):
+        return int(price)
+    if not isinstance(price, str):
+        return None
+
+    parsed = parse_price(price)
+    if parsed is None:
+        return None
+    if parsed.currency == "USD":
+        return round(parsed.amount * USD_TOMAN_RATE)
+    if parsed.currency == "IRR":
+        return int(parsed.amount) // 10
+    return int(parsed.amount)
+
+
+def merge_results(by_store: dict) -> list[dict]:
+    """One list over all stores, cheapest first; results without a price go last."""
+    merged = []
+    for store, results in by_store.items():
+        for result in results or []:
+            if not isinstance(result, dict) or result.get("url") == "#":
+                continue
+            toman = price_in_toman(result)
+            item = {**result, "store": STORE_LABELS.get(store, store), "price_toman_compare": toman}
+            if toman is not None and result.get("price_toman") is None and isinstance(result.get("price"), str) \
+                    and "$" in result["price"]:
+                item["converted"] = f"≈ {toman:,} تومان"
+            merged.append(item)
+    merged.sort(key=lambda r: (r["price_toman_compare"] is None, r["price_toman_compare"] or 0))
+    return merged
+
+
+async def compare_search(query: str, fetch, stores=COMPARE_STORES, deadline: float = COMPARE_DEADLINE,
+                         on_partial=None) -> dict:
+    """
+    Run `fetch(store, query)` for every store at once and merge whatever
+    finished before `deadline`. Stores still running at the deadline are
+    cancelled and reported as timed out.
+    """
+    started = time.monotonic()
+    timings: dict = {}
+    by_store: dict = {}
+    failed: list = []
+
+    async def run(store):
+        try:
+            results = await fetch(store, query)
+        finally:
+            timings[store] = round(time.monotonic() - started, 2)
+        return store, results
+
+    tasks = {asyncio.create_task(run(store)): store for store in stores}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                store = tasks[task]
+                try:
+                    _, results = task.result()
+                    by_store[store] = results
+                    if not results or all(isinstance(r, dict) and r.get("url") == "#" for r in results):
+                        failed.append(store)
+                except Exception as e:
+                    failed.append(store)
+                    logger.warning(f"⚠️ Compare: {store} failed: {e}")
+            if on_partial is not None and done:
+                on_partial(merge_results(by_store))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    timed_out = [tasks[task] for task in pending]
+    if timed_out:
+        logger.warning(f"⌛ Compare '{query}': {', '.join(timed_out)} missed the {deadline}s deadline")
+    return {
+        "results": merge_results(by_store),
+        "timings": {store: timings.get(store) for store in stores},
+        "timed_out": timed_out,
+        "failed": failed,
+    }
+
+
+def format_timings(outcome: dict) -> str:
+    parts = []
+    for store, seconds in outcome["timings"].items():
+        label = STORE_LABELS.get(store, store)
+        if store in outcome["timed_out"]:
+            parts.append(f"{label} ⌛")
+        elif store in outcome["failed"]:
+            parts.append(f"{label} ❌ ({seconds}s)")
+        else:
+            parts.append(f"{label} {seconds}s")
+    return " | ".join(parts)
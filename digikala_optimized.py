@@ -1,10 +1,18 @@
+import os
 import json
 import time
-import random
+import asyncio
 import logging
 from urllib.parse import urlencode, urljoin
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+import httpx
+import requests
+import http_client
+from html_extract import xpath, has_class, parse, first, text
+from browser_pool import get_pool, get_async_pool
+from wait_strategy import WaitStrategy, RateLimitPolicy
+from page_profiles import TEXT_ONLY
+import metrics
+from price_normalize import parse_price, price_amounts
 
 # Logging settings
 logger = logging.getLogger("digikala_scraper")
@@ -23,68 +31,123 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 
+# Store endpoints; override through the environment to point the scraper at a
+# local stand-in such as benchmarks/mock_store.py
+BASE_URL = os.environ.get("DIGIKALA_BASE_URL", "https://www.digikala.com").rstrip("/")
+API_BASE_URL = os.environ.get("DIGIKALA_API_URL", "https://api.digikala.com").rstrip("/")
+
+# Search backends: "api" (JSON endpoint), "browser" (rendered page) or
+# "auto" (API first, browser only when the API fails)
+SEARCH_BACKEND = "auto"
+
+# Readiness of the rendered search page and anti-bot pacing between requests.
+# RATE_LIMIT is one schedule for the host across all searches (retries
+# included): it spaces out when page loads start, the loads themselves still
+# overlap, and the API backend is tried first with its own lighter pacing
+SEARCH_PAGE_WAIT = WaitStrategy(selector="span[data-testid='price-final'], a[href*='/product/'] h3", deadline_ms=10000)
+RATE_LIMIT = RateLimitPolicy(min_interval=1.0, jitter=(0.0, 1.5))
+API_RATE_LIMIT = RateLimitPolicy(min_interval=0.2, jitter=(0.0, 0.3))
+
+# Only the rendered text is read, so skip images, fonts, media and trackers
+PAGE_PROFILE = TEXT_ONLY.extend("digikala", allow=("api.digikala.com",))
+
+API_TIMEOUT = 10
+API_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0 Safari/537.36"
+    ),
+    "Accept": "application/json",
+    "Referer": f"{BASE_URL}/",
+}
+
+
 # Helper functions
 
 def build_digikala_search_url(query: str) -> str:
-    base_url = "https://www.digikala.com/search/"
+    base_url = f"{BASE_URL}/search/"
     params = {"q": query}
     return f"{base_url}?{urlencode(params)}"
 
 
+def build_digikala_api_url(query: str, page: int = 1) -> str:
+    base_url = f"{API_BASE_URL}/v1/search/"
+    params = {"q": query, "page": page}
+    return f"{base_url}?{urlencode(params)}"
+
+
 def extract_price_from_text(text: str) -> int | None:
     """Convert price text to integer"""
-    if not text:
-        return None
-    text = text.replace(",", "").replace("٬", "")
-    digits = "".join(ch for ch in text if ch.isdigit())
-    return int(digits) if digits else None
+    price = parse_price(text)
+    return int(price.amount) if price else None
 
 
 # Fetch HTML with Playwright
-def fetch_page_playwright(url: str, delay=4, timeout=60000):
-    """Fetch HTML using a real browser (to avoid timeout errors)"""
+def fetch_page_playwright(url: str, wait=SEARCH_PAGE_WAIT, timeout=60000):
+    """Fetch HTML using a warm browser from the shared pool (to avoid timeout errors)"""
+    pool = get_pool()
     for attempt in range(3):
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                context = browser.new_context(user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/122.0 Safari/537.36"
-                ))
-                page = context.new_page()
+            RATE_LIMIT.wait_turn(url)
+            with pool.page(profile=PAGE_PROFILE) as page:
                 logger.info(f"🌐 Attempt {attempt + 1}: loading page {url}")
 
-                page.goto(url, timeout=timeout, wait_until="domcontentloaded")
-                time.sleep(delay + random.uniform(1, 3))  # natural delay
+                with metrics.timed("navigation"):
+                    page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+                    wait.wait(page)
 
                 html = page.content()
-                browser.close()
                 logger.info("✅ Page loaded successfully.")
                 return 200, html
 
         except Exception as e:
             logger.warning(f"⚠️ Error on attempt {attempt + 1}: {e}")
-            time.sleep(3 + attempt * 2)
+            with metrics.timed("sleep", reason="retry"):
+                time.sleep(3 + attempt * 2)
 
     logger.error(f"❌ Failed to fetch page after 3 attempts: {url}")
     return 500, None
 
 
-# Search and extract products
-def digikala_search_and_extract(query, max_results=10):
-    search_url = build_digikala_search_url(query)
-    logger.info(f"🔍 Starting search for '{query}' → {search_url}")
+async def fetch_page_playwright_async(url: str, wait=SEARCH_PAGE_WAIT, timeout=60000):
+    """Async version of fetch_page_playwright on the shared async browser pool"""
+    pool = get_async_pool()
+    for attempt in range(3):
+        try:
+            await RATE_LIMIT.wait_turn_async(url)
+            async with pool.page(profile=PAGE_PROFILE) as page:
+                logger.info(f"🌐 Attempt {attempt + 1}: loading page {url}")
 
-    status, html = fetch_page_playwright(search_url, delay=4)
-    if status != 200 or not html:
-        logger.error("❌ Error fetching search page data.")
-        return []
+                with metrics.timed("navigation"):
+                    await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+                    await wait.wait_async(page)
 
-    soup = BeautifulSoup(html, "lxml")
-    products = soup.select("a[href*='/product/']")
+                html = await page.content()
+                logger.info("✅ Page loaded successfully.")
+                return 200, html
+
+        except Exception as e:
+            logger.warning(f"⚠️ Error on attempt {attempt + 1}: {e}")
+            with metrics.timed("sleep", reason="retry"):
+                await asyncio.sleep(3 + attempt * 2)
+
+    logger.error(f"❌ Failed to fetch page after 3 attempts: {url}")
+    return 500, None
+
+
+# Parse product cards from the search page
+PRODUCT_LINKS = xpath("//a[contains(@href, '/product/')]")
+PRODUCT_TITLE = xpath(f".//h3[{has_class('ellipsis-2')}]")
+PRODUCT_PRICE = xpath(".//span[@data-testid='price-final']")
+
+@metrics.timed("parse")
+def parse_search_results(html, search_url, max_results=10):
+    root = parse(html)
+    products = PRODUCT_LINKS(root) if root is not None else []
 
     results = []
+    prices_raw = []
     seen = set()
 
     logger.info("🔹 Extracting product information...")
@@ -97,29 +160,159 @@ def digikala_search_and_extract(query, max_results=10):
         full_url = urljoin(search_url, href)
 
         # title
-        title_el = link.select_one("h3.ellipsis-2")
-        title = title_el.get_text(strip=True) if title_el else None
+        title_el = first(link, PRODUCT_TITLE)
+        title = text(title_el, "") if title_el is not None else None
 
-        # price
-        price_el = link.select_one("span[data-testid='price-final']")
-        price_raw = price_el.get_text(strip=True) if price_el else None
-        price_toman = extract_price_from_text(price_raw)
+        # price (parsed for the whole page at once below)
+        price_el = first(link, PRODUCT_PRICE)
+        price_raw = text(price_el, "") if price_el is not None else None
 
         if title:
             results.append({
                 "title": title,
-                "price_toman": price_toman,
+                "price_toman": None,
                 "url": full_url
             })
-            logger.info(f"✅ Product: {title[:60]} | 💰 {price_toman if price_toman else 'Unknown'} Toman")
+            prices_raw.append(price_raw)
 
         if len(results) >= max_results:
             break
 
+    for result, amount in zip(results, price_amounts(prices_raw)):
+        result["price_toman"] = int(amount) if amount is not None else None
+        logger.info(f"✅ Product: {result['title'][:60]} | 💰 {result['price_toman'] or 'Unknown'} Toman")
+
     logger.info(f"📦 {len(results)} final results obtained.")
     return results
 
 
+# Parse products from the JSON search endpoint
+@metrics.timed("parse")
+def parse_api_products(data, max_results=10):
+    """Turn the API payload into the same records parse_search_results returns"""
+    if not isinstance(data, dict) or not isinstance(data.get("data"), dict):
+        raise ValueError("unexpected API payload")
+
+    results = []
+    for product in data["data"].get("products") or []:
+        title = product.get("title_fa") or product.get("title_en")
+        if not title:
+            continue
+
+        uri = (product.get("url") or {}).get("uri") or f"/product/dkp-{product.get('id')}/"
+        variant = product.get("default_variant")
+        price = variant.get("price") if isinstance(variant, dict) else None
+        selling_price = price.get("selling_price") if isinstance(price, dict) else None
+
+        results.append({
+            "title": title,
+            "price_toman": int(selling_price) // 10 if selling_price else None,  # API prices are in Rial
+            "url": urljoin(f"{BASE_URL}/", uri)
+        })
+        logger.info(f"✅ Product: {title[:60]} | 💰 {results[-1]['price_toman'] or 'Unknown'} Toman")
+
+        if len(results) >= max_results:
+            break
+
+    logger.info(f"📦 {len(results)} final results obtained from API.")
+    return results
+
+
+# Pooled HTTP clients for the API backend (see http_client)
+http_client.register("digikala", headers=API_HEADERS, timeout=API_TIMEOUT)
+
+
+def get_session() -> requests.Session:
+    return http_client.get_session("digikala")
+
+
+def get_async_client() -> httpx.AsyncClient:
+    return http_client.get_async_client("digikala")
+
+
+# Search backends. Each one raises or returns a list of {"title", "price_toman", "url"}
+def _api_url(query):
+    api_url = build_digikala_api_url(query)
+    logger.info(f"🔍 API search for '{query}' → {api_url}")
+    return api_url
+
+
+def _api_results(resp, max_results):
+    resp.raise_for_status()
+    return parse_api_products(resp.json(), max_results=max_results)
+
+
+def search_via_api(query, max_results=10):
+    api_url = _api_url(query)
+    API_RATE_LIMIT.wait_turn(api_url)
+    resp = http_client.request("GET", api_url, client="digikala")
+    return _api_results(resp, max_results)
+
+
+async def search_via_api_async(query, max_results=10):
+    api_url = _api_url(query)
+    await API_RATE_LIMIT.wait_turn_async(api_url)
+    resp = await http_client.request_async("GET", api_url, client="digikala")
+    return _api_results(resp, max_results)
+
+
+def _page_results(status, html, search_url, max_results):
+    if status != 200 or not html:
+        raise RuntimeError("error fetching search page data")
+    return parse_search_results(html, search_url, max_results=max_results)
+
+
+def search_via_browser(query, max_results=10):
+    search_url = build_digikala_search_url(query)
+    logger.info(f"🔍 Starting search for '{query}' → {search_url}")
+    status, html = fetch_page_playwright(search_url)
+    return _page_results(status, html, search_url, max_results)
+
+
+async def search_via_browser_async(query, max_results=10):
+    search_url = build_digikala_search_url(query)
+    logger.info(f"🔍 Starting async search for '{query}' → {search_url}")
+    status, html = await fetch_page_playwright_async(search_url)
+    # lxml parsing is CPU work; keep it off the event loop
+    return await asyncio.to_thread(_page_results, status, html, search_url, max_results)
+
+
+BACKENDS = {"api": search_via_api, "browser": search_via_browser}
+ASYNC_BACKENDS = {"api": search_via_api_async, "browser": search_via_browser_async}
+
+
+def _backend_order(backend):
+    if backend == "auto":
+        return ["api", "browser"]
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown Digikala backend: {backend}")
+    return [backend]
+
+
+# Search and extract products
+def digikala_search_and_extract(query, max_results=10, backend=None):
+    for name in _backend_order(backend or SEARCH_BACKEND):
+        try:
+            return BACKENDS[name](query, max_results=max_results)
+        except Exception as e:
+            logger.warning(f"⚠️ Backend '{name}' failed: {e}")
+
+    # raised, not an empty list: search() turns it into the error result the bot counts as a failure
+    logger.error("❌ Error fetching search page data.")
+    raise RuntimeError("every Digikala backend failed")
+
+
+async def digikala_search_and_extract_async(query, max_results=10, backend=None):
+    for name in _backend_order(backend or SEARCH_BACKEND):
+        try:
+            return await ASYNC_BACKENDS[name](query, max_results=max_results)
+        except Exception as e:
+            logger.warning(f"⚠️ Backend '{name}' failed: {e}")
+
+    logger.error("❌ Error fetching search page data.")
+    raise RuntimeError("every Digikala backend failed")
+
+
 # Function for bot
 def search(query: str, max_results: int = 10):
     """Function compatible with bot_final.py"""
@@ -128,7 +321,23 @@ def search(query: str, max_results: int = 10):
         return digikala_search_and_extract(query, max_results=max_results)
     except Exception as e:
         logger.exception(f"❌ Error in digikala search() function: {e}")
-        return [{"title": "Search error", "url": "#", "price": str(e)}]
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+
+
+async def search_async(query: str, max_results: int = 10):
+    """Native asyncio version of search(), picked by bot.call_scraper"""
+    try:
+        logger.info(f"🔎 Running search_async() for '{query}'")
+        return await digikala_search_and_extract_async(query, max_results=max_results)
+    except Exception as e:
+        logger.exception(f"❌ Error in digikala search_async() function: {e}")
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+
+
+async def iter_search_async(query: str, max_results: int = 10):
+    """Streaming interface for the bot; one search page holds every result, so they all arrive together."""
+    for rank, result in enumerate(await search_async(query, max_results=max_results)):
+        yield rank, result
 
 
 # Direct execution
@@ -1,7 +1,14 @@
-import json, logging, time, random
+import os, json, logging, time, asyncio
 from urllib.parse import urljoin, quote_plus
-from bs4 import BeautifulSoup
+from html_extract import xpath, has_class, parse, parse_fragment, first, text, title_of, json_ld, slice_element
+from price_candidates import best_price
 import re
+from fanout import HostLimiter, iter_completed
+from wait_strategy import WaitStrategy, RateLimitPolicy
+from page_profiles import TEXT_ONLY
+from product_cache import ProductCache
+import metrics
+from price_normalize import parse_price, parse_prices
 
 # PROFESSIONAL LOGGER SETTINGS
 logger = logging.getLogger("ebay_scraper")
@@ -20,157 +27,393 @@ if not logger.handlers:
 
 # PLAYWRIGHT IMPORT. REQUIRED FOR SCRAPING
 try:
-    from playwright.sync_api import sync_playwright
+    from browser_pool import get_pool, get_async_pool
 except Exception:
     raise RuntimeError("⚠️ Please install: pip install playwright && playwright install chromium")
 
+# Store endpoint; override through the environment to point at a local stand-in
+BASE_URL = os.environ.get("EBAY_BASE_URL", "https://www.ebay.com").rstrip("/")
 
-# Regex for detecting price formats
-price_re = re.compile(r'([$€£]\s?[\d,]+(?:\.\d{1,2})?)')
+# Detail-page fan-out settings (async path)
+DETAIL_CONCURRENCY = 4   # item pages fetched in parallel per search
+PER_DOMAIN_LIMIT = 8     # max simultaneous item pages against one host, across all searches
+
+# Page readiness and anti-bot pacing
+SEARCH_PAGE_WAIT = WaitStrategy(selector="ul.srp-results", deadline_ms=20000)
+ITEM_PAGE_WAIT = WaitStrategy(selector=".x-price-section, .x-item-title", json_ld=True, deadline_ms=20000)
+RATE_LIMIT = RateLimitPolicy(min_interval=0.1, jitter=(0.0, 0.4))
+
+# One limiter for the whole process, so concurrent searches share PER_DOMAIN_LIMIT
+DETAIL_LIMITER = HostLimiter(per_host=PER_DOMAIN_LIMIT)
+
+# Only the rendered text is read, so skip images, fonts, media and trackers
+PAGE_PROFILE = TEXT_ONLY.extend("ebay", deny=("rover.ebay.com", "pulsar.ebay.com"))
+
+# Parsed item pages shared across searches, so overlapping queries skip page loads
+PRODUCT_CACHE = ProductCache("ebay")
+
+# "srp": build results from the search result cards, open item pages only for incomplete cards
+# "full": open every item page (previous behaviour)
+EXTRACTION_MODE = "srp"
 
 #  PRICE PARSER
+def dollar_amount(price):
+    """Amount of a parsed price in dollars; None when the text names another currency."""
+    return price.amount if price and price.currency in (None, "USD") else None
+
 def extract_price_from_text(text):
-    """Extract numerical price value from mixed text."""
-    if not text:
-        return None
-    
-    match = price_re.search(text)
-    if not match:
-        return None
-    
-    raw = match.group(1).replace("$", "").replace(",", "").strip()
-    try:
-        return float(raw)
-    except Exception as e:
-        logger.warning(f"Price conversion error: {e}")
-        return None
+    """Extract numerical dollar price from mixed text (low end of a range)."""
+    return dollar_amount(parse_price(text))
 
 #  URL BUILDER FOR EBAY SEARCH
 def build_ebay_search_url(query):
     """Build a valid eBay search URL from a query string."""
-    return f"https://www.ebay.com/sch/i.html?_nkw={quote_plus(query)}"
+    return f"{BASE_URL}/sch/i.html?_nkw={quote_plus(query)}"
 
 # SMART PAGE LOADER (PLAYWRIGHT)
-def fetch_page_playwright(page, url, selector=None, timeout=20000, random_delay=True):
+def fetch_page_playwright(page, url, wait=None, timeout=20000, on_response=None):
     """
-    Load a page using Playwright with optional selector waiting
-    and a natural/random delay to reduce bot detection.
+    Load a page using Playwright, return as soon as `wait` says it is ready,
+    and pace requests through RATE_LIMIT to reduce bot detection.
+    `on_response(response)` receives the navigation response (status, headers).
     """
     try:
+        RATE_LIMIT.wait_turn(url)
         logger.info(f"🌐 Loading page: {url}")
-        page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+        with metrics.timed("navigation"):
+            response = page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+            if on_response and response:
+                on_response(response)
+
+            if wait:
+                wait.wait(page)
 
-        if selector:
-            logger.info(f"⏳ Waiting for selector: {selector}")
-            page.wait_for_selector(selector, timeout=timeout)
+        return page.content()
+
+    except Exception as e:
+        logger.warning(f"⚠️ Failed loading {url}: {e}")
+        return None
 
-        html = page.content()
+async def fetch_page_playwright_async(page, url, wait=None, timeout=20000, on_response=None):
+    """Async version of fetch_page_playwright for `playwright.async_api` pages."""
+    try:
+        await RATE_LIMIT.wait_turn_async(url)
+        logger.info(f"🌐 Loading page: {url}")
+        with metrics.timed("navigation"):
+            response = await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+            if on_response and response:
+                on_response(response)
 
-        if random_delay:
-            d = random.uniform(0.5, 2.0)
-            logger.info(f"⏱ Random delay: {d:.2f}s")
-            time.sleep(d)
+            if wait:
+                await wait.wait_async(page)
 
-        return html
+        return await page.content()
 
     except Exception as e:
         logger.warning(f"⚠️ Failed loading {url}: {e}")
         return None
 #SINGLE PRODUCT PARSER
+# First match in document order, like soup.select_one on the CSS selector list
+ITEM_PRICE = xpath(
+    f"(//*[{has_class('x-price-approx__price')}] | //*[{has_class('x-price-primary')}]//span"
+    f" | //*[{has_class('display-price')}] | //*[{has_class('notranslate')}]"
+    f" | //*[{has_class('x-price-section')}]//span)[1]"
+)
+
+@metrics.timed("parse")
 def extract_product_from_html(html):
     """
     Extract product title and price from product page HTML.
     Includes LD+JSON reading for high accuracy.
     """
-    soup = BeautifulSoup(html, "lxml")
-    title = soup.title.get_text(strip=True) if soup.title else None
+    title = title_of(html)
     price = None
 
-    #Check structured JSON-LD first
-    for s in soup.find_all("script", type="application/ld+json"):
-        try:
-            data = json.loads(s.string or "{}")
-        except Exception:
-            continue
-
-        if isinstance(data, dict) and data.get("@type", "").lower() == "product":
+    #Check structured JSON-LD first (read straight from the raw HTML, no DOM needed)
+    for data in json_ld(html):
+        if isinstance(data, dict) and isinstance(data.get("@type", ""), str) and data.get("@type", "").lower() == "product":
             title = data.get("name", title)
 
             offers = data.get("offers")
             if offers and isinstance(offers, dict):
-                p = extract_price_from_text(str(offers.get("price")))
+                p = extract_price_from_text(f"{offers.get('price')} {offers.get('priceCurrency') or ''}")
                 if p:
                     price = p
 
     #Check typical price elements if needed
-    if not price:
-        price_el = soup.select_one(".x-price-approx__price, .x-price-primary span, .display-price, .notranslate, .x-price-section span")
-        if price_el:
-            price = extract_price_from_text(price_el.get_text(strip=True))
+    root = parse(html) if not price else None
+    if root is not None:
+        price_el = first(root, ITEM_PRICE)
+        if price_el is not None:
+            price = extract_price_from_text(text(price_el, ""))
 
-    #Final fallback = scan entire page text
-    if not price:
-        price = extract_price_from_text(soup.get_text(" ", strip=True))
+    #Final fallback = scored price candidates from one bounded pass over the page
+    if not price and root is not None:
+        candidate = best_price(root, title=title)
+        price = dollar_amount(candidate)
 
     return title, price
 
+#SEARCH RESULTS LINK COLLECTOR
+ITEM_LINKS = xpath("//a[contains(@href, '/itm/')]")
+CARD_ITEM_LINK = xpath(".//a[contains(@href, '/itm/')]")
+
+@metrics.timed("parse")
+def extract_product_links(html, search_url, n=10):
+    """Collect up to `n` unique /itm/ links from a search results page."""
+    root = parse(html)
+    links = []
+    for a in (ITEM_LINKS(root) if root is not None else []):
+        full_url = urljoin(search_url, a.get("href").split("?")[0])
+        if full_url not in links:
+            links.append(full_url)
+        if len(links) >= n:
+            break
+    return links
+
+#SEARCH RESULTS CARD PARSER (SRP FAST PATH)
+# CSS equivalents: "ul.srp-results > li.s-item, ul.srp-results > li.s-card", ".s-item__title, .s-card__title", ...
+SRP_CARDS = xpath(f"//ul[{has_class('srp-results')}]/li[{has_class('s-item')} or {has_class('s-card')}]")
+SRP_TITLE = xpath(f"(.//*[{has_class('s-item__title')} or {has_class('s-card__title')}])[1]")
+SRP_PRICE = xpath(f"(.//*[{has_class('s-item__price')} or {has_class('s-card__price')}])[1]")
+SRP_SHIPPING = xpath(
+    f"(.//*[{has_class('s-item__shipping')} or {has_class('s-item__logisticsCost')} or {has_class('s-item__freeXDays')}])[1]"
+)
+SRP_CONDITION = xpath(
+    f"(.//*[{has_class('s-item__subtitle')}]//*[{has_class('SECONDARY_INFO')}] | .//*[{has_class('s-card__subtitle')}])[1]"
+)
+SRP_ATTRIBUTE_ROWS = xpath(f".//*[{has_class('s-card__attribute-row')}]")
+
+def _card_text(card, compiled):
+    el = first(card, compiled)
+    if el is None:
+        return None
+    return text(el) or None
+
+@metrics.timed("parse")
+def parse_srp_cards(html, search_url, n=10):
+    """
+    Build results straight from the search results cards:
+    title, price, shipping, condition and URL. Missing fields stay None.
+    """
+    # Only the results list is parsed; the rest of the page (several MB of scripts) is skipped
+    results_html = slice_element(html, "ul", "srp-results")
+    root = parse_fragment(results_html) if results_html else parse(html)
+    cards = []
+    prices_raw = []
+    seen = set()
+
+    for card in (SRP_CARDS(root) if root is not None else []):
+        a = first(card, CARD_ITEM_LINK)
+        if a is None or not a.get("href"):
+            continue
+        url = urljoin(search_url, a.get("href").split("?")[0])
+        if url in seen:
+            continue
+
+        title = _card_text(card, SRP_TITLE)
+        if title:
+            title = re.sub(r"^New Listing\s*", "", title)
+        if title and title.lower() == "shop on ebay":  # placeholder card
+            continue
+        seen.add(url)
+
+        shipping = _card_text(card, SRP_SHIPPING)
+        if not shipping:
+            for row in SRP_ATTRIBUTE_ROWS(card):
+                row_text = text(row)
+                if "delivery" in row_text.lower() or "shipping" in row_text.lower():
+                    shipping = row_text
+                    break
+
+        cards.append({
+            "title": title,
+            "price_dollar": None,
+            "shipping": shipping,
+            "condition": _card_text(card, SRP_CONDITION),
+            "url": url
+        })
+        prices_raw.append(_card_text(card, SRP_PRICE))
+        if len(cards) >= n:
+            break
+
+    # all prices of the page in one call
+    for entry, price in zip(cards, parse_prices(prices_raw)):
+        entry["price_dollar"] = dollar_amount(price)
+    return cards
+
+def needs_detail_page(product):
+    """Item pages only give us title and price, so only those trigger a fetch."""
+    return not product.get("title") or not product.get("price_dollar")
+
+def collect_products(html, search_url, n=10, mode=EXTRACTION_MODE):
+    """
+    Turn the search results page into product records.
+    In "srp" mode they come from the listing cards; in "full" mode (or when no
+    card could be parsed) every record starts empty and needs its item page.
+    """
+    if mode == "srp":
+        cards = parse_srp_cards(html, search_url, n)
+        if cards:
+            return cards
+        logger.warning("⚠️ No SRP cards parsed → falling back to item pages")
+
+    return [
+        {"title": None, "price_dollar": None, "shipping": None, "condition": None, "url": url}
+        for url in extract_product_links(html, search_url, n)
+    ]
+
+def products_from_search_page(html, search_url, n=10, mode=EXTRACTION_MODE):
+    """collect_products() on a loaded search results page; raises when the page did not load."""
+    if not html:
+        logger.error("❌ Failed to fetch search results page")
+        raise RuntimeError("failed to fetch the eBay search results page")
+    return collect_products(html, search_url, n, mode=mode)
+
+def merge_detail(product, record):
+    """Fill the missing title/price of a product from its parsed item page."""
+    title, price = record
+    product = dict(product)
+    product["title"] = product.get("title") or title or "Unknown Title"
+    product["price_dollar"] = product.get("price_dollar") or price
+    return product
+
+#ITEM PAGE LOADER WITH DETAIL CACHE
+def is_complete_record(record):
+    return bool(record and record[0] and record[1])
+
+def record_from_page(url, html, headers):
+    """(title, price) parsed from a loaded item page; complete records go to PRODUCT_CACHE."""
+    if not html:
+        return None
+    record = extract_product_from_html(html)
+    if is_complete_record(record):
+        PRODUCT_CACHE.store(url, record, headers)
+    return record
+
+def fetch_item_record(page, url):
+    """(title, price) of an item page: from PRODUCT_CACHE when possible, otherwise loaded and cached."""
+    record = PRODUCT_CACHE.lookup(url, parse=extract_product_from_html, accept=is_complete_record)
+    if record:
+        logger.info(f"⚡ Item page from cache: {url}")
+        return record
+
+    headers = {}
+    html = fetch_page_playwright(page, url, wait=ITEM_PAGE_WAIT, on_response=lambda r: headers.update(r.headers))
+    return record_from_page(url, html, headers)
+
+async def fetch_item_record_async(context, url):
+    """Async version of fetch_item_record; a page is only opened on a cache miss."""
+    record = await PRODUCT_CACHE.lookup_async(url, parse=extract_product_from_html, accept=is_complete_record)
+    if record:
+        logger.info(f"⚡ Item page from cache: {url}")
+        return record
+
+    headers = {}
+    page = await context.new_page()
+    try:
+        html = await fetch_page_playwright_async(page, url, wait=ITEM_PAGE_WAIT, on_response=lambda r: headers.update(r.headers))
+    finally:
+        await page.close()
+    # lxml parsing is CPU work; keep it off the event loop
+    return await asyncio.to_thread(record_from_page, url, html, headers)
+
 #MAIN SCRAPER
-def ebay_scraper_full(query, n=10):
+def ebay_scraper_full(query, n=10, mode=EXTRACTION_MODE):
     start = time.time()
 
     logger.info("=" * 60)
-    logger.info(f"🚀 Starting scrape for '{query}'")
+    logger.info(f"🚀 Starting scrape for '{query}' (mode: {mode})")
 
     search_url = build_ebay_search_url(query)
     logger.info(f"🔍 Searching at: {search_url}")
 
     results = []
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-
+    with get_pool().page(profile=PAGE_PROFILE) as page:
         #Load search results page
-        html = fetch_page_playwright(page, search_url, selector="ul.srp-results")
-        if not html:
-            logger.error("❌ Failed to fetch search results page")
-            browser.close()
-            return []
-
-        soup = BeautifulSoup(html, "lxml")
-
-        #Collect product links
-        links = []
-        for a in soup.select("a[href*='/itm/']"):
-            full_url = urljoin(search_url, a["href"].split("?")[0])
-            if full_url not in links:
-                links.append(full_url)
-            if len(links) >= n:
-                break
-
-        logger.info(f"🔹 {len(links)} product links found → Fetching details...")
+        html = fetch_page_playwright(page, search_url, wait=SEARCH_PAGE_WAIT)
+        products = products_from_search_page(html, search_url, n, mode=mode)
+        pending = sum(1 for p in products if needs_detail_page(p))
+
+        logger.info(f"🔹 {len(products)} products found → {pending} need their item page...")
         # Extract each product
-        for i, url in enumerate(links, start=1):
+        for i, product in enumerate(products, start=1):
+            url = product["url"]
             try:
-                html2 = fetch_page_playwright(page, url, selector=".x-price-section, .x-item-title")
-                if not html2:
-                    logger.warning(f"⚠️ Skipping (no response): {url}")
-                    continue
-
-                title, price = extract_product_from_html(html2)
+                if needs_detail_page(product):
+                    record = fetch_item_record(page, url)
+                    if not record:
+                        logger.warning(f"⚠️ Skipping (no response): {url}")
+                        continue
+                    product = merge_detail(product, record)
 
-                results.append({
-                    "title": title or "Unknown Title",
-                    "price_dollar": price,
-                    "url": url
-                })
+                results.append(product)
 
-                logger.info(f"✅ {i}/{len(links)} → {title[:60] if title else 'No Title'} | ${price if price else '???'}")
+                title, price = product["title"], product["price_dollar"]
+                logger.info(f"✅ {i}/{len(products)} → {title[:60] if title else 'No Title'} | ${price if price else '???'}")
 
             except Exception as e:
                 logger.exception(f"⚠️ Error extracting {url}: {e}")
 
-        browser.close()
+    elapsed = time.time() - start
+    logger.info(f"🏁 Finished! Results: {len(results)} | Time: {elapsed:.2f}s")
+    logger.info("=" * 60)
+
+    return results
+
+
+async def iter_products_async(query, n=10, concurrency=DETAIL_CONCURRENCY, mode=EXTRACTION_MODE):
+    """
+    Yield `(rank, product)` as soon as each product is ready.
+    Complete SRP cards come out immediately; the rest open their item pages as
+    separate pages of one browser context, with at most `concurrency` in flight
+    per search and PER_DOMAIN_LIMIT per host across all searches.
+    """
+    search_url = build_ebay_search_url(query)
+    logger.info(f"🔍 Searching at: {search_url}")
+
+    async with get_async_pool().context(profile=PAGE_PROFILE) as context:
+        #Load search results page
+        page = await context.new_page()
+        html = await fetch_page_playwright_async(page, search_url, wait=SEARCH_PAGE_WAIT)
+        await page.close()
+        products = await asyncio.to_thread(products_from_search_page, html, search_url, n, mode)
+        pending = [(rank, p) for rank, p in enumerate(products) if needs_detail_page(p)]
+        logger.info(f"🔹 {len(products)} products found → {len(pending)} item pages to fetch (x{concurrency})...")
+
+        for rank, product in enumerate(products):
+            if not needs_detail_page(product):
+                yield rank, product
+
+        async def fetch_detail(entry):
+            product = entry[1]
+            record = await fetch_item_record_async(context, product["url"])
+            if not record:
+                logger.warning(f"⚠️ Skipping (no response): {product['url']}")
+                return None
+            return merge_detail(product, record)
+
+        async for index, product in iter_completed(pending, fetch_detail, concurrency=concurrency,
+                                                   host_limiter=DETAIL_LIMITER, key=lambda entry: entry[1]["url"]):
+            if not product:
+                continue
+            rank = pending[index][0]
+            logger.info(f"✅ {rank + 1}/{len(products)} → {product['title'][:60]} | ${product['price_dollar'] or '???'}")
+            yield rank, product
+
+
+async def ebay_scraper_full_async(query, n=10, concurrency=DETAIL_CONCURRENCY, mode=EXTRACTION_MODE):
+    """Async version of ebay_scraper_full; item pages are fetched concurrently, results keep search ranking."""
+    start = time.time()
+
+    logger.info("=" * 60)
+    logger.info(f"🚀 Starting async scrape for '{query}' (mode: {mode})")
+
+    ranked = {}
+    async for rank, product in iter_products_async(query, n=n, concurrency=concurrency, mode=mode):
+        ranked[rank] = product
+    results = [ranked[rank] for rank in sorted(ranked)]
 
     elapsed = time.time() - start
     logger.info(f"🏁 Finished! Results: {len(results)} | Time: {elapsed:.2f}s")
@@ -180,6 +423,20 @@ def ebay_scraper_full(query, n=10):
 
 
 #BOT API WRAPPER
+def format_results(raw):
+    """Format prices nicely and ensure clean output for messaging systems."""
+    final = []
+    for r in raw:
+        final.append({
+            "title": r.get("title"),
+            "url": r.get("url"),
+            "price": f"${r.get('price_dollar')}" if r.get("price_dollar") else "Unknown",
+            "shipping": r.get("shipping"),
+            "condition": r.get("condition")
+        })
+    return final
+
+
 def search(query: str, max_results: int = 5):
     """
     Bot-facing function that formats prices nicely
@@ -188,19 +445,29 @@ def search(query: str, max_results: int = 5):
     try:
         logger.info(f"🔎 Running search() for '{query}'")
         raw = ebay_scraper_full(query, n=max_results)
-
-        final = []
-        for r in raw:
-            final.append({
-                "title": r.get("title"),
-                "url": r.get("url"),
-                "price": f"${r.get('price_dollar')}" if r.get("price_dollar") else "Unknown"
-            })
-        return final
+        return format_results(raw)
 
     except Exception as e:
         logger.exception(f"❌ eBay search() failed: {e}")
-        return []
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+
+
+async def search_async(query: str, max_results: int = 5, concurrency: int = DETAIL_CONCURRENCY):
+    """Native asyncio version of search(), picked by bot.call_scraper."""
+    try:
+        logger.info(f"🔎 Running search_async() for '{query}'")
+        raw = await ebay_scraper_full_async(query, n=max_results, concurrency=concurrency)
+        return format_results(raw)
+
+    except Exception as e:
+        logger.exception(f"❌ eBay search_async() failed: {e}")
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+
+
+async def iter_search_async(query: str, max_results: int = 5, concurrency: int = DETAIL_CONCURRENCY):
+    """Stream `(rank, result)` pairs in bot format as soon as each product is parsed."""
+    async for rank, product in iter_products_async(query, n=max_results, concurrency=concurrency):
+        yield rank, format_results([product])[0]
 
 
 #COMMAND-LINE MODE
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+import metrics
+from lru import LRUCache
+
+# Logging settings
+logger = logging.getLogger("extraction_profiles")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+# Per-domain extraction profiles.
+#
+# A generic product page is read by trying JSON-LD and then scanning the
+# whole DOM for the best price. Shops use one template for all their product
+# pages, so once a domain has given a complete record the way it was found
+# (JSON-LD, a meta tag, an itemprop or class XPath) is recorded here. After
+# CONFIRM_AFTER pages agree on the same profile, later pages of that domain
+# are read with it directly: one targeted lookup instead of the full scan.
+#
+# A profile is dropped automatically: when a full extraction finds the data
+# somewhere else (it is replaced and must be confirmed again), after
+# MISS_LIMIT pages in a row where it finds nothing, and every VERIFY_EVERY
+# uses one page is extracted the full way to check the profile still agrees.
+
+# SQLite file the profiles are kept in across restarts (opened on first use, not
+# on import); EXTRACTION_PROFILES_PATH overrides it, set it empty to keep them in memory only
+PROFILES_PATH = os.environ.get("EXTRACTION_PROFILES_PATH", "extraction_profiles.sqlite3")
+CONFIRM_AFTER = 2             # pages that must agree before a profile is used
+MISS_LIMIT = 2                # consecutive pages it fails on before a profile is dropped
+VERIFY_EVERY = 50             # uses between full-extraction checks of an active profile
+MAX_DOMAINS = 4096            # domains kept in memory
+
+PROFILE_EVENTS = metrics.REGISTRY.counter("extraction_profile_total", "Extraction profile hits, misses and changes")
+
+
+class ProfileStore:
+    """SQLite table of domain -> profile, so learned profiles survive restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_profiles ("
+            "domain TEXT PRIMARY KEY, profile TEXT NOT NULL, confirmations INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, domain: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile, confirmations FROM extraction_profiles WHERE domain = ?", (domain,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"profile": json.loads(row[0]), "confirmations": row[1], "misses": 0, "uses": 0}
+
+    def set(self, domain: str, profile: dict, confirmations: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_profiles (domain, profile, confirmations, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (domain, json.dumps(profile, sort_keys=True), confirmations, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, domain: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_profiles WHERE domain = ?", (domain,))
+            self._conn.commit()
+
+
+class ProfileRegistry:
+    """
+    Domain -> extraction profile, learned from complete extractions.
+
+    A profile is a small JSON-able dict chosen by the caller, e.g.
+    `{"title": "json_ld", "price": "//meta[@property='og:price:amount']"}`.
+    Callers ask `active(domain)` for a profile to try, then report back with
+    `hit()` / `miss()`, and `learn()` the profile of every full extraction that
+    produced a complete record.
+    """
+
+    def __init__(self, path: str | None = PROFILES_PATH, max_domains: int = MAX_DOMAINS):
+        self.path = path or None
+        self._memory = LRUCache(max_domains)
+        self._disk = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "learned": 0, "confirmed": 0, "dropped": 0, "verifications": 0}
+
+    def _store(self):
+        # opened on first use, so importing a scraper does not create the file
+        if self._disk is None and self.path:
+            self._disk = ProfileStore(self.path)
+        return self._disk
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+        PROFILE_EVENTS.inc(event=key)
+
+    def _state(self, domain: str):
+        found = self._memory.get(domain)
+        if found is not None:
+            return found[0]
+        store = self._store()
+        state = store.get(domain) if store is not None else None
+        # misses are cached too, so an unknown domain costs one SQLite read per process
+        self._memory.set(domain, state or {})
+        return state
+
+    def _save(self, domain: str, state: dict | None):
+        self._memory.set(domain, state or {})
+        store = self._store()
+        if store is None:
+            return
+        if state:
+            store.set(domain, state["profile"], state["confirmations"])
+        else:
+            store.delete(domain)
+
+    def active(self, domain: str) -> dict | None:
+        """Confirmed profile to read this domain's page with, or None to extract the full way."""
+        with self._lock:
+            state = self._state(domain)
+            if not state or state["confirmations"] < CONFIRM_AFTER:
+                return None
+            state["uses"] += 1
+            verify = state["uses"] % VERIFY_EVERY == 0
+        if verify:
+            self._count("verifications")
+            return None
+        return state["profile"]
+
+    def hit(self, domain: str):
+        with self._lock:
+            state = self._state(domain)
+            if state:
+                state["misses"] = 0
+        self._count("hits")
+
+    def miss(self, domain: str):
+        """The active profile found no complete record on this page."""
+        with self._lock:
+            state = self._state(domain)
+            if not state:
+                return
+            state["misses"] += 1
+            dropped = state["misses"] >= MISS_LIMIT
+            if dropped:
+                self._save(domain, None)
+        self._count("misses")
+        if dropped:
+            self._count("dropped")
+            logger.info(f"🧩 Extraction profile for {domain} stopped matching; dropped")
+
+    def learn(self, domain: str, profile: dict):
+        """A full extraction produced a complete record through `profile`."""
+        with self._lock:
+            state = self._state(domain)
+            if state and state["profile"] == profile:
+                state["misses"] = 0
+                if state["confirmations"] >= CONFIRM_AFTER:
+                    return
+                state["confirmations"] += 1
+                confirmed = state["confirmations"] >= CONFIRM_AFTER
+                self._save(domain, state)
+                event = "confirmed" if confirmed else None
+            else:
+                replaced = bool(state)
+                self._save(domain, {"profile": profile, "confirmations": 1, "misses": 0, "uses": 0})
+                event = "learned"
+        if event:
+            self._count(event)
+        if event == "confirmed":
+            logger.info(f"🧩 Extraction profile for {domain} confirmed: {profile}")
+        elif event == "learned" and replaced:
+            logger.info(f"🧩 Extraction profile for {domain} changed to {profile}")
+
+    def forget(self, domain: str):
+        with self._lock:
+            self._save(domain, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "domains": len(self._memory), "path": self.path}
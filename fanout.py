@@ -0,0 +1,171 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import wait, FIRST_COMPLETED
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+# Logging settings
+logger = logging.getLogger("fanout")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Stop flag of the iter_completed_threads call a worker thread is running for
+_stop = contextvars.ContextVar("fanout_stop", default=None)
+
+
+def abandoned() -> bool:
+    """
+    True inside an iter_completed_threads worker whose result is no longer
+    wanted (deadline reached or the caller stopped iterating). A running
+    future cannot be cancelled, so long workers check this between steps and
+    give their thread back early.
+    """
+    stop = _stop.get()
+    return stop is not None and stop.is_set()
+
+
+class HostLimiter:
+    """
+    Caps how many requests may hit the same host at once.
+
+    Safe to share at module level: a semaphore belongs to one event loop, so
+    each running loop gets its own set (dropped once the loop is closed).
+    """
+
+    def __init__(self, per_host: int = 4):
+        self.per_host = max(1, per_host)
+        self._semaphores: dict = {}  # event loop -> {host: asyncio.Semaphore}
+        self._lock = threading.Lock()  # loops in other threads share the dict
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.get(loop)
+            if semaphores is None:
+                for closed in [other for other in self._semaphores if other.is_closed()]:
+                    del self._semaphores[closed]
+                semaphores = self._semaphores[loop] = {}
+            if host not in semaphores:
+                semaphores[host] = asyncio.Semaphore(self.per_host)
+            return semaphores[host]
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        async with self._semaphore(url):
+            yield
+
+
+async def iter_completed(items, worker, concurrency: int = 4, host_limiter: HostLimiter | None = None,
+                         key=lambda item: item, deadline: float | None = None):
+    """
+    Run `worker(item)` for every item with at most `concurrency` calls in flight
+    and yield `(index, result)` as soon as each one finishes.
+
+    `key(item)` gives the URL used for the per-host cap. A worker that raises
+    yields `None` as its result. After `deadline` seconds the remaining work is
+    abandoned. Closing the generator cancels pending work.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index, item):
+        async with semaphore:
+            try:
+                if host_limiter is not None:
+                    async with host_limiter.limit(key(item)):
+                        return index, await worker(item)
+                return index, await worker(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Fan-out worker failed for {key(item)}: {e}")
+                return index, None
+
+    tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                result = await next_done
+            except asyncio.TimeoutError:
+                unfinished = sum(not task.done() for task in tasks)
+                logger.warning(f"⌛ Fan-out deadline of {deadline}s reached, abandoning {unfinished} unfinished")
+                return
+            yield result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def gather_ordered(items, worker, **kwargs):
+    """Like iter_completed, but wait for everything and return results in input order."""
+    items = list(items)
+    results = [None] * len(items)
+    async for index, result in iter_completed(items, worker, **kwargs):
+        results[index] = result
+    return results
+
+
+def iter_completed_threads(items, worker, executor, concurrency: int = 4, per_host: int | None = None,
+                           key=lambda item: item, deadline: float | None = None):
+    """
+    Sync twin of iter_completed on a thread pool. At most `concurrency` items
+    of this call run at once and at most `per_host` per host; items are only
+    handed to the pool when they may start, so a shared executor is never
+    blocked by one caller. Work still running at the deadline is abandoned:
+    its result is dropped and `abandoned()` turns True in its thread.
+    """
+    items = list(items)
+    pending = list(enumerate(items))
+    stop = threading.Event()
+    running: dict = {}       # future -> (index, host)
+    busy_hosts: dict = {}
+    stop_at = time.monotonic() + deadline if deadline is not None else None
+    try:
+        while pending or running:
+            for entry in list(pending):
+                if len(running) >= max(1, concurrency):
+                    break
+                host = urlparse(key(entry[1])).netloc.lower()
+                if per_host is not None and busy_hosts.get(host, 0) >= per_host:
+                    continue
+                pending.remove(entry)
+                busy_hosts[host] = busy_hosts.get(host, 0) + 1
+                # copy the context so labels/traces (see metrics) and the stop flag reach the worker thread
+                context = contextvars.copy_context()
+                context.run(_stop.set, stop)
+                future = executor.submit(context.run, worker, entry[1])
+                running[future] = (entry[0], host)
+
+            timeout = None if stop_at is None else stop_at - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                logger.warning(f"⌛ Fan-out deadline of {deadline}s reached, "
+                               f"abandoning {len(running) + len(pending)} unfinished")
+                return
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, host = running.pop(future)
+                busy_hosts[host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"⚠️ Fan-out worker failed for {key(items[index])}: {e}")
+                    result = None
+                yield index, result
+    finally:
+        stop.set()
+        for future in running:
+            future.cancel()
@@ -0,0 +1,105 @@
+import re
+import json
+import html as html_lib
+
+from lxml import etree
+from lxml import html as lxml_html
+
+# Shared HTML extraction helpers on top of lxml.
+#
+# Selectors are written as XPath and compiled once (module-level constants in
+# the scrapers), so nothing is re-parsed per call. Pieces that do not need a
+# DOM at all (JSON-LD blocks, <title>) are cut straight out of the raw HTML,
+# and big pages can be narrowed to one subtree (e.g. ul.srp-results) before
+# parsing.
+
+_compiled: dict = {}
+
+_json_ld_re = re.compile(
+    r"<script[^>]*type\s*=\s*[\"']application/ld\+json[\"'][^>]*>(.*?)</script\s*>", re.I | re.S
+)
+_title_re = re.compile(r"<title[^>]*>(.*?)</title\s*>", re.I | re.S)
+_spaces_re = re.compile(r"\s+")
+
+
+def xpath(expr: str) -> etree.XPath:
+    """Compiled XPath for `expr`, built once per expression."""
+    compiled = _compiled.get(expr)
+    if compiled is None:
+        compiled = _compiled[expr] = etree.XPath(expr)
+    return compiled
+
+
+def has_class(name: str) -> str:
+    """XPath predicate matching one class token, like `.name` in CSS."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def parse(markup: str):
+    """Whole-document tree; None for empty input."""
+    if not markup or not markup.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(markup)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def parse_fragment(markup: str):
+    """Tree for a piece of HTML, wrapped in one <div>."""
+    return lxml_html.fragment_fromstring(markup, create_parent="div")
+
+
+def first(node, compiled: etree.XPath):
+    found = compiled(node)
+    return found[0] if found else None
+
+
+def text(node, sep: str = " ") -> str:
+    """Stripped text of a node, pieces joined by `sep` (like BeautifulSoup's get_text(sep, strip=True))."""
+    if node is None:
+        return ""
+    return sep.join(piece.strip() for piece in node.itertext() if piece.strip())
+
+
+def title_of(markup: str) -> str | None:
+    match = _title_re.search(markup or "")
+    if not match:
+        return None
+    title = _spaces_re.sub(" ", html_lib.unescape(match.group(1))).strip()
+    return title or None
+
+
+def json_ld(markup: str):
+    """Yield the parsed value of every JSON-LD block; broken blocks are skipped."""
+    markup = markup or ""
+    # str.find jumps between blocks far faster than a regex walking the whole page
+    pos = markup.find("ld+json")
+    while pos != -1:
+        start = markup.rfind("<script", 0, pos)
+        match = _json_ld_re.match(markup, start) if start != -1 else None
+        if match:
+            try:
+                yield json.loads(match.group(1) or "{}")
+            except ValueError:
+                pass
+            pos = markup.find("ld+json", match.end())
+        else:
+            pos = markup.find("ld+json", pos + 7)
+
+
+def slice_element(markup: str, tag: str, cls: str) -> str | None:
+    """
+    Raw HTML of the first <tag> whose class contains `cls`, including nested
+    <tag> children, or None. Lets a caller parse one subtree instead of the page.
+    """
+    opening = re.search(rf"<{tag}\b[^>]*\bclass\s*=\s*[\"'][^\"']*\b{re.escape(cls)}\b[^\"']*[\"'][^>]*>", markup or "", re.I)
+    if not opening:
+        return None
+    token_re = re.compile(rf"<(/?){tag}\b[^>]*>", re.I)
+    depth = 0
+    for token in token_re.finditer(markup, opening.start()):
+        depth += -1 if token.group(1) else 1
+        if depth == 0:
+            return markup[opening.start():token.end()]
+    return markup[opening.start():]
@@ -0,0 +1,197 @@
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from fanout import HostLimiter
+
+# Logging settings
+logger = logging.getLogger("http_client")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+# Shared HTTP layer for every plain (non-browser) request.
+#
+# One keep-alive connection pool per named client, reused by all searches, so
+# a warm request costs a single round trip instead of DNS + TCP + TLS each
+# time. Sync callers get a requests.Session, async callers an httpx client;
+# both cap connections per host and retry connection errors and 429/5xx
+# answers with exponential backoff. Modules register a client name with their
+# own headers and timeout, then call request() / request_async().
+
+# brotli is optional: responses are only requested as br when it can be decoded
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+# Client settings
+DEFAULT_TIMEOUT = 20
+PER_HOST_CONNECTIONS = 6      # open connections per host; further requests wait for one
+MAX_HOSTS = 32                # hosts with a kept-alive pool (sync)
+MAX_CONNECTIONS = 64          # connections across all hosts (async)
+KEEPALIVE_EXPIRY = 30         # seconds an idle connection is kept open (async)
+RETRIES = 2                   # extra attempts after a connection error or a RETRY_STATUSES answer
+BACKOFF = 0.3                 # seconds before the first retry, doubled each time (plus jitter)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ("GET", "HEAD", "POST")   # the POSTs sent here are searches, safe to repeat
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0 Safari/537.36"
+    ),
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+_profiles: dict = {"default": {"headers": {}, "timeout": DEFAULT_TIMEOUT}}
+_sessions: dict = {}
+_async_clients: dict = {}     # name -> (client, event loop, HostLimiter)
+_lock = threading.Lock()
+
+
+def register(name: str, headers: dict | None = None, timeout: float = DEFAULT_TIMEOUT):
+    """Declare a named client; its session / async client is created on first use."""
+    _profiles[name] = {"headers": dict(headers or {}), "timeout": timeout}
+
+
+def _profile(name: str) -> dict:
+    profile = _profiles.get(name)
+    if profile is None:
+        raise ValueError(f"unknown HTTP client: {name}")
+    return profile
+
+
+def backoff_delay(attempt: int) -> float:
+    return BACKOFF * (2 ** attempt) * random.uniform(0.8, 1.2)
+
+
+# Sync front-end (requests)
+
+def get_session(name: str = "default", retries: int = RETRIES) -> requests.Session:
+    """
+    Process-wide keep-alive session for `name`. Sessions are shared between
+    threads; urllib3 retries live in the adapter, so each `retries` value
+    gets a session of its own.
+    """
+    with _lock:
+        session = _sessions.get((name, retries))
+        if session is None:
+            profile = _profile(name)
+            retry = Retry(
+                total=retries, backoff_factor=BACKOFF, status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(RETRY_METHODS), raise_on_status=False,
+                respect_retry_after_header=False,  # a long Retry-After would stall the search
+            )
+            adapter = HTTPAdapter(pool_connections=MAX_HOSTS, pool_maxsize=PER_HOST_CONNECTIONS,
+                                  pool_block=True, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({**DEFAULT_HEADERS, **profile["headers"]})
+            _sessions[(name, retries)] = session
+    return session
+
+
+def request(method: str, url: str, *, client: str = "default", retries: int = RETRIES,
+            **kwargs) -> requests.Response:
+    """requests-style call on the pooled session of `client`; retries happen inside the adapter."""
+    kwargs.setdefault("timeout", _profile(client)["timeout"])
+    with metrics.timed("http"):
+        return get_session(client, retries).request(method, url, **kwargs)
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# Async front-end (httpx)
+
+def _retire_async_client(client: httpx.AsyncClient, loop):
+    """Close a client left behind by another event loop, on that loop while it still runs."""
+    if client.is_closed:
+        return
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        # a stopped loop cannot run aclose(); its sockets are closed when the client is collected
+        logger.info("🔌 Dropping an HTTP client whose event loop has stopped")
+
+
+def _async_entry(name: str):
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(name)
+    if entry is None or entry[0].is_closed or entry[1] is not loop:
+        # httpx pools belong to the loop that opened them
+        if entry is not None:
+            _retire_async_client(entry[0], entry[1])
+        profile = _profile(name)
+        client = httpx.AsyncClient(
+            headers={**DEFAULT_HEADERS, **profile["headers"]},
+            timeout=profile["timeout"],
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+        )
+        entry = _async_clients[name] = (client, loop, HostLimiter(PER_HOST_CONNECTIONS))
+    return entry
+
+
+def get_async_client(name: str = "default") -> httpx.AsyncClient:
+    """Shared httpx client for `name` on the running event loop."""
+    return _async_entry(name)[0]
+
+
+async def request_async(method: str, url: str, *, client: str = "default", retries: int = RETRIES,
+                        **kwargs) -> httpx.Response:
+    """httpx call on the pooled client of `client`, capped per host and retried with backoff."""
+    http, _, limiter = _async_entry(client)
+    method = method.upper()
+    retryable = method in RETRY_METHODS
+    for attempt in range(retries + 1):
+        last = attempt >= retries or not retryable
+        try:
+            async with limiter.limit(url):
+                with metrics.timed("http"):
+                    resp = await http.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if last:
+                raise
+            logger.warning(f"🔁 {type(e).__name__} from {urlparse(url).netloc}, retry {attempt + 1}/{retries}")
+        else:
+            if last or resp.status_code not in RETRY_STATUSES:
+                return resp
+            logger.warning(f"🔁 {resp.status_code} from {urlparse(url).netloc}, retry {attempt + 1}/{retries}")
+        with metrics.timed("sleep", reason="backoff"):
+            await asyncio.sleep(backoff_delay(attempt))
+
+
+async def close_async_clients():
+    for client, loop, _ in list(_async_clients.values()):
+        if loop is asyncio.get_running_loop() and not client.is_closed:
+            await client.aclose()
+    _async_clients.clear()
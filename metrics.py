@@ -0,0 +1,279 @@
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Logging settings
+logger = logging.getLogger("metrics")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Per-stage latency of a search: where the time goes between the user's
+# message and the reply. Every stage lands in one histogram labelled by stage
+# and store:
+#
+#   queue_wait      waiting in the scheduler for a slot
+#   browser_wait    waiting for a pooled browser (excluding launches)
+#   browser_launch  starting Chromium
+#   navigation      page load until the wait strategy says it is ready
+#   http            plain HTTP requests (Digikala API, DuckDuckGo)
+#   sleep           rate-limit pacing and fixed pauses
+#   parse           HTML / JSON extraction
+#   telegram_send   sending and editing messages
+#   search          the whole search, end to end
+#
+# The store label comes from the context (`bind`), so code deep inside the
+# scrapers does not need to know which search it serves. Read the numbers
+# with `snapshot()` or as Prometheus text from `render()` / `serve()`.
+
+METRIC_PREFIX = "scrapershop"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+MAX_SPANS = 500               # spans kept per trace
+
+_labels: contextvars.ContextVar = contextvars.ContextVar("metric_labels", default=None)
+_trace: contextvars.ContextVar = contextvars.ContextVar("metric_trace", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {",".join(f"{k}={v}" for k, v in key) or "_": value for key, value in self._values.items()}
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, like a Prometheus histogram."""
+
+    def __init__(self, name: str, help: str, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}    # label key -> [per-bucket counts..., +Inf count], sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """Estimate from the buckets (upper bound of the bucket holding the q-th value)."""
+        series = self._series.get(_label_key(labels))
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def snapshot(self) -> dict:
+        out = {}
+        with self._lock:
+            items = list(self._series.items())
+        for key, (_, total, count) in items:
+            labels = dict(key)
+            out[",".join(f"{k}={v}" for k, v in key) or "_"] = {
+                "count": count,
+                "sum": round(total, 4),
+                "mean": round(total / count, 4) if count else None,
+                "p50": self.quantile(0.5, **labels),
+                "p95": self.quantile(0.95, **labels),
+                "p99": self.quantile(0.99, **labels),
+            }
+        return out
+
+
+class Registry:
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self.metrics: dict = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(f"{self.prefix}_{name}", help))
+
+    def histogram(self, name: str, help: str, buckets=STAGE_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(f"{self.prefix}_{name}", help, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Seconds spent in each stage of a search")
+SEARCHES = REGISTRY.counter("searches_total", "Finished searches by store and status")
+EXPIRED = REGISTRY.counter("queue_expired_total", "Jobs dropped after waiting too long in the queue")
+TELEGRAM_ERRORS = REGISTRY.counter("telegram_errors_total", "Failed Telegram sends and edits")
+
+
+@contextmanager
+def bind(**labels):
+    """Labels (e.g. store=...) added to every stage recorded inside this block, tasks and threads included."""
+    token = _labels.set({**(_labels.get() or {}), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def observe(stage: str, seconds: float, **labels):
+    merged = {**(_labels.get() or {}), **labels}
+    STAGE_SECONDS.observe(seconds, stage=stage, **merged)
+    spans = _trace.get()
+    if spans is not None and len(spans) < MAX_SPANS:
+        spans.append((stage, time.perf_counter() - seconds, seconds, merged))
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    """Time a block as `stage`. Also works as a decorator on plain functions."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, **labels)
+
+
+@contextmanager
+def trace():
+    """
+    Collect every stage recorded inside this block (and in the tasks and
+    threads it starts) as spans; yields the list of
+    (stage, start, seconds, labels) tuples.
+    """
+    spans: list = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+def format_trace(spans: list) -> str:
+    """One line per span, offsets relative to the first one."""
+    if not spans:
+        return "(no spans)"
+    origin = min(start for _, start, _, _ in spans)
+    return "\n".join(
+        f"  +{start - origin:7.3f}s {seconds:7.3f}s {stage}"
+        for stage, start, seconds, _ in sorted(spans, key=lambda span: span[1])
+    )
+
+
+def stage_totals(spans: list) -> dict:
+    """Summed seconds per stage (overlapping spans of parallel work add up)."""
+    totals: dict = {}
+    for stage, _, seconds, _ in spans:
+        totals[stage] = round(totals.get(stage, 0.0) + seconds, 3)
+    return totals
+
+
+def render() -> str:
+    """Prometheus text exposition of every metric."""
+    return REGISTRY.render()
+
+
+def snapshot() -> dict:
+    """Pull API: counters and per-stage histogram summaries as a dict."""
+    return REGISTRY.snapshot()
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expose /metrics (Prometheus text) from a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
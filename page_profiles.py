@@ -0,0 +1,172 @@
+import logging
+import threading
+from urllib.parse import urlparse
+
+# Logging settings
+logger = logging.getLogger("page_profiles")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Typical transfer size per aborted resource type, used to estimate bytes saved
+# (an aborted request never tells us its real size).
+ESTIMATED_BYTES = {
+    "image": 45_000,
+    "media": 250_000,
+    "font": 35_000,
+    "stylesheet": 25_000,
+    "script": 30_000,
+    "other": 5_000,
+}
+
+# Analytics, ad and tracking hosts nobody needs for reading titles and prices
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "googlesyndication.com", "adservice.google.com", "facebook.net",
+    "connect.facebook.com", "hotjar.com", "clarity.ms", "mc.yandex.ru",
+    "criteo.com", "criteo.net", "taboola.com", "outbrain.com",
+    "scorecardresearch.com", "newrelic.com", "nr-data.net", "sentry.io",
+)
+
+TEXT_ONLY_TYPES = ("image", "media", "font", "stylesheet")
+
+
+PROFILES: dict[str, "PageProfile"] = {}
+
+
+def _host_matches(host: str, domains) -> bool:
+    """`host` is one of `domains` or a subdomain of one."""
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class RouteStats:
+    def __init__(self):
+        self.allowed = 0
+        self.aborted = 0
+        self.bytes_saved = 0
+        self.aborted_by_type: dict[str, int] = {}
+
+    def add_aborted(self, resource_type: str):
+        self.aborted += 1
+        self.bytes_saved += ESTIMATED_BYTES.get(resource_type, ESTIMATED_BYTES["other"])
+        self.aborted_by_type[resource_type] = self.aborted_by_type.get(resource_type, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "requests_allowed": self.allowed,
+            "requests_aborted": self.aborted,
+            "bytes_saved_estimate": self.bytes_saved,
+            "aborted_by_type": dict(self.aborted_by_type),
+        }
+
+
+class PageProfile:
+    """
+    Request-interception rules for a browser context.
+
+    A request is aborted when its resource type is in `block_types` or its
+    host matches `deny`, unless its host matches `allow`. `deny` and `allow`
+    hold domains; a host matches a domain or any subdomain of it, never a
+    URL that merely mentions it. Totals over every context the profile was
+    attached to are kept in `totals`.
+    """
+
+    def __init__(self, name: str, block_types=(), deny=(), allow=()):
+        self.name = name
+        self.block_types = set(block_types)
+        self.deny = tuple(d.lower() for d in deny)
+        self.allow = tuple(a.lower() for a in allow)
+        self.totals = RouteStats()
+        self._lock = threading.Lock()
+        PROFILES[name] = self
+
+    def extend(self, name: str, block_types=(), deny=(), allow=()) -> "PageProfile":
+        """Return a per-site copy of this profile with extra rules."""
+        return PageProfile(
+            name,
+            block_types=self.block_types | set(block_types),
+            deny=self.deny + tuple(deny),
+            allow=self.allow + tuple(allow),
+        )
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        host = urlparse(url).hostname or ""
+        if _host_matches(host, self.allow):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return _host_matches(host, self.deny)
+
+    def _record(self, stats: RouteStats, blocked: bool, resource_type: str):
+        with self._lock:
+            for s in (stats, self.totals):
+                if blocked:
+                    s.add_aborted(resource_type)
+                else:
+                    s.allowed += 1
+
+    def attach(self, context) -> RouteStats:
+        """Install the rules on a sync BrowserContext; returns that context's stats."""
+        stats = RouteStats()
+
+        def handle(route):
+            request = route.request
+            blocked = self.should_block(request.url, request.resource_type)
+            self._record(stats, blocked, request.resource_type)
+            try:
+                if blocked:
+                    route.abort("blockedbyclient")
+                else:
+                    route.continue_()
+            except Exception:
+                pass  # page or context already closed
+
+        context.route("**/*", handle)
+        return stats
+
+    async def attach_async(self, context) -> RouteStats:
+        """Install the rules on an async BrowserContext; returns that context's stats."""
+        stats = RouteStats()
+
+        async def handle(route):
+            request = route.request
+            blocked = self.should_block(request.url, request.resource_type)
+            self._record(stats, blocked, request.resource_type)
+            try:
+                if blocked:
+                    await route.abort("blockedbyclient")
+                else:
+                    await route.continue_()
+            except Exception:
+                pass  # page or context already closed
+
+        await context.route("**/*", handle)
+        return stats
+
+    def report(self) -> dict:
+        with self._lock:
+            return {"profile": self.name, **self.totals.as_dict()}
+
+
+# Built-in profiles
+FULL = PageProfile("full")
+TEXT_ONLY = PageProfile("text-only", block_types=TEXT_ONLY_TYPES, deny=TRACKER_HOSTS)
+
+
+def report() -> list[dict]:
+    """Bytes saved and requests aborted for every profile in use."""
+    return [profile.report() for profile in PROFILES.values()]
+
+
+def log_context_stats(profile: PageProfile, stats: RouteStats):
+    if stats.aborted:
+        logger.info(f"🧹 [{profile.name}] aborted {stats.aborted}/{stats.aborted + stats.allowed} requests "
+                    f"(~{stats.bytes_saved / 1024:.0f} KB saved)")
@@ -0,0 +1,256 @@
+import re
+import time
+
+from lxml import etree
+
+from lru import LRUCache
+from price_normalize import DIGITS, currency_code, find_currency, parse_number
+
+# Price-candidate scan for product pages without structured price data.
+#
+# One pass over the tree visits every text piece (element text and tail)
+# exactly once, so the cost is linear in page size. Each number found is
+# scored by what surrounds it: OpenGraph/product meta, itemprop="price",
+# currency tokens, price-like class names, distance from the product title,
+# and penalties for strike-through "old" prices, phone numbers and years.
+# The scan stops at a hard CPU budget and returns the best candidate so far.
+
+PRICE_SCAN_BUDGET_MS = 50      # hard CPU budget per page (CPU time of the scanning thread)
+CHECK_EVERY = 256              # elements between budget checks
+
+META_PRICE_PROPERTIES = ("product:price:amount", "og:price:amount")
+META_CURRENCY_PROPERTIES = ("product:price:currency", "og:price:currency", "pricecurrency")
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+OLD_PRICE_TAGS = {"del", "s", "strike"}
+LOCATOR_CACHE_SIZE = 1024      # compiled locator XPaths kept (one or two per learned domain)
+
+_number_re = re.compile(r"\d[\d,٬.]*")
+_phone_re = re.compile(r"\d{2,4}\s*-\s*\d{4,}")
+_ncname_re = re.compile(r"[A-Za-z_][\w.-]*\Z")
+_locators = LRUCache(LOCATOR_CACHE_SIZE)
+
+
+class PriceCandidate:
+    __slots__ = ("text", "amount", "currency", "score", "source", "position", "element")
+
+    def __init__(self, text, amount, currency, score, source, position, element=None):
+        self.text = text
+        self.amount = amount
+        self.currency = currency
+        self.score = score
+        self.source = source
+        self.position = position
+        self.element = element    # element whose content or own text held the price (None for tails)
+
+    def __repr__(self):
+        return f"PriceCandidate({self.text!r}, score={self.score}, source={self.source})"
+
+
+def parse_amount(raw: str) -> float | None:
+    """Number from '4,590,000', '۴٬۵۹۰٬۰۰۰', '74.50' or '1.250.000'."""
+    return parse_number(raw)
+
+
+def _class_hint(el) -> int:
+    if el is None or not isinstance(el.tag, str):
+        return 0
+    if el.tag in OLD_PRICE_TAGS:
+        return -6
+    attrs = f"{el.get('class', '')} {el.get('id', '')}".lower()
+    if "old" in attrs or "strike" in attrs or "before" in attrs or "was-price" in attrs:
+        return -6
+    return 3 if "price" in attrs or "cost" in attrs or "amount" in attrs else 0
+
+
+def _text_candidates(piece: str, owner, position: int, element=None):
+    if len(piece) > 400:
+        piece = piece[:400]  # long prose is not where prices live
+    currency_match = find_currency(piece)
+    currency = currency_code(currency_match.group()) if currency_match else None
+    hint = _class_hint(owner)
+    if hint >= 0:
+        parent = owner.getparent() if owner is not None else None
+        parent_hint = _class_hint(parent)
+        hint = parent_hint if parent_hint < 0 else max(hint, parent_hint)
+
+    for match in _number_re.finditer(piece):
+        raw = match.group().rstrip(".,٬")
+        if _phone_re.match(piece, match.start()) or (raw.translate(DIGITS).startswith("0") and len(raw) >= 8):
+            continue
+        amount = parse_amount(raw)
+        if not amount:
+            continue
+        score = hint
+        if currency:
+            score += 4
+        elif "," not in raw and "٬" not in raw and "." not in raw and len(raw) == 4 and raw.translate(DIGITS)[:2] in ("13", "14", "19", "20"):
+            score -= 4  # a bare year
+        if len(piece) > 80:
+            score -= 2
+        text = f"{raw} {currency_match.group()}" if currency_match else raw
+        if currency_match and currency_match.start() < match.start():
+            text = f"{currency_match.group()}{raw}"
+        yield PriceCandidate(text, amount, currency, score, "text", position, element)
+
+
+def _currency_of(value: str | None) -> str | None:
+    """Code for a product:price:currency / priceCurrency value ('usd' -> 'USD', 'ریال' -> 'IRR')."""
+    value = (value or "").strip()
+    return currency_code(value) or value.upper() or None
+
+
+def _meta_property(el) -> str:
+    return (el.get("property") or el.get("name") or el.get("itemprop") or "").lower()
+
+
+def page_currency(root) -> str | None:
+    """Currency the page's meta tags give its meta / itemprop prices, or None."""
+    for el in root.iter("meta"):
+        if _meta_property(el) in META_CURRENCY_PROPERTIES:
+            return _currency_of(el.get("content"))
+    return None
+
+
+def _meta_candidate(el, position: int):
+    content = el.get("content")
+    amount = parse_amount(content) if content else None
+    return PriceCandidate(content, amount, None, 10, "meta", position, el) if amount else None
+
+
+def _itemprop_candidate(el, position: int):
+    content = el.get("content")
+    raw = content or (el.text or "").strip()
+    found = _number_re.search(raw or "")
+    amount = parse_amount(found.group()) if found else None
+    return PriceCandidate(raw, amount, None, 9, "itemprop", position, el) if amount else None
+
+
+def scan(root, title: str | None = None, budget_ms: float = PRICE_SCAN_BUDGET_MS) -> list:
+    """All price candidates on the page, best first."""
+    if root is None:
+        return []
+    deadline = time.thread_time() + budget_ms / 1000
+    candidates = []
+    title_position = None
+    title_key = title.strip()[:60] if title else None
+    meta_currency = None
+
+    for position, el in enumerate(root.iter()):
+        if position % CHECK_EVERY == 0 and time.thread_time() > deadline:
+            break
+        tag = el.tag if isinstance(el.tag, str) else None
+
+        if tag == "meta":
+            prop = _meta_property(el)
+            content = el.get("content")
+            if prop in META_CURRENCY_PROPERTIES:
+                meta_currency = _currency_of(content)
+            elif content and (prop in META_PRICE_PROPERTIES or prop == "price"):
+                candidate = _meta_candidate(el, position)
+                if candidate:
+                    candidates.append(candidate)
+            continue
+
+        if tag is not None and el.get("itemprop") == "price":
+            candidate = _itemprop_candidate(el, position)
+            if candidate:
+                candidates.append(candidate)
+
+        if title_key and title_position is None and (tag in ("h1", "h2") or (tag and el.get("itemprop") == "name")):
+            heading = (el.text or "").strip()
+            if len(heading) >= 4 and (heading in title or title_key in heading):
+                title_position = position
+
+        if tag is not None and tag not in SKIP_TAGS and el.text and any(ch.isdigit() for ch in el.text):
+            candidates.extend(_text_candidates(el.text, el, position, el))
+        if el.tail and any(ch.isdigit() for ch in el.tail):
+            candidates.extend(_text_candidates(el.tail, el.getparent(), position))
+
+    for candidate in candidates:
+        if candidate.currency is None and meta_currency and candidate.source != "text":
+            candidate.currency = meta_currency
+        if title_position is not None and candidate.source == "text":
+            distance = abs(candidate.position - title_position)
+            candidate.score += max(0.0, 3 - distance / 50)
+
+    return sorted(candidates, key=lambda c: (-c.score, c.position))
+
+
+def best_price(root, title: str | None = None, budget_ms: float = PRICE_SCAN_BUDGET_MS, min_score: float = 1):
+    """Best-scoring candidate, or None when nothing looks like a price."""
+    for candidate in scan(root, title=title, budget_ms=budget_ms):
+        return candidate if candidate.score >= min_score else None
+    return None
+
+
+# Locating the same price on other pages of a site (see extraction_profiles)
+
+def locate(root, expr: str):
+    """
+    First element a locator() XPath matches in `root`, or None. Locators come
+    from the pages of every domain seen, so their compiled form is kept in a
+    bounded LRU instead of html_extract's unbounded cache. Raises
+    etree.XPathError for an expression lxml cannot compile or evaluate.
+    """
+    if root is None:
+        return None
+    cached = _locators.get(expr)
+    if cached is None:
+        compiled = etree.XPath(expr)
+        _locators.set(expr, compiled)
+    else:
+        compiled = cached[0]
+    found = compiled(root)
+    return found[0] if found else None
+
+
+def locator(el) -> str | None:
+    """
+    XPath that finds the element holding this price on other pages of the
+    same site: meta property, itemprop, a digit-free id, or tag + class.
+    None when the element has nothing stable to match on, or when the XPath
+    would find another element first (e.g. the struck-through old price in
+    the same markup).
+    """
+    expr = _locator_expr(el)
+    if expr is None:
+        return None
+    try:
+        return expr if locate(el.getroottree().getroot(), expr) is el else None
+    except etree.XPathError:
+        return None
+
+
+def _locator_expr(el) -> str | None:
+    # a namespaced tag such as <fb:price> is not a valid XPath name test
+    if el is None or not isinstance(el.tag, str) or not _ncname_re.match(el.tag):
+        return None
+    if el.tag == "meta":
+        for attr in ("property", "name", "itemprop"):
+            value = el.get(attr)
+            if value and '"' not in value:
+                return f'//meta[@{attr}="{value}"]'
+        return None
+    if el.get("itemprop") == "price":
+        return '//*[@itemprop="price"]'
+    element_id = (el.get("id") or "").strip()
+    if element_id and '"' not in element_id and not any(ch.isdigit() for ch in element_id):
+        return f'//{el.tag}[@id="{element_id}"]'
+    classes = (el.get("class") or "").strip()
+    if classes and '"' not in classes:
+        return f'//{el.tag}[@class="{classes}"]'
+    return None
+
+
+def read_at(el) -> PriceCandidate | None:
+    """The price held by one element found through locator(), read the way scan() reads it."""
+    if el is None or not isinstance(el.tag, str):
+        return None
+    if el.tag == "meta" or el.get("itemprop") == "price":
+        candidate = _meta_candidate(el, 0) if el.tag == "meta" else _itemprop_candidate(el, 0)
+        if candidate is not None:
+            candidate.currency = page_currency(el.getroottree().getroot())
+        return candidate
+    if el.text and any(ch.isdigit() for ch in el.text):
+        return max(_text_candidates(el.text, el, 0, el), key=lambda c: c.score, default=None)
+    return None
@@ -0,0 +1,216 @@
+import re
+
+# One price parser for every scraper.
+#
+# Turns price text as shops print it into a number and a currency:
+# Persian (۰-۹) and Arabic-Indic (٠-٩) digits, the Persian thousands (٬) and
+# decimal (٫) separators, space-grouped thousands ("1 234,56 €"), "1,249.00" /
+# "1.249,00" style locale decimals, ranges ("$10.00 to $20.00",
+# "۱۰۰,۰۰۰ تا ۲۰۰,۰۰۰"), and Toman, Rial, $, €, £.
+# When the text holds several numbers the one next to a currency sign wins;
+# percentages ("۲۰٪ تخفیف") are never taken as the price.
+#
+# parse_prices() handles a whole batch in one call: ASCII strings skip the
+# digit translation, the rest are translated together in a single pass, bare
+# integers ("4590000") never reach a regex and bare numbers ("18,499,000")
+# skip the currency scan.
+
+CURRENCY_TOKENS = {
+    "تومان": "IRT", "تومن": "IRT", "ت": "IRT", "ریال": "IRR", "﷼": "IRR", "IRT": "IRT", "IRR": "IRR",
+    "toman": "IRT", "rial": "IRR", "دلار": "USD", "یورو": "EUR", "پوند": "GBP",
+    "US $": "USD", "USD": "USD", "$": "USD", "€": "EUR", "EUR": "EUR", "£": "GBP", "GBP": "GBP",
+}
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_BATCH_JOIN = "\x00"
+
+# a number: either grouped thousands (one separator kind, groups of three;
+# "1 234,56" uses a plain space) with an optional decimal part, or plain
+# digits with an optional decimal part
+_number_re = re.compile(
+    r"(?<![0-9])(?:[0-9]{1,3}(?P<sep>[,.٬ \u00a0\u202f])[0-9]{3}(?:(?P=sep)[0-9]{3})*(?:[.,٫][0-9]+)?"
+    r"|[0-9]+(?:[.,٫][0-9]+)?)"
+)
+# currency signs and whole words; a word is a currency only when all of it is
+# in CURRENCY_TOKENS, so "ت" never matches inside another word
+_word_re = re.compile(r"US \$|[$€£﷼]|[^\W\d_]+")
+# both in one pass over the text, in order
+_scan_re = re.compile(rf"(?P<number>{_number_re.pattern})|(?P<word>{_word_re.pattern})")
+_currency_folded = {token.casefold(): code for token, code in CURRENCY_TOKENS.items()}
+_range_re = re.compile(r"\s*(?:-|–|—|~|to|تا)\s*(?:[$€£]\s?)?$", re.I)
+_percent_re = re.compile(r"\s*[%٪]")
+
+
+class ParsedPrice:
+    __slots__ = ("amount", "currency", "upper")
+
+    def __init__(self, amount: float, currency: str | None = None, upper: float | None = None):
+        self.amount = amount          # the price, or the low end of a range
+        self.currency = currency      # IRT, IRR, USD, EUR, GBP or None when the text does not say
+        self.upper = upper            # high end of a range
+
+    def __eq__(self, other):
+        return isinstance(other, ParsedPrice) and \
+            (self.amount, self.currency, self.upper) == (other.amount, other.currency, other.upper)
+
+    def __repr__(self):
+        upper = f"-{self.upper:g}" if self.upper is not None else ""
+        return f"ParsedPrice({self.amount:g}{upper} {self.currency or '?'})"
+
+
+def currency_code(token: str) -> str | None:
+    """ISO-style code for a currency word or sign ('تومان' -> 'IRT', 'US $' -> 'USD')."""
+    return _currency_folded.get(token.casefold())
+
+
+def find_currency(text: str):
+    """re.Match of the first currency word or sign in `text`, or None."""
+    for match in _word_re.finditer(text):
+        if match.group().casefold() in _currency_folded:
+            return match
+    return None
+
+
+def normalize_digits(s):
+    return s.translate(DIGITS) if s else s
+
+
+def parse_number(raw: str, decimal: str | None = None) -> float | None:
+    """
+    Number from one token such as '4,590,000', '۴٬۵۹۰٬۰۰۰', '74.50',
+    '1.250.000' or '1.249,00'. `decimal` ('.' or ',') settles '1.250'-like
+    tokens; by default a lone separator followed by three digits groups
+    thousands.
+    """
+    if not raw:
+        return None
+    if raw.isascii():
+        if raw.isdigit():
+            return float(raw)
+        raw = raw.replace(" ", "")
+    else:
+        # ٬ and (no-break) spaces only ever group thousands
+        raw = raw.translate(DIGITS).replace("٫", ".").replace("٬", "").replace(" ", "") \
+            .replace("\u00a0", "").replace("\u202f", "")
+    raw = raw.strip(".,")
+    commas, dots = raw.count(","), raw.count(".")
+    if commas and dots:
+        # the separator that comes last is the decimal mark
+        if raw.rfind(",") > raw.rfind("."):
+            raw = raw.replace(".", "").replace(",", ".")
+        else:
+            raw = raw.replace(",", "")
+    elif commas or dots:
+        sep = "," if commas else "."
+        whole, _, tail = raw.rpartition(sep)
+        if (commas + dots) > 1 or (len(tail) == 3 and decimal != sep):
+            raw = raw.replace(sep, "")
+        else:
+            raw = f"{whole.replace(sep, '')}.{tail}"
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _currency_at(text: str, start: int, end: int, tokens: list):
+    """Currency written right before or after the number at text[start:end]."""
+    best, best_distance = None, None
+    for token_start, token_end, code in tokens:
+        if token_end <= start:
+            distance = start - token_end
+        elif token_start >= end:
+            distance = token_start - end
+        else:
+            continue
+        if distance <= 3 and (best_distance is None or distance < best_distance):
+            best, best_distance = code, distance
+    return best
+
+
+def _parse_normalized(text: str, decimal: str | None) -> ParsedPrice | None:
+    """parse_price() on text whose digits are already ASCII."""
+    if _number_re.fullmatch(text):
+        # the common "18,499,000" cell: nothing else to look at
+        amount = parse_number(text, decimal)
+        return ParsedPrice(amount) if amount is not None else None
+    numbers, tokens = [], []
+    for m in _scan_re.finditer(text):
+        if m.lastgroup == "word":
+            code = _currency_folded.get(m.group().casefold())
+            if code:
+                tokens.append((m.start(), m.end(), code))
+        elif not _percent_re.match(text, m.end()):
+            numbers.append(m)
+    if not numbers:
+        return None
+
+    chosen, currency = 0, None
+    if tokens:
+        for i, m in enumerate(numbers):
+            currency = _currency_at(text, m.start(), m.end(), tokens)
+            if currency:
+                chosen = i
+                break
+        else:
+            currency = tokens[0][2]
+        # "100,000 تا 200,000 تومان": the currency sits on the high end of a range
+        if chosen and _range_re.match(text[numbers[chosen - 1].end():numbers[chosen].start()]):
+            chosen -= 1
+
+    match = numbers[chosen]
+    amount = parse_number(match.group(), decimal)
+    if amount is None:
+        return None
+    upper = None
+    if chosen + 1 < len(numbers):
+        following = numbers[chosen + 1]
+        if _range_re.match(text[match.end():following.start()]):
+            upper = parse_number(following.group(), decimal)
+            if currency is None:
+                currency = _currency_at(text, following.start(), following.end(), tokens)
+    return ParsedPrice(amount, currency, upper)
+
+
+def parse_price(text: str, decimal: str | None = None) -> ParsedPrice | None:
+    """Price in a piece of text, or None when it has no number."""
+    if not text:
+        return None
+    if text.isascii():
+        if text.isdigit():
+            return ParsedPrice(float(text))
+    else:
+        text = text.translate(DIGITS)
+    return _parse_normalized(text, decimal)
+
+
+def parse_prices(texts, decimal: str | None = None) -> list:
+    """parse_price() over many strings at once; one result (or None) per input, in order."""
+    texts = list(texts)
+    results: list = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        if text.isascii():
+            results[i] = ParsedPrice(float(text)) if text.isdigit() else _parse_normalized(text, decimal)
+        else:
+            pending.append(i)
+
+    if pending:
+        # one translate() call for every non-ASCII string in the batch
+        translated = _BATCH_JOIN.join([texts[i] for i in pending]).translate(DIGITS).split(_BATCH_JOIN)
+        if len(translated) != len(pending):  # a string held the separator itself
+            translated = [texts[i].translate(DIGITS) for i in pending]
+        for i, text in zip(pending, translated):
+            results[i] = _parse_normalized(text, decimal)
+    return results
+
+
+def price_amount(text: str, decimal: str | None = None) -> float | None:
+    """Just the amount (low end of a range) as a float."""
+    price = parse_price(text, decimal)
+    return price.amount if price else None
+
+
+def price_amounts(texts, decimal: str | None = None) -> list:
+    return [price.amount if price else None for price in parse_prices(texts, decimal)]
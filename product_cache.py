@@ -0,0 +1,168 @@
+import time
+import asyncio
+import logging
+import threading
+
+import http_client
+from lru import LRUCache
+
+# Logging settings
+logger = logging.getLogger("product_cache")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Cache settings
+MAX_ENTRIES = 4096            # parsed product pages kept per cache
+TTL = 900                     # seconds a parsed page is trusted without asking the server
+REVALIDATE_WINDOW = 86400     # after TTL, entries with an ETag/Last-Modified may be revalidated for this long
+REVALIDATE_TIMEOUT = 8
+
+REVALIDATE_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0 Safari/537.36"
+    ),
+    "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7",
+}
+http_client.register("product_cache", headers=REVALIDATE_HEADERS, timeout=REVALIDATE_TIMEOUT)
+
+
+def _validators(headers) -> dict:
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    return {"etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
+
+
+class ProductCache:
+    """
+    URL-keyed cache of parsed product pages, e.g. the `(title, price)` that
+    extract_product_from_html returns.
+
+    Entries are fresh for `ttl` seconds. After that, an entry that came with an
+    ETag or Last-Modified header is revalidated with a conditional GET: a 304
+    refreshes it without loading the page, and a 200 is re-parsed in place when
+    `parse` yields a usable record.
+    """
+
+    def __init__(self, name: str, max_entries: int = MAX_ENTRIES, ttl: float = TTL,
+                 revalidate_window: float = REVALIDATE_WINDOW):
+        self.name = name
+        self.ttl = ttl
+        self.revalidate_window = revalidate_window
+        self._entries = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "revalidated_304": 0, "revalidated_200": 0,
+                          "revalidation_errors": 0, "stores": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _entry(self, url: str):
+        """Return (entry, age) or (None, None); expired entries are dropped."""
+        found = self._entries.get(url)
+        if found is None:
+            return None, None
+        entry, stored_at = found
+        age = time.time() - stored_at
+        if age >= self.ttl + self.revalidate_window or (age >= self.ttl and not (entry["etag"] or entry["last_modified"])):
+            self._entries.pop(url)
+            return None, None
+        return entry, age
+
+    def store(self, url: str, record, headers=None):
+        """Remember a parsed record, with the response headers it came with (for revalidation)."""
+        if record is None:
+            return
+        self._entries.set(url, {"record": record, **_validators(headers)})
+        self._count("stores")
+
+    def _conditional_headers(self, entry) -> dict:
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _after_revalidation(self, url, entry, status, text, headers, parse, accept):
+        if status == 304:
+            self._count("revalidated_304")
+            self._entries.set(url, {**entry, **{k: v for k, v in _validators(headers).items() if v}})
+            logger.info(f"♻️ [{self.name}] 304 Not Modified → reused {url}")
+            return entry["record"]
+        if status == 200 and parse is not None:
+            record = parse(text)
+            if accept(record):
+                self._count("revalidated_200")
+                self.store(url, record, headers)
+                return record
+        return None
+
+    def _fresh(self, url: str):
+        entry, age = self._entry(url)
+        if entry is not None and age < self.ttl:
+            self._count("hits")
+            return entry, True
+        return entry, False
+
+    def lookup(self, url: str, parse=None, accept=bool):
+        """
+        Return a usable record for `url` without a browser, or None.
+        `parse(html)` turns a 200 revalidation body into a record; `accept(record)`
+        decides whether that record is good enough to use.
+        """
+        entry, fresh = self._fresh(url)
+        if fresh:
+            return entry["record"]
+        if entry is None:
+            self._count("misses")
+            return None
+
+        try:
+            resp = http_client.request("GET", url, client="product_cache", headers=self._conditional_headers(entry))
+            record = self._after_revalidation(url, entry, resp.status_code, resp.text, resp.headers, parse, accept)
+        except Exception as e:
+            self._count("revalidation_errors")
+            logger.warning(f"⚠️ [{self.name}] Revalidation failed for {url}: {e}")
+            record = None
+        if record is None:
+            self._count("misses")
+        return record
+
+    async def lookup_async(self, url: str, parse=None, accept=bool):
+        """Async version of lookup() on the shared async HTTP client."""
+        entry, fresh = self._fresh(url)
+        if fresh:
+            return entry["record"]
+        if entry is None:
+            self._count("misses")
+            return None
+
+        try:
+            resp = await http_client.request_async("GET", url, client="product_cache",
+                                                   headers=self._conditional_headers(entry))
+            # a changed page is parsed again: CPU work, kept off the event loop
+            record = await asyncio.to_thread(self._after_revalidation, url, entry, resp.status_code, resp.text,
+                                             resp.headers, parse, accept)
+        except Exception as e:
+            self._count("revalidation_errors")
+            logger.warning(f"⚠️ [{self.name}] Revalidation failed for {url}: {e}")
+            record = None
+        if record is None:
+            self._count("misses")
+        return record
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {"cache": self.name, **counters, "entries": len(self._entries), "evictions": self._entries.evictions}
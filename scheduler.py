@@ -0,0 +1,343 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+
+import metrics
+
+# Logging settings
+logger = logging.getLogger("scheduler")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Scheduler settings
+STORE_CONCURRENCY = 3         # default running jobs per store
+GLOBAL_CONCURRENCY = 9        # running jobs across all stores
+QUEUE_DEADLINE = 180          # seconds a job may wait for a slot before it is dropped
+INITIAL_SERVICE_TIME = 15.0   # seconds, until real service times have been measured
+SERVICE_TIME_ALPHA = 0.2      # EWMA weight of the newest service time
+
+
+# Job whose handler is running in the current task (None outside the scheduler)
+_current_job = contextvars.ContextVar("scheduler_job", default=None)
+
+
+def current_job():
+    """The Job being run by the calling code, or None when it is not a scheduler job."""
+    return _current_job.get()
+
+
+class Job:
+    __slots__ = ("id", "store", "chat_id", "handler", "weight", "deadline", "on_expired", "on_cancel",
+                 "start_tag", "finish_tag", "state", "enqueued_at", "started_at", "held")
+
+    def __init__(self, job_id, store, chat_id, handler, weight, deadline, on_expired, on_cancel=None):
+        self.id = job_id
+        self.store = store
+        self.chat_id = chat_id
+        self.handler = handler
+        self.weight = weight
+        self.deadline = deadline
+        self.on_expired = on_expired
+        self.on_cancel = on_cancel
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.state = "queued"
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.held = ()             # gate slots reserved for this job while it runs
+
+
+class Lane:
+    """
+    Jobs of one store. Users are served by start-time fair queuing: each job
+    gets a virtual finish tag, and a user with many queued jobs only gets
+    their fair share of the store's slots.
+    """
+
+    def __init__(self, store: str, limit, weight: float = 1.0):
+        self.store = store
+        # A plain int, or a limiter object whose `.limit` changes at runtime (see adaptive_limit)
+        self.limiter = limit if hasattr(limit, "limit") else None
+        self._limit = None if self.limiter else limit
+        self.weight = weight
+        self.heap: list = []
+        self.queued = 0
+        self.running = 0
+        self.vtime = 0.0
+        self.user_finish: dict = {}
+        self.service_time = INITIAL_SERVICE_TIME
+        self._seq = itertools.count()
+
+    @property
+    def limit(self) -> int:
+        return self.limiter.limit if self.limiter else self._limit
+
+    def push(self, job: Job):
+        job.start_tag = max(self.vtime, self.user_finish.get(job.chat_id, 0.0))
+        job.finish_tag = job.start_tag + 1.0 / job.weight
+        self.user_finish[job.chat_id] = job.finish_tag
+        heapq.heappush(self.heap, (job.finish_tag, next(self._seq), job))
+        self.queued += 1
+
+    def pop(self) -> Job | None:
+        while self.heap:
+            _, _, job = heapq.heappop(self.heap)
+            if job.state != "queued":
+                continue  # cancelled: lazily removed
+            self.queued -= 1
+            self.vtime = job.start_tag
+            if len(self.user_finish) > 1024:
+                self.user_finish = {u: f for u, f in self.user_finish.items() if f > self.vtime}
+            return job
+        return None
+
+    def discard(self):
+        """Account for a queued job that was cancelled in place."""
+        self.queued -= 1
+        if len(self.heap) > 2 * self.queued + 64:
+            self.heap = [entry for entry in self.heap if entry[2].state == "queued"]
+            heapq.heapify(self.heap)
+
+    def record_service_time(self, seconds: float):
+        self.service_time += SERVICE_TIME_ALPHA * (seconds - self.service_time)
+
+
+class FairScheduler:
+    """
+    Runs search jobs with weighted fair queuing across users and stores.
+
+    Every store is a Lane with its own concurrency limit (fixed, or an
+    AdaptiveLimit that follows the store's latency); all lanes share
+    `global_limit`. Free slots go to the eligible store with the lowest
+    virtual time (scaled by store weight), then to the job with the lowest
+    finish tag inside it. Jobs are cancelled in O(1) by id, and jobs still
+    waiting past their deadline are dropped instead of started.
+    """
+
+    def __init__(self, limits: dict, global_limit: int = GLOBAL_CONCURRENCY,
+                 store_weights: dict | None = None, queue_deadline: float = QUEUE_DEADLINE):
+        store_weights = store_weights or {}
+        self.lanes = {store: Lane(store, limit, store_weights.get(store, 1.0)) for store, limit in limits.items()}
+        self.global_limit = global_limit
+        self.queue_deadline = queue_deadline
+        self.user_weights: dict = {}
+        self.store_vtime = {store: 0.0 for store in self.lanes}
+        self.jobs: dict[int, Job] = {}
+        self.by_chat: dict[int, set] = {}
+        self.running_total = 0
+        self._ids = itertools.count(1)
+        self._tasks: set = set()
+        self._gates: list = []
+        self.counters = {"submitted": 0, "started": 0, "completed": 0, "failed": 0,
+                         "cancelled": 0, "expired": 0}
+
+    # submission / cancellation
+    def submit(self, store: str, chat_id: int, handler, deadline: float | None = None,
+               on_expired=None, on_cancel=None) -> dict:
+        """
+        Queue a job; it starts right away if its store and the global budget have room.
+        `on_expired()` runs if it waits past its deadline, `on_cancel()` if it is cancelled while queued.
+        """
+        lane = self.lanes[store]
+        wait_limit = self.queue_deadline if deadline is None else deadline
+        job = Job(next(self._ids), store, chat_id, handler,
+                  self.user_weights.get(chat_id, 1.0), time.monotonic() + wait_limit, on_expired, on_cancel)
+
+        if lane.queued == 0:
+            # A store that was idle must not bank credit and then starve the others
+            active = [self.store_vtime[s] for s, l in self.lanes.items() if l.queued and s != store]
+            if active:
+                self.store_vtime[store] = max(self.store_vtime[store], min(active))
+
+        lane.push(job)
+        self.jobs[job.id] = job
+        self.by_chat.setdefault(chat_id, set()).add(job.id)
+        self.counters["submitted"] += 1
+        self._dispatch()
+        return self.status(job.id)
+
+    def cancel_job(self, job_id: int) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.state != "queued":
+            return False
+        job.state = "cancelled"
+        self.lanes[job.store].discard()
+        self._forget(job)
+        self.counters["cancelled"] += 1
+        if job.on_cancel is not None:
+            job.on_cancel()
+        return True
+
+    def cancel_user(self, chat_id: int) -> bool:
+        """Cancel every queued job of a user; running jobs are left alone."""
+        return any([self.cancel_job(job_id) for job_id in list(self.by_chat.get(chat_id, ()))])
+
+    def reassign(self, job_id: int, chat_id: int):
+        """Move a job to another owner (used when the original requester detaches)."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        self.by_chat.get(job.chat_id, set()).discard(job_id)
+        job.chat_id = chat_id
+        self.by_chat.setdefault(chat_id, set()).add(job_id)
+
+    def is_user_queued(self, chat_id: int) -> bool:
+        return any(self.jobs[j].state == "queued" for j in self.by_chat.get(chat_id, ()) if j in self.jobs)
+
+    # dispatching
+    def add_gate(self, acquire, release=None, stores=None):
+        """
+        Hold queued jobs until `acquire()` grants a slot downstream (back-pressure,
+        e.g. from workers). The slot is reserved before the job starts, so one
+        dispatch pass cannot overbook it, and `release()` returns it when the job ends.
+        With `stores` the gate only applies to jobs of those stores.
+        """
+        self._gates.append((acquire, release, set(stores) if stores is not None else None))
+
+    def _acquire_gates(self, store: str):
+        held = []
+        for acquire, release, stores in self._gates:
+            if stores is not None and store not in stores:
+                continue
+            if not acquire():
+                self._release_gates(held)
+                return None
+            held.append(release)
+        return held
+
+    @staticmethod
+    def _release_gates(held):
+        for release in held:
+            if release is not None:
+                release()
+
+    def wake(self):
+        """Re-run dispatching, e.g. when a gate reports capacity again."""
+        self._dispatch()
+
+    def _next_lane(self) -> Lane | None:
+        eligible = [lane for lane in self.lanes.values() if lane.queued and lane.running < lane.limit]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda lane: self.store_vtime[lane.store])
+
+    def _dispatch(self):
+        while self.running_total < self.global_limit:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            held = self._acquire_gates(lane.store)
+            if held is None:
+                return
+            job = lane.pop()
+            if job is None:
+                self._release_gates(held)
+                continue
+            self.store_vtime[lane.store] += 1.0 / lane.weight
+            if time.monotonic() > job.deadline:
+                self._release_gates(held)
+                self._expire(job)
+                continue
+            job.held = held
+            self._start(job, lane)
+
+    def _start(self, job: Job, lane: Lane):
+        job.state = "running"
+        job.started_at = time.monotonic()
+        lane.running += 1
+        self.running_total += 1
+        self.counters["started"] += 1
+        task = asyncio.create_task(self._run(job, lane))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Job, lane: Lane):
+        try:
+            _current_job.set(job)   # the task has its own context, so this ends with it
+            with metrics.bind(store=job.store):
+                metrics.observe("queue_wait", job.started_at - job.enqueued_at)
+                if asyncio.iscoroutinefunction(job.handler):
+                    await job.handler()
+                else:
+                    await asyncio.to_thread(job.handler)
+            self.counters["completed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.exception(f"❌Job Execution Error{lane.store}: {e}")
+        finally:
+            lane.running -= 1
+            self.running_total -= 1
+            lane.record_service_time(time.monotonic() - job.started_at)
+            self._release_gates(job.held)
+            job.held = ()
+            job.state = "done"
+            self._forget(job)
+            self._dispatch()
+
+    def _expire(self, job: Job):
+        job.state = "expired"
+        self._forget(job)
+        self.counters["expired"] += 1
+        metrics.EXPIRED.inc(store=job.store)
+        waited = time.monotonic() - job.enqueued_at
+        logger.warning(f"⌛ Dropping stale job {job.id} ({job.store}) after {waited:.0f}s in queue")
+        if job.on_expired is not None:
+            result = job.on_expired()
+            if asyncio.iscoroutine(result):
+                task = asyncio.create_task(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def _forget(self, job: Job):
+        self.jobs.pop(job.id, None)
+        owned = self.by_chat.get(job.chat_id)
+        if owned is not None:
+            owned.discard(job.id)
+            if not owned:
+                self.by_chat.pop(job.chat_id, None)
+
+    # reporting
+    def status(self, job_id: int) -> dict:
+        """State, 1-based queue position and ETA (seconds) from measured service times."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"job_id": job_id, "status": "done", "position": 0, "eta": 0}
+        lane = self.lanes[job.store]
+        if job.state == "running":
+            remaining = max(0.0, lane.service_time - (time.monotonic() - job.started_at))
+            return {"job_id": job_id, "status": "running", "position": 0, "eta": round(remaining)}
+
+        now = time.monotonic()
+        ahead = sum(1 for tag, _, other in lane.heap
+                    if other.state == "queued" and other is not job and now <= other.deadline
+                    and tag <= job.finish_tag)
+        slots = max(1, min(lane.limit, self.global_limit))
+        eta = lane.service_time * (ahead // slots + 1)
+        return {"job_id": job_id, "status": "queued", "position": ahead + 1, "eta": round(eta)}
+
+    def limits(self) -> dict:
+        """Current concurrency limit per store."""
+        return {store: lane.limit for store, lane in self.lanes.items()}
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "running": self.running_total,
+            "stores": {
+                store: {"queued": lane.queued, "running": lane.running, "limit": lane.limit,
+                        "service_time": round(lane.service_time, 2)}
+                for store, lane in self.lanes.items()
+            },
+        }
@@ -0,0 +1,211 @@
+import re
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from price_normalize import normalize_digits
+from singleflight import SingleFlight
+from lru import LRUCache
+
+# Logging settings
+logger = logging.getLogger("search_cache")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Cache settings
+MEMORY_ENTRIES = 512            # in-process LRU size
+SQLITE_PATH = None              # e.g. "search_cache.sqlite3" to keep results across restarts
+DEFAULT_TTL = 600               # seconds a result counts as fresh
+STORE_TTLS = {"digikala": 600, "ebay": 300, "global": 1800}
+STALE_TTL = 1800                # extra seconds a stale result may be served while revalidating
+PURGE_INTERVAL = 600            # seconds between deletions of expired SQLite rows (done on write)
+
+_spaces_re = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Same key for "iPhone 15", " iphone  ۱۵ " and "IPHONE ١٥"."""
+    if not query:
+        return ""
+    query = normalize_digits(query)
+    query = query.replace("ي", "ی").replace("ك", "ک").replace("‌", " ")
+    return _spaces_re.sub(" ", query).strip().casefold()
+
+
+def is_cacheable(results) -> bool:
+    """Only real results are cached; empty lists and error placeholders are not."""
+    if not results or not isinstance(results, list):
+        return False
+    return not any(isinstance(r, dict) and r.get("url") == "#" for r in results)
+
+
+class SQLiteTier:
+    """On-disk second tier so popular results survive restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, stored_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), stored_at),
+            )
+            self._conn.commit()
+
+    def purge(self, older_than: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache WHERE stored_at < ?", (older_than,))
+            self._conn.commit()
+
+
+class SearchCache:
+    """
+    Result cache in front of the scrapers, keyed by
+    (store, normalized query, max_results) plus an optional scope such as the
+    Global-mode site link.
+
+    Fresh results are returned directly. Stale results (older than the store's
+    TTL but within STALE_TTL) are returned immediately while one background
+    job refreshes them. Concurrent misses for the same key share one fetch.
+
+    `background(store, job, on_expired)` decides where refreshes run, e.g. as
+    scheduler jobs so they wait for the store's slots like user searches;
+    without it they start right away as plain tasks.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_ENTRIES, sqlite_path: str | None = SQLITE_PATH,
+                 store_ttls: dict | None = None, default_ttl: float = DEFAULT_TTL,
+                 stale_ttl: float = STALE_TTL, background=None):
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteTier(sqlite_path) if sqlite_path else None
+        self.store_ttls = dict(STORE_TTLS if store_ttls is None else store_ttls)
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.background = background
+        self.flights = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+        self._revalidating: set[str] = set()
+        self._purged_at = time.time()
+        self._counters = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0,
+                          "revalidations": 0, "revalidation_errors": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(store: str, query: str, max_results: int, scope: str | None = None) -> str:
+        return json.dumps([store, scope or "", max_results, normalize_query(query)], ensure_ascii=False)
+
+    def ttl_for(self, store: str) -> float:
+        return self.store_ttls.get(store, self.default_ttl)
+
+    async def _lookup(self, key: str):
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self._counters["disk_hits"] += 1
+                self.memory.set(key, entry[0], stored_at=entry[1])
+        return entry
+
+    async def _store(self, key: str, results):
+        if not is_cacheable(results):
+            return
+        stored_at = time.time()
+        self.memory.set(key, results, stored_at=stored_at)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, results, stored_at)
+            if stored_at - self._purged_at > PURGE_INTERVAL:
+                # nothing older than the longest TTL plus STALE_TTL is ever served again
+                self._purged_at = stored_at
+                expired = stored_at - max([self.default_ttl, *self.store_ttls.values()]) - self.stale_ttl
+                await asyncio.to_thread(self.disk.purge, expired)
+        self._counters["stores"] += 1
+
+    async def _fetch_and_store(self, key: str, fetch):
+        results = await fetch()
+        await self._store(key, results)
+        return results
+
+    def _revalidate(self, store: str, key: str, fetch):
+        if key in self._revalidating or self.flights.is_inflight(key):
+            return
+        self._revalidating.add(key)
+
+        async def run():
+            try:
+                await self.flights.do(key, lambda: self._fetch_and_store(key, fetch))
+                self._counters["revalidations"] += 1
+            except Exception as e:
+                self._counters["revalidation_errors"] += 1
+                logger.warning(f"⚠️ Background revalidation failed: {e}")
+            finally:
+                self._revalidating.discard(key)
+
+        if self.background is not None:
+            self.background(store, run, lambda: self._revalidating.discard(key))
+            return
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_fetch(self, store: str, query: str, max_results: int, fetch, scope: str | None = None):
+        """Return cached results for this search, or await `fetch()` and cache what it returns."""
+        key = self.make_key(store, query, max_results, scope)
+        entry = await self._lookup(key)
+
+        if entry is not None:
+            results, stored_at = entry
+            age = time.time() - stored_at
+            ttl = self.ttl_for(store)
+            if age < ttl:
+                self._counters["hits"] += 1
+                logger.info(f"⚡ Cache hit [{store}] '{query}' (age {age:.0f}s)")
+                return results
+            if age < ttl + self.stale_ttl:
+                self._counters["stale_hits"] += 1
+                logger.info(f"♻️ Serving stale [{store}] '{query}' (age {age:.0f}s), revalidating")
+                self._revalidate(store, key, fetch)
+                return results
+            self.memory.pop(key)
+
+        # Identical misses running at the same time share one scrape
+        self._counters["misses"] += 1
+        return await self.flights.do(key, lambda: self._fetch_and_store(key, fetch))
+
+    def stats(self) -> dict:
+        lookups = self._counters["hits"] + self._counters["stale_hits"] + self._counters["misses"]
+        served = self._counters["hits"] + self._counters["stale_hits"]
+        return {
+            **self._counters,
+            "coalesced": self.flights.shared,
+            "entries": len(self.memory),
+            "evictions": self.memory.evictions,
+            "hit_ratio": round(served / lookups, 3) if lookups else 0.0,
+        }
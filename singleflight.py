@@ -0,0 +1,52 @@
+import asyncio
+import functools
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight work.
+
+    The first caller for a key starts `fn()`; callers arriving while it runs
+    await the same task and get the same result. Each caller can be cancelled
+    on its own: the shared task keeps running for the others and is cancelled
+    only when its last caller detaches.
+    """
+
+    def __init__(self):
+        self._tasks: dict = {}
+        self._callers: dict = {}
+        self.started = 0
+        self.shared = 0
+
+    def is_inflight(self, key) -> bool:
+        return key in self._tasks
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            self._tasks.pop(key, None)
+            self._callers.pop(key, None)
+
+    async def do(self, key, fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._tasks[key] = task
+            self._callers[key] = 0
+            task.add_done_callback(functools.partial(self._forget, key))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        self._callers[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._tasks.get(key) is task and self._callers.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if self._tasks.get(key) is task:
+                self._callers[key] -= 1
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._tasks), "started": self.started, "shared": self.shared}
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+
+import http_client
+import metrics
+from lru import LRUCache
+
+# Logging settings
+logger = logging.getLogger("tiered_fetch")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+# HTTP-first page fetching with browser escalation.
+#
+# Many shops put the full product (JSON-LD, meta tags, the price in the markup)
+# in the static HTML, so a pooled HTTP GET is enough and no browser is needed.
+# The static page is parsed first; only when that gives no usable record (or
+# the host answers with a bot wall / error) is the page rendered in Chromium.
+# Each domain remembers which tier worked: after ESCALATE_AFTER escalations in
+# a row it goes straight to the browser, and it is re-probed over HTTP every
+# RECHECK_AFTER seconds in case the site changed.
+
+ESCALATE_AFTER = 2            # consecutive escalations before a domain skips the HTTP tier
+RECHECK_AFTER = 3600          # seconds before a browser-only domain gets another HTTP try
+MAX_DOMAINS = 2048            # domains remembered
+ESCALATE_STATUSES = (401, 403, 405, 406, 429, 503)   # typical bot-wall answers
+
+FETCHES = metrics.REGISTRY.counter("fetch_tier_total", "Product page fetches by tier and result")
+
+
+def domain_of(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class TieredFetcher:
+    """
+    Fetch and parse a page over HTTP, escalating to a browser when needed.
+
+    `extract(html, url)` turns a page into a record and `usable(record)` says if
+    it is good enough. `browser_fetch(url, on_response=...)` (and its async
+    twin) return rendered HTML or None. fetch() / fetch_async() return
+    `(record, headers, tier)`; record is None when no tier produced a page.
+
+    The GET is sent once, without http_client's retries: a 429 / 503 is a
+    reason to escalate (and to remember the domain), not to ask again at
+    once. `rate_limit` (a wait_strategy.RateLimitPolicy) paces it like the
+    browser tier.
+    """
+
+    def __init__(self, name: str, extract, usable, browser_fetch, browser_fetch_async,
+                 client: str = "default", max_domains: int = MAX_DOMAINS, rate_limit=None):
+        self.name = name
+        self.rate_limit = rate_limit
+        self.extract = extract
+        self.usable = usable
+        self.browser_fetch = browser_fetch
+        self.browser_fetch_async = browser_fetch_async
+        self.client = client
+        self._domains = LRUCache(max_domains)   # domain -> {"misses", "browser_since"}
+        self._lock = threading.Lock()
+        self._counters = {"http": 0, "escalated": 0, "browser_direct": 0, "failed": 0}  # by the tier that answered
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    # Domain memory
+
+    def _memory(self, domain: str) -> dict:
+        found = self._domains.get(domain)
+        return found[0] if found else {"misses": 0, "browser_since": None}
+
+    def tier_for(self, url: str) -> str:
+        """'http' or 'browser': where the next fetch for this URL's domain starts."""
+        memory = self._memory(domain_of(url))
+        since = memory["browser_since"]
+        if since is None or time.time() - since >= RECHECK_AFTER:
+            return "http"
+        return "browser"
+
+    def _remember(self, url: str, http_worked: bool, walled: bool = False):
+        domain = domain_of(url)
+        memory = dict(self._memory(domain))
+        if http_worked:
+            if memory["browser_since"] is not None:
+                logger.info(f"🪶 [{self.name}] {domain} works over plain HTTP again")
+            memory = {"misses": 0, "browser_since": None}
+        else:
+            # a bot wall will not go away on the next request
+            memory["misses"] = max(memory["misses"] + 1, ESCALATE_AFTER if walled else 0)
+            if memory["misses"] >= ESCALATE_AFTER:
+                if memory["browser_since"] is None:
+                    logger.info(f"🧭 [{self.name}] {domain} needs a browser; skipping HTTP for {RECHECK_AFTER}s")
+                memory["browser_since"] = time.time()
+        self._domains.set(domain, memory)
+
+    # HTTP tier
+
+    def _static(self, url: str, resp):
+        """Record parsed from a static response (None when unusable), its headers, and whether it looks walled."""
+        walled = resp.status_code in ESCALATE_STATUSES
+        content_type = resp.headers.get("content-type") or "text/html"
+        if resp.status_code != 200 or "html" not in content_type:
+            logger.info(f"🪶 [{self.name}] HTTP {resp.status_code} ({content_type}) for {url}")
+            return None, {}, walled
+        return self.extract(resp.text, url), dict(resp.headers), walled
+
+    def _after_http(self, url: str, static, walled: bool) -> bool:
+        """Record the HTTP outcome for the domain; True when the static record is good enough."""
+        usable = static is not None and self.usable(static)
+        self._remember(url, usable, walled)
+        if usable:
+            self._count("http")
+            FETCHES.inc(tier="http", result="ok")
+        return usable
+
+    def _after_browser(self, url, html, headers, static, static_headers, escalated: bool):
+        if html:
+            self._count("escalated" if escalated else "browser_direct")
+            FETCHES.inc(tier="browser", result="ok")
+            return self.extract(html, url), headers, "browser"
+        self._count("failed")
+        FETCHES.inc(tier="browser", result="failed")
+        # a partial static record (e.g. title without price) beats nothing
+        return (static, static_headers, "http") if static is not None else (None, {}, None)
+
+    def fetch(self, url: str):
+        static, static_headers, escalated = None, {}, False
+        if self.tier_for(url) == "http":
+            walled = False
+            try:
+                if self.rate_limit is not None:
+                    self.rate_limit.wait_turn(url)
+                resp = http_client.request("GET", url, client=self.client, retries=0)
+                static, static_headers, walled = self._static(url, resp)
+            except Exception as e:
+                logger.info(f"🪶 [{self.name}] HTTP fetch failed for {url}: {e}")
+            if self._after_http(url, static, walled):
+                return static, static_headers, "http"
+            escalated = True
+
+        headers = {}
+        html = self.browser_fetch(url, on_response=lambda r: headers.update(r.headers))
+        return self._after_browser(url, html, headers, static, static_headers, escalated)
+
+    async def fetch_async(self, url: str):
+        static, static_headers, escalated = None, {}, False
+        if self.tier_for(url) == "http":
+            walled = False
+            try:
+                if self.rate_limit is not None:
+                    await self.rate_limit.wait_turn_async(url)
+                resp = await http_client.request_async("GET", url, client=self.client, retries=0)
+                # extract() is a full parse plus the price scan: keep it off the event loop
+                static, static_headers, walled = await asyncio.to_thread(self._static, url, resp)
+            except Exception as e:
+                logger.info(f"🪶 [{self.name}] HTTP fetch failed for {url}: {e}")
+            if self._after_http(url, static, walled):
+                return static, static_headers, "http"
+            escalated = True
+
+        headers = {}
+        html = await self.browser_fetch_async(url, on_response=lambda r: headers.update(r.headers))
+        return await asyncio.to_thread(self._after_browser, url, html, headers, static, static_headers, escalated)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {"fetcher": self.name, **counters, "domains": len(self._domains)}
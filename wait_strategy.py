@@ -0,0 +1,200 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+
+import metrics
+
+# Logging settings
+logger = logging.getLogger("wait_strategy")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+JSON_LD_SELECTOR = 'script[type="application/ld+json"]'
+POLL_SLICE_MS = 250   # sync waits alternate between signals in slices of this size
+POLL_MS = 100         # how often the JSON-LD check runs in the page
+
+# Ready when `selector` matches or (with checkJsonLd) a JSON-LD block describes a
+# Product; a BreadcrumbList or Organization block alone says nothing about the price
+READY_JS = """
+([selector, checkJsonLd]) => {
+    if (selector && document.querySelector(selector)) return true;
+    if (!checkJsonLd) return false;
+    const isProduct = (node) => {
+        if (Array.isArray(node)) return node.some(isProduct);
+        if (!node || typeof node !== "object") return false;
+        const types = [].concat(node["@type"] || []);
+        return types.some(t => String(t).toLowerCase() === "product") || isProduct(node["@graph"]);
+    };
+    for (const script of document.querySelectorAll('%s')) {
+        try {
+            if (isProduct(JSON.parse(script.textContent))) return true;
+        } catch (e) {}
+    }
+    return false;
+}
+""" % JSON_LD_SELECTOR
+
+
+class WaitStrategy:
+    """
+    Decides when a loaded page is ready to be read, instead of sleeping.
+
+    The page is ready as soon as `selector` matches or (with `json_ld=True`) a
+    JSON-LD <script> with a Product in it appears. With `network_idle=True` the network going quiet
+    also counts. Nothing waits past `deadline_ms`; on the deadline the caller
+    simply reads whatever has rendered so far.
+    """
+
+    def __init__(self, selector: str | None = None, json_ld: bool = False,
+                 network_idle: bool = False, deadline_ms: int = 10000):
+        self.selector = selector
+        self.json_ld = json_ld
+        self.network_idle = network_idle
+        self.deadline_ms = deadline_ms
+
+    def _wait_dom(self, page, timeout: float):
+        if self.json_ld:
+            page.wait_for_function(READY_JS, arg=[self.selector, True], timeout=timeout, polling=POLL_MS)
+        else:
+            page.wait_for_selector(self.selector, state="attached", timeout=timeout)
+
+    async def _wait_dom_async(self, page, timeout: float):
+        if self.json_ld:
+            await page.wait_for_function(READY_JS, arg=[self.selector, True], timeout=timeout, polling=POLL_MS)
+        else:
+            await page.wait_for_selector(self.selector, state="attached", timeout=timeout)
+
+    def wait(self, page) -> str:
+        """Block until the page is ready; return the signal that fired or "deadline"."""
+        started = time.perf_counter()
+        dom_signal = bool(self.selector or self.json_ld)
+
+        if dom_signal and self.network_idle:
+            # Sync calls cannot race, so alternate short waits on both signals
+            deadline = started + self.deadline_ms / 1000
+            while time.perf_counter() < deadline:
+                try:
+                    self._wait_dom(page, POLL_SLICE_MS)
+                    return self._done("dom", started)
+                except Exception:
+                    pass
+                try:
+                    page.wait_for_load_state("networkidle", timeout=POLL_SLICE_MS)
+                    return self._done("networkidle", started)
+                except Exception:
+                    pass
+            return self._done("deadline", started)
+
+        if dom_signal:
+            try:
+                self._wait_dom(page, self.deadline_ms)
+                return self._done("dom", started)
+            except Exception:
+                return self._done("deadline", started)
+
+        if self.network_idle:
+            try:
+                page.wait_for_load_state("networkidle", timeout=self.deadline_ms)
+                return self._done("networkidle", started)
+            except Exception:
+                return self._done("deadline", started)
+
+        return self._done("loaded", started)
+
+    async def wait_async(self, page) -> str:
+        """Async version of wait() for `playwright.async_api` pages."""
+        started = time.perf_counter()
+        dom_signal = bool(self.selector or self.json_ld)
+
+        if dom_signal and self.network_idle:
+            dom = asyncio.ensure_future(self._wait_dom_async(page, self.deadline_ms))
+            idle = asyncio.ensure_future(page.wait_for_load_state("networkidle", timeout=self.deadline_ms))
+            pending = {dom, idle}
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return self._done("dom" if task is dom else "networkidle", started)
+                return self._done("deadline", started)
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        if dom_signal:
+            try:
+                await self._wait_dom_async(page, self.deadline_ms)
+                return self._done("dom", started)
+            except Exception:
+                return self._done("deadline", started)
+
+        if self.network_idle:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=self.deadline_ms)
+                return self._done("networkidle", started)
+            except Exception:
+                return self._done("deadline", started)
+
+        return self._done("loaded", started)
+
+    def _done(self, signal: str, started: float) -> str:
+        elapsed = time.perf_counter() - started
+        if signal == "deadline":
+            logger.info(f"⏱ Ready deadline hit after {elapsed:.2f}s, reading partial page")
+        else:
+            logger.info(f"⏳ Page ready ({signal}) after {elapsed:.2f}s")
+        return signal
+
+
+class RateLimitPolicy:
+    """
+    Anti-bot pacing, kept separate from page readiness.
+
+    Consecutive requests to the same host start at least `min_interval` seconds
+    apart plus a random jitter. The wait happens before a request starts
+    instead of after the page has already loaded.
+    """
+
+    def __init__(self, min_interval: float = 0.0, jitter: tuple = (0.0, 0.0), enabled: bool = True):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.enabled = enabled
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, url: str) -> float:
+        """Book the next start slot for this host and return how long to wait for it."""
+        if not self.enabled:
+            return 0.0
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = start_at + self.min_interval + random.uniform(*self.jitter)
+            return start_at - now
+
+    def wait_turn(self, url: str):
+        delay = self._reserve(url)
+        if delay > 0:
+            logger.info(f"⏱ Rate limit: waiting {delay:.2f}s before {urlparse(url).netloc}")
+            with metrics.timed("sleep", reason="rate_limit"):
+                time.sleep(delay)
+
+    async def wait_turn_async(self, url: str):
+        delay = self._reserve(url)
+        if delay > 0:
+            logger.info(f"⏱ Rate limit: waiting {delay:.2f}s before {urlparse(url).netloc}")
+            with metrics.timed("sleep", reason="rate_limit"):
+                await asyncio.sleep(delay)
@@ -1,7 +1,19 @@
-import requests, re, json, time, logging
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, quote_plus
-from playwright.sync_api import sync_playwright
+import os, httpx, asyncio, json, time, logging
+from lxml import etree
+import http_client
+from html_extract import xpath, parse, title_of, json_ld
+from price_candidates import best_price, locator, locate, read_at
+from urllib.parse import urlparse
+from browser_pool import get_pool, get_async_pool, MAX_BROWSERS
+from wait_strategy import WaitStrategy, RateLimitPolicy
+from page_profiles import TEXT_ONLY
+from product_cache import ProductCache
+from tiered_fetch import TieredFetcher, domain_of
+from extraction_profiles import ProfileRegistry
+from fanout import HostLimiter, abandoned, iter_completed, iter_completed_threads
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from price_normalize import parse_price
 #این قسمت به دلیل حساسیت گیت هاب کلمات مودبانه تر و کمتر مورد استفاده قرار گرفته این کلمات جایگزین کنید
 FORBIDDEN_WORDS = {
     "porn", "sex", "xxx", "adult", "nsfw", "erotic", "fetish",
@@ -43,50 +55,104 @@ HEADERS = {
     "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7",
 }
 
-PERSIAN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹", "0123456789")
-price_re = re.compile(r"([0-9۰-۹\.,\s]+)\s*(تومان|ت|Toman|IRR|ریال)?", re.I)
+# Search endpoint; override through the environment to point at a local stand-in
+DUCKDUCKGO_URL = os.environ.get("DUCKDUCKGO_URL", "https://html.duckduckgo.com/html/")
 
-def normalize_digits(s):
-    return s.translate(PERSIAN_DIGITS) if s else s
+# Product page readiness and anti-bot pacing for the browser fetch
+PRODUCT_PAGE_WAIT = WaitStrategy(
+    selector="[itemprop='price'], meta[property='product:price:amount']",
+    json_ld=True, network_idle=True, deadline_ms=8000
+)
+RATE_LIMIT = RateLimitPolicy(min_interval=0.5, jitter=(0.0, 0.5))
+# Spacing between DuckDuckGo searches; only waits when searches come back to back.
+# Process-wide on purpose: DuckDuckGo sees one client, so this caps the whole bot's
+# search rate (about two a second) rather than each user's.
+DISCOVERY_RATE_LIMIT = RateLimitPolicy(min_interval=0.4, jitter=(0.0, 0.2))
+
+# Kept-alive connection to DuckDuckGo shared by all searches (see http_client)
+http_client.register("duckduckgo", headers=HEADERS, timeout=20)
+
+# Product-page fan-out: hits of one search are fetched in parallel, politely per
+# shop, and whatever has not finished by the deadline is left out. A site search
+# (the user gave a link) only hits one shop, so it runs at PER_HOST_LIMIT pages at a
+# time on purpose; FETCH_CONCURRENCY applies to open-web searches across shops.
+FETCH_CONCURRENCY = 4     # product pages fetched in parallel per search
+PER_HOST_LIMIT = 2        # simultaneous pages against one shop
+FETCH_DEADLINE = 25       # seconds for all product pages of one search
+
+# Product pages are first fetched as static HTML; see PRODUCT_FETCHER below
+PAGE_HTTP_TIMEOUT = 10
+http_client.register("global_pages", headers=HEADERS, timeout=PAGE_HTTP_TIMEOUT)
+
+# Only the rendered text is read, so skip images, fonts, media and trackers
+PAGE_PROFILE = TEXT_ONLY.extend("global")
 
+# Parsed product pages shared across searches, so overlapping queries skip page loads
+PRODUCT_CACHE = ProductCache("global")
+
+# Prices are parsed by price_normalize (Persian / Arabic digits, ٬, locale decimals)
 def extract_price_from_text(text):
-    if not text:
+    """Price in Toman: Rial is divided by 10, other currencies give None (they are not Toman amounts)."""
+    price = parse_price(text)
+    if price is None or price.currency not in (None, "IRT", "IRR"):
         return None
-    text = normalize_digits(text)
-    m = price_re.search(text)
-    if not m:
-        return None
-    raw = m.group(1).replace(",", "").replace(".", "").replace(" ", "")
-    try:
-        return int(raw)
-    except Exception as e:
-        logger.warning(f"Error converting price:{e}")
+    return round(price.amount / 10) if price.currency == "IRR" else round(price.amount)
+
+def candidate_price(candidate):
+    """Toman price of a scanned candidate, in the currency its text or the page's meta tags give."""
+    if candidate is None or candidate.currency not in (None, "IRT", "IRR"):
         return None
+    return extract_price_from_text(f"{candidate.text} {candidate.currency or ''}")
 
 #  search at DuckDuckGo
-def duckduckgo_search(query, site=None, max_results=10, pause=0.4):
-    q = query
+def duckduckgo_query(query, site=None):
     if site:
         domain = urlparse(site).netloc
-        q = f"site:{domain} {query}"
+        return f"site:{domain} {query}"
+    return query
 
-    url = f"https://html.duckduckgo.com/html/?q={quote_plus(q)}"
+def duckduckgo_search(query, site=None, max_results=10):
+    q = duckduckgo_query(query, site)
     logger.info(f"🔍 search inDuckDuckGo: {q}")
 
-    resp = requests.post(url, data={"q": q}, headers=HEADERS, timeout=20)
-    time.sleep(pause)
+    # the query goes in the form body only
+    DISCOVERY_RATE_LIMIT.wait_turn(DUCKDUCKGO_URL)
+    resp = http_client.request("POST", DUCKDUCKGO_URL, client="duckduckgo", data={"q": q})
 
     if resp.status_code != 200:
         logger.error(f"❌ Search error ({resp.status_code})")
         raise RuntimeError(f"Search failed: {resp.status_code}")
 
-    soup = BeautifulSoup(resp.text, "lxml")
+    return parse_duckduckgo_results(resp.text, max_results=max_results)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared httpx client so async searches reuse connections."""
+    return http_client.get_async_client("duckduckgo")
+
+async def duckduckgo_search_async(query, site=None, max_results=10):
+    q = duckduckgo_query(query, site)
+    logger.info(f"🔍 search inDuckDuckGo: {q}")
+
+    await DISCOVERY_RATE_LIMIT.wait_turn_async(DUCKDUCKGO_URL)
+    resp = await http_client.request_async("POST", DUCKDUCKGO_URL, client="duckduckgo", data={"q": q})
+
+    if resp.status_code != 200:
+        logger.error(f"❌ Search error ({resp.status_code})")
+        raise RuntimeError(f"Search failed: {resp.status_code}")
+
+    return await asyncio.to_thread(parse_duckduckgo_results, resp.text, max_results=max_results)
+
+LINK_HREFS = xpath("//a/@href")
+
+@metrics.timed("parse")
+def parse_duckduckgo_results(html, max_results=10):
+    root = parse(html)
     exclude = ["category", "search", "filter", "collections", "tag"]
     include = ["product", "item", "sku", "detail", "p/"]
 
     urls = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    for href in (LINK_HREFS(root) if root is not None else []):
         if not href.startswith("http"):
             continue
         href_l = href.lower()
@@ -104,37 +170,51 @@ def duckduckgo_search(query, site=None, max_results=10, pause=0.4):
     return urls
 
 #  بارگذاری صفحات با Playwright
-def fetch_page_playwright(url, timeout=25000):
+def fetch_page_playwright(url, wait=PRODUCT_PAGE_WAIT, timeout=25000, on_response=None):
     try:
+        RATE_LIMIT.wait_turn(url)
+        if abandoned():
+            # the search that wanted this page is past its deadline: free the thread
+            logger.info(f"⌛ Skipping abandoned page load: {url}")
+            return None
         logger.info(f"🌐 Loading page: {url}")
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.set_extra_http_headers({"accept-language": "fa-IR,fa;q=0.9"})
-            page.goto(url, timeout=timeout)
-            time.sleep(1.5)
-            html = page.content()
-
-            if "تومان" not in html and "price" not in html.lower():
-                time.sleep(0.5)
-                html = page.content()
-
-            browser.close()
-            return html
+        with get_pool().page(profile=PAGE_PROFILE, extra_http_headers={"accept-language": "fa-IR,fa;q=0.9"}) as page:
+            with metrics.timed("navigation"):
+                response = page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+                if on_response and response:
+                    on_response(response)
+                wait.wait(page)
+            return page.content()
+    except Exception as e:
+        logger.exception(f"❌ Error loading {url}: {e}")
+        return None
+
+async def fetch_page_playwright_async(url, wait=PRODUCT_PAGE_WAIT, timeout=25000, on_response=None):
+    try:
+        await RATE_LIMIT.wait_turn_async(url)
+        logger.info(f"🌐 Loading page: {url}")
+        async with get_async_pool().page(profile=PAGE_PROFILE, extra_http_headers={"accept-language": "fa-IR,fa;q=0.9"}) as page:
+            with metrics.timed("navigation"):
+                response = await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+                if on_response and response:
+                    on_response(response)
+                await wait.wait_async(page)
+            return await page.content()
     except Exception as e:
         logger.exception(f"❌ Error loading {url}: {e}")
         return None
 
 #  Extract information from HTML
-def extract_product_from_html(html):
-    soup = BeautifulSoup(html, "lxml")
-    title, price = None, None
+# Learned per domain: where title and price were found on that shop's pages
+EXTRACTION_PROFILES = ProfileRegistry()
 
-    for s in soup.find_all("script", type="application/ld+json"):
-        try:
-            data = json.loads(s.string or "{}")
-        except Exception:
-            continue
+def is_complete_product(data):
+    return bool(data and data.get("title") and data.get("price_toman"))
+
+def product_json_ld(html):
+    """(title, price) from the page's JSON-LD Product block."""
+    title, price = None, None
+    for data in json_ld(html):
         data_list = data if isinstance(data, list) else [data]
         for it in data_list:
             if isinstance(it, dict) and it.get("@type", "").lower() == "product":
@@ -144,24 +224,124 @@ def extract_product_from_html(html):
                     of = offers[0] if isinstance(offers, list) else offers
                     pr = of.get("price") or of.get("priceSpecification", {}).get("price")
                     if pr:
-                        price = extract_price_from_text(str(pr))
+                        price = extract_price_from_text(f"{pr} {of.get('priceCurrency') or ''}")
                 break
+    return title, price
 
-    if not title and soup.title:
-        title = soup.title.get_text(strip=True)
-    if not price:
-        for tag in ["span", "div", "meta", "bdi"]:
-            for el in soup.find_all(tag):
-                txt = el.get("content") or el.get_text(" ", strip=True)
-                p = extract_price_from_text(txt)
-                if p:
-                    price = p
-                    break
-            if price:
-                break
+def extract_full(html):
+    """Record plus the profile (where title and price came from) of a full extraction."""
+    title, price = product_json_ld(html)
+    profile = {"title": "json_ld" if title else "title_tag", "price": "json_ld" if price else None}
 
+    if not title:
+        title = title_of(html)
+    # No structured price: one bounded, scored pass over the page instead of
+    # re-reading every span/div subtree and taking the first number
+    root = parse(html) if not price else None
+    if root is not None:
+        candidate = best_price(root, title=title)
+        if candidate:
+            price = candidate_price(candidate)
+            profile["price"] = locator(candidate.element)
+
+    return {"title": title, "price_toman": price}, profile
+
+def extract_with_profile(html, profile):
+    """Record read only where `profile` points: JSON-LD, <title> or one XPath."""
+    title, price = product_json_ld(html) if "json_ld" in profile.values() else (None, None)
+    if profile["title"] == "title_tag":
+        title = title_of(html)
+    if profile["price"] != "json_ld":
+        price = None
+        root = parse(html)
+        candidate = read_at(locate(root, profile["price"]))
+        if candidate:
+            price = candidate_price(candidate)
     return {"title": title, "price_toman": price}
 
+@metrics.timed("parse")
+def extract_product_from_html(html, url=None):
+    """
+    Title and price of a product page. With `url`, a confirmed profile for its
+    domain is tried first; a full extraction that gives both fields teaches
+    EXTRACTION_PROFILES where they were found.
+    """
+    domain = domain_of(url) if url else None
+    profile = EXTRACTION_PROFILES.active(domain) if domain else None
+    if profile:
+        try:
+            record = extract_with_profile(html, profile)
+        except etree.XPathError as e:
+            # a stored locator lxml cannot evaluate will never match: drop it now
+            logger.warning(f"⚠️ Extraction profile for {domain} is unusable ({e}); dropped")
+            EXTRACTION_PROFILES.forget(domain)
+            record = None
+        if is_complete_product(record):
+            EXTRACTION_PROFILES.hit(domain)
+            return record
+        if record is not None:
+            EXTRACTION_PROFILES.miss(domain)
+
+    record, found = extract_full(html)
+    if domain and is_complete_product(record) and found["price"]:
+        EXTRACTION_PROFILES.learn(domain, found)
+    return record
+
+#  Product pages with the URL-keyed detail cache
+
+# Plain HTTP first, Chromium only when the static page has no title and price
+PRODUCT_FETCHER = TieredFetcher(
+    "global", extract=extract_product_from_html, usable=is_complete_product,
+    browser_fetch=fetch_page_playwright, browser_fetch_async=fetch_page_playwright_async,
+    client="global_pages", rate_limit=RATE_LIMIT,
+)
+
+def fetch_product(url):
+    """Parsed product for `url`: from PRODUCT_CACHE when possible, otherwise fetched (HTTP or browser) and cached."""
+    if abandoned():
+        return None
+    data = PRODUCT_CACHE.lookup(url, parse=lambda html: extract_product_from_html(html, url),
+                                accept=is_complete_product)
+    if data:
+        logger.info(f"⚡ Product page from cache: {url}")
+        return data
+
+    data, headers, tier = PRODUCT_FETCHER.fetch(url)
+    if not data:
+        return None
+    if data["title"]:
+        PRODUCT_CACHE.store(url, data, headers)
+    logger.info(f"📄 Product page via {tier}: {url}")
+    return data
+
+async def fetch_product_async(url):
+    data = await PRODUCT_CACHE.lookup_async(url, parse=lambda html: extract_product_from_html(html, url),
+                                            accept=is_complete_product)
+    if data:
+        logger.info(f"⚡ Product page from cache: {url}")
+        return data
+
+    data, headers, tier = await PRODUCT_FETCHER.fetch_async(url)
+    if not data:
+        return None
+    if data["title"]:
+        PRODUCT_CACHE.store(url, data, headers)
+    logger.info(f"📄 Product page via {tier}: {url}")
+    return data
+
+# Threads for the sync search() fan-out; shared so their warm browsers are reused.
+# Each thread owns its browsers (sync Playwright), so there are never more threads
+# than browser_pool.MAX_BROWSERS: every one of them can get a browser without waiting.
+_fetch_executor = ThreadPoolExecutor(max_workers=min(FETCH_CONCURRENCY * 2, MAX_BROWSERS),
+                                     thread_name_prefix="global-fetch")
+
+def format_result(data, url):
+    return {
+        "title": data["title"],
+        "url": url,
+        "price": f"{data['price_toman']:,} تومان" if data["price_toman"] else "invalid"
+    }
+
 #  Main search function
 def search(site, query, max_results=5):
     start_time = time.time()
@@ -179,32 +359,73 @@ def search(site, query, max_results=5):
 
     try:
         urls = duckduckgo_search(query, site=site, max_results=max_results)
-        results = []
-        for i, u in enumerate(urls, 1):
-            try:
-                html = fetch_page_playwright(u)
-                if not html:
-                    logger.warning(f"⏳ Failed to fetch: {u}")
-                    continue
-                data = extract_product_from_html(html)
-                if not data["title"]:
-                    continue
-                results.append({
-                    "title": data["title"],
-                    "url": u,
-                    "price": f"{data['price_toman']:,} تومان" if data["price_toman"] else "invalid"
-                })
-                logger.info(f"✅ {i}/{len(urls)} → {data['title'][:60]} | {data['price_toman'] or '???'} تومان")
-            except Exception as e:
-                logger.exception(f"⚠️ Error extracting {u}: {e}")
+        ranked = []
+        for index, data in iter_completed_threads(urls, fetch_product, _fetch_executor, concurrency=FETCH_CONCURRENCY,
+                                                  per_host=PER_HOST_LIMIT, deadline=FETCH_DEADLINE):
+            u = urls[index]
+            if not data:
+                logger.warning(f"⏳ Failed to fetch: {u}")
+                continue
+            if not data["title"]:
+                continue
+            ranked.append((index, format_result(data, u)))
+            logger.info(f"✅ {index + 1}/{len(urls)} → {data['title'][:60]} | {data['price_toman'] or '???'} تومان")
 
+        results = [result for _, result in sorted(ranked, key=lambda item: item[0])]
         elapsed = time.time() - start_time
         logger.info(f" Search completed | Results: {len(results)} | time: {elapsed:.2f}s")
         logger.info("=" * 60)
         return results
     except Exception as e:
         logger.exception(f"❌ Error in search function: {e}")
-        return []
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+
+#  Native asyncio search, streamed: yields (rank, result) as each product page is parsed,
+#  in completion order (callers sort by rank)
+async def iter_search_async(site, query, max_results=5):
+    start_time = time.time()
+    logger.info("=" * 60)
+    logger.info(f"🚀 Starting async search for '{query}' on site '{site}'")
+
+    if contains_forbidden(site) or contains_forbidden(query):
+        logger.warning(f"⛔ Invalid input: site={site}, query={query}")
+        yield 0, {
+            "title": "⛔ Invalid content",
+            "url": "#",
+            "price": "Input contains forbidden words."
+        }
+        return
+
+    found = 0
+    try:
+        urls = await duckduckgo_search_async(query, site=site, max_results=max_results)
+        limiter = HostLimiter(per_host=PER_HOST_LIMIT)
+        async for index, data in iter_completed(urls, fetch_product_async, concurrency=FETCH_CONCURRENCY,
+                                                host_limiter=limiter, deadline=FETCH_DEADLINE):
+            u = urls[index]
+            if not data:
+                logger.warning(f"⏳ Failed to fetch: {u}")
+                continue
+            if not data["title"]:
+                continue
+            found += 1
+            logger.info(f"✅ {index + 1}/{len(urls)} → {data['title'][:60]} | {data['price_toman'] or '???'} تومان")
+            yield index, format_result(data, u)
+
+        elapsed = time.time() - start_time
+        logger.info(f" Search completed | Results: {found} | time: {elapsed:.2f}s")
+        logger.info("=" * 60)
+    except Exception as e:
+        logger.exception(f"❌ Error in search_async function: {e}")
+        raise  # the caller reports it (bot.iter_scraper / search_async), so the store is seen failing
+
+#  Native asyncio search, picked by bot.call_scraper
+async def search_async(site, query, max_results=5):
+    try:
+        ranked = [item async for item in iter_search_async(site, query, max_results=max_results)]
+    except Exception as e:
+        return [{"title": "Search error", "url": "#", "price": str(e), "error": True}]
+    return [result for _, result in sorted(ranked, key=lambda item: item[0])]
 
 # Direct execution mode (CLI)
 if __name__ == "__main__":
@@ -0,0 +1,443 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import importlib
+import itertools
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+
+# Logging settings
+logger = logging.getLogger("worker_pool")
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    "%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"
+)
+
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+
+# Worker settings
+WORKER_PROCESSES = 2          # local worker processes started by WorkerPool
+REMOTE_WORKERS = []           # e.g. [("10.0.0.5", 7070)] for workers started with --listen on other nodes
+# shared secret for remote workers (no default: a guessable key lets anyone run jobs on a worker);
+# local workers started by WorkerPool get a random key of their own
+AUTHKEY = os.environ.get("SCRAPER_WORKER_AUTHKEY", "").encode() or None
+MAX_JOBS_PER_WORKER = 4       # jobs a worker runs at once before the pool reports no capacity
+JOB_TIMEOUT = 120             # seconds before a job is given up on
+HEALTH_INTERVAL = 5           # seconds between pings
+HEALTH_TIMEOUT = 15           # a worker silent for this long is restarted / reconnected
+START_TIMEOUT = 30
+
+# store -> (module, function names tried in order); `<name>_async` is preferred
+SCRAPERS = {
+    "digikala": ("digikala_optimized", ("search",)),
+    "ebay": ("ebay_optimized", ("search",)),
+    "global": ("web_mimic_optimized", ("search_with_link", "search")),
+}
+
+
+class WorkerUnavailable(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+async def run_scraper(store: str, query: str, link: str | None = None, max_results: int = 5):
+    """Run one search inside the worker process (with the worker's own browser pools)."""
+    module_name, names = SCRAPERS[store]
+    module = importlib.import_module(module_name)
+    args = (link, query) if store == "global" else (query,)
+
+    for name in names:
+        func = getattr(module, f"{name}_async", None) or getattr(module, name, None)
+        if func:
+            break
+    else:
+        raise RuntimeError(f"Search function not found in the module.{store}")
+
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args, max_results=max_results)
+    work = asyncio.ensure_future(asyncio.to_thread(func, *args, max_results=max_results))
+    try:
+        return await asyncio.shield(work)
+    except asyncio.CancelledError:
+        # a thread cannot be stopped: report the cancelled job only once it has returned
+        await asyncio.wait([work])
+        raise
+
+
+def _serve_connection(conn, loop):
+    send_lock = threading.Lock()
+    inflight = {}   # job id -> asyncio.Task running it
+
+    def reply(message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, EOFError):
+                pass  # client went away; it will fail the job on its side
+
+    async def run(job_id, message):
+        inflight[job_id] = asyncio.current_task()
+        try:
+            results = await run_scraper(message["store"], message["query"], message.get("link"),
+                                        message.get("max_results", 5))
+            reply({"type": "result", "id": job_id, "ok": True, "results": results})
+        except asyncio.CancelledError:
+            # sent only once the job has really stopped, so the client can reuse its slot
+            reply({"type": "result", "id": job_id, "ok": False, "error": "cancelled"})
+        except Exception as e:
+            reply({"type": "result", "id": job_id, "ok": False, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            inflight.pop(job_id, None)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message.get("type") == "ping":
+            reply({"type": "pong", "pid": os.getpid(), "inflight": len(inflight)})
+        elif message.get("type") == "job":
+            asyncio.run_coroutine_threadsafe(run(message["id"], message), loop)
+        elif message.get("type") == "cancel":
+            # the client gave up on the job; a scraper running in a thread only stops when it returns
+            task = inflight.get(message["id"])
+            if task is not None:
+                loop.call_soon_threadsafe(task.cancel)
+
+
+def serve(address, authkey: bytes, ready=None):
+    """
+    Worker main loop: accept one client at a time and run its jobs on a
+    private asyncio loop. `ready` (a Connection) receives the bound address.
+    """
+    if not authkey:
+        raise ValueError("a worker needs an authkey (set SCRAPER_WORKER_AUTHKEY)")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    with Listener(address, authkey=authkey) as listener:
+        logger.info(f"🚀 Worker {os.getpid()} listening on {listener.address}")
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f"⚠️ Worker {os.getpid()} rejected a connection: {e}")
+                continue
+            with conn:
+                _serve_connection(conn, loop)
+
+
+# ---------------------------------------------------------------------------
+# Bot side
+# ---------------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, address=None, local: bool = True):
+        self.address = address
+        self.local = local
+        self.process = None
+        self.conn = None
+        self.healthy = False
+        self.pending: dict = {}        # job id -> asyncio.Future
+        self.overdue: dict = {}        # job id -> when it was given up on; still running, still holds a slot
+        self.last_pong = 0.0
+        self.restarts = 0
+        self.send_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"pid {self.process.pid}" if self.process else f"{self.address}"
+
+
+class WorkerPool:
+    """
+    Runs scraper jobs in separate processes so parsing and browsers never
+    block the bot's event loop.
+
+    Workers are local processes started here and/or remote workers started
+    with `python worker_pool.py --listen host:port`. A monitor thread pings
+    every worker, restarts crashed local ones, reconnects remote ones and
+    fails their in-flight jobs so callers can retry. `reserve()` / `release()`
+    are the scheduler's back-pressure gate: a job slot is taken before a job
+    is dispatched, so the pool is never overbooked. A job given up on
+    (JOB_TIMEOUT, or its caller went away) is cancelled on the worker and
+    keeps its slot until the worker reports back; a local worker that does
+    not within another JOB_TIMEOUT is restarted.
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES, remote=None, authkey: bytes | None = AUTHKEY,
+                 max_jobs_per_worker: int = MAX_JOBS_PER_WORKER):
+        remote = REMOTE_WORKERS if remote is None else remote
+        if remote and not authkey:
+            raise ValueError("remote workers need a shared authkey: set SCRAPER_WORKER_AUTHKEY")
+        self.authkey = authkey
+        self._local_authkey = os.urandom(32)   # only this process and its own children know it
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.workers = [_Worker() for _ in range(processes)]
+        self.workers += [_Worker(tuple(address), local=False) for address in remote]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()           # slot accounting: reserved / pending
+        self._connect_lock = threading.Lock()   # (re)spawning and connecting workers
+        self._reserved = 0
+        self._mp = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._loop = None
+        self._on_capacity = None
+        self.counters = {"jobs": 0, "failed": 0, "worker_deaths": 0, "retries": 0}
+
+    # lifecycle
+    def start(self):
+        with self._connect_lock:
+            for worker in self.workers:
+                self._connect(worker)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def bind(self, loop, on_capacity=None):
+        """Set the event loop jobs are awaited on and a callback for when capacity comes back."""
+        self._loop = loop
+        self._on_capacity = on_capacity
+
+    def close(self):
+        self._stop.set()
+        with self._connect_lock:
+            for worker in self.workers:
+                worker.healthy = False
+                self._drop(worker, "pool closed")
+                if worker.process is not None:
+                    worker.process.terminate()
+
+    def _spawn(self, worker: _Worker):
+        parent, child = self._mp.Pipe(duplex=False)
+        worker.process = self._mp.Process(target=serve, args=(("127.0.0.1", 0), self._local_authkey, child), daemon=True)
+        worker.process.start()
+        child.close()
+        if not parent.poll(START_TIMEOUT):
+            worker.process.kill()
+            worker.process.join()
+            worker.process = None
+            raise WorkerUnavailable("worker did not start in time")
+        worker.address = parent.recv()
+        parent.close()
+
+    def _connect(self, worker: _Worker):
+        """Spawn (local workers without a process) and connect; called with _connect_lock held."""
+        try:
+            if worker.local and worker.process is None:
+                self._spawn(worker)
+            worker.conn = Client(worker.address, authkey=self._local_authkey if worker.local else self.authkey)
+        except Exception as e:
+            worker.healthy = False
+            logger.warning(f"⚠️ Could not connect to worker {worker.address}: {e}")
+            return
+        worker.healthy = True
+        worker.last_pong = time.monotonic()
+        threading.Thread(target=self._reader, args=(worker, worker.conn), daemon=True).start()
+        logger.info(f"✅ Worker {worker.name} ready at {worker.address}")
+        self._notify_capacity()
+
+    def _drop(self, worker: _Worker, reason: str):
+        """Mark a worker dead and fail everything it was running."""
+        was_healthy, worker.healthy = worker.healthy, False
+        if worker.conn is not None:
+            try:
+                worker.conn.close()
+            except OSError:
+                pass
+            worker.conn = None
+        with self._lock:
+            pending, worker.pending = worker.pending, {}
+            worker.overdue = {}
+        for future in pending.values():
+            self._resolve(future, exc=WorkerUnavailable(f"worker {worker.name} lost: {reason}"))
+        if was_healthy:
+            self.counters["worker_deaths"] += 1
+            logger.warning(f"⚠️ Worker {worker.name} down ({reason}), {len(pending)} job(s) failed over")
+
+    def _monitor(self):
+        while not self._stop.wait(HEALTH_INTERVAL):
+            for worker in self.workers:
+                if not worker.healthy:
+                    self._restart(worker)
+                    continue
+                crashed = worker.process is not None and not worker.process.is_alive()
+                silent = time.monotonic() - worker.last_pong > HEALTH_TIMEOUT
+                stuck = any(time.monotonic() - since > JOB_TIMEOUT for since in list(worker.overdue.values()))
+                if crashed or silent or stuck:
+                    reason = "crashed" if crashed else "health check timed out" if silent else "a cancelled job never ended"
+                    self._drop(worker, reason)
+                    continue
+                self._send(worker, {"type": "ping"})
+
+    def _restart(self, worker: _Worker):
+        """Kill and reap a dead local worker's process, then spawn and connect a new one."""
+        with self._connect_lock:
+            if worker.healthy or self._stop.is_set():
+                return
+            if worker.process is not None:
+                # reap before respawning: right after kill() is_alive() can still be True
+                worker.process.kill()
+                worker.process.join(START_TIMEOUT)
+                worker.process = None
+            worker.restarts += 1
+            self._connect(worker)
+
+    def _reader(self, worker: _Worker, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                if worker.conn is conn:
+                    self._drop(worker, "connection closed")
+                return
+            worker.last_pong = time.monotonic()
+            if message.get("type") != "result":
+                continue
+            with self._lock:
+                future = worker.pending.pop(message["id"], None)
+                was_overdue = worker.overdue.pop(message["id"], None) is not None
+            if future is None:
+                if was_overdue:
+                    self._notify_capacity()   # its slot is free only now
+                continue
+            if message["ok"]:
+                self._resolve(future, result=message["results"])
+            else:
+                self._resolve(future, exc=RuntimeError(message["error"]))
+            self._notify_capacity()
+
+    def _send(self, worker: _Worker, message) -> bool:
+        with worker.send_lock:
+            try:
+                worker.conn.send(message)
+                return True
+            except (AttributeError, OSError, EOFError):
+                return False
+
+    @staticmethod
+    def _resolve(future, result=None, exc=None):
+        def settle():
+            if future.done():
+                return
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+        future.get_loop().call_soon_threadsafe(settle)
+
+    def _notify_capacity(self):
+        if self._loop is not None and self._on_capacity is not None and self.has_capacity():
+            self._loop.call_soon_threadsafe(self._on_capacity)
+
+    # jobs
+    def _slots(self) -> int:
+        """Free job slots of the healthy workers; jobs given up on but still running count as taken."""
+        return sum(self.max_jobs_per_worker - len(w.overdue) for w in self.workers if w.healthy)
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return self._reserved < self._slots()
+
+    def reserve(self) -> bool:
+        """Scheduler gate: take a job slot if a healthy worker has one (release() gives it back)."""
+        with self._lock:
+            if self._reserved >= self._slots():
+                return False
+            self._reserved += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._reserved = max(0, self._reserved - 1)
+        self._notify_capacity()
+
+    def _pick(self) -> _Worker:
+        healthy = [w for w in self.workers if w.healthy]
+        if not healthy:
+            raise WorkerUnavailable("no healthy scraper workers")
+        return min(healthy, key=lambda w: len(w.pending) + len(w.overdue))
+
+    async def _submit(self, message):
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            worker = self._pick()
+            worker.pending[message["id"]] = future
+        if not self._send(worker, message):
+            worker.pending.pop(message["id"], None)
+            self._drop(worker, "send failed")
+            raise WorkerUnavailable(f"could not send job to worker {worker.name}")
+        try:
+            return await asyncio.wait_for(future, JOB_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # the worker is still running it: keep its slot taken until it reports back
+            with self._lock:
+                if worker.pending.pop(message["id"], None) is not None:
+                    worker.overdue[message["id"]] = time.monotonic()
+            self._send(worker, {"type": "cancel", "id": message["id"]})
+            raise
+        finally:
+            worker.pending.pop(message["id"], None)
+
+    async def run(self, store: str, *, query: str, link: str | None = None, max_results: int = 5):
+        """Run one search on the least-loaded worker; retried once on another worker if one dies."""
+        self.counters["jobs"] += 1
+        message = {"type": "job", "id": next(self._ids), "store": store, "query": query,
+                   "link": link, "max_results": max_results}
+        try:
+            try:
+                return await self._submit(message)
+            except WorkerUnavailable:
+                if not any(w.healthy for w in self.workers):
+                    raise
+                self.counters["retries"] += 1
+                message["id"] = next(self._ids)
+                return await self._submit(message)
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": [
+                {"address": str(w.address), "local": w.local, "healthy": w.healthy,
+                 "inflight": len(w.pending), "overdue": len(w.overdue), "restarts": w.restarts}
+                for w in self.workers
+            ],
+        }
+
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def _parse_address(value: str):
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a scraper worker that a bot's WorkerPool can connect to.")
+    parser.add_argument("--listen", default="127.0.0.1:7070", help="host:port to listen on")
+    options = parser.parse_args()
+    address = _parse_address(options.listen)
+    if not AUTHKEY:
+        where = "" if address[0] in LOOPBACK_HOSTS else f" (refusing to listen on non-loopback {address[0]} without it)"
+        parser.exit(2, f"SCRAPER_WORKER_AUTHKEY must be set to the key the bot uses{where}\n")
+    try:
+        serve(address, AUTHKEY)
+    except KeyboardInterrupt:
+        sys.exit(0)